@@ -51,6 +51,58 @@ let dashboardData = null;
             }
         }
 
+        // ========================================
+        // LIVE EVENT STREAM (event_server.py)
+        // ========================================
+        const EVENT_STREAM_URL = `${window.location.protocol}//${window.location.hostname}:8001/events`;
+        const ROW_EVENT_SECTIONS = { detection: ['detections', 100], alert: ['alerts', 20], activity: ['activity', 50] };
+        let eventStreamConnected = false;
+
+        function upsertRow(section, row, limit) {
+            const rows = (dashboardData[section] || []).filter(r => r.id !== row.id);
+            rows.unshift(row);
+            rows.sort((a, b) => b.id - a.id);
+            dashboardData[section] = rows.slice(0, limit);
+        }
+
+        function connectEventStream() {
+            if (!window.EventSource) return;
+
+            const source = new EventSource(EVENT_STREAM_URL);
+            source.onopen = () => { eventStreamConnected = true; };
+            // EventSource reconnects by itself; polling covers the gap
+            source.onerror = () => { eventStreamConnected = false; };
+
+            source.addEventListener('snapshot', (e) => {
+                dashboardData = JSON.parse(e.data);
+                updateDashboard(dashboardData);
+            });
+
+            Object.entries(ROW_EVENT_SECTIONS).forEach(([eventName, [section, limit]]) => {
+                source.addEventListener(eventName, (e) => {
+                    if (!dashboardData) return;
+                    upsertRow(section, JSON.parse(e.data), limit);
+                    updateDashboard(dashboardData);
+                });
+            });
+
+            source.addEventListener('camera', (e) => {
+                if (!dashboardData) return;
+                const camera = JSON.parse(e.data);
+                dashboardData.cameras = dashboardData.cameras || {};
+                dashboardData.cameras[camera.id] = camera;
+                updateDashboard(dashboardData);
+            });
+
+            ['stats', 'firefighters', 'personnel', 'stations', 'detection_history'].forEach(section => {
+                source.addEventListener(section, (e) => {
+                    if (!dashboardData) return;
+                    dashboardData[section] = JSON.parse(e.data);
+                    updateDashboard(dashboardData);
+                });
+            });
+        }
+
         function updateDashboard(data) {
             // Update stats
             if (data.stats) {
@@ -802,16 +854,41 @@ async function sendAlertToAllFirefighters() {
         // ========================================
         // CAMERA FEED REFRESH
         // ========================================
-        function refreshCameraFeeds() {
-            const camera1 = document.getElementById('camera1Feed');
-            const camera2 = document.getElementById('camera2Feed');
-            
-            if (camera1) {
-                camera1.src = 'camera_frames/camera1_live.jpg?' + new Date().getTime();
-            }
-            if (camera2) {
-                camera2.src = 'camera_frames/camera2_live.jpg?' + new Date().getTime();
+        // Feeds stream as MJPEG from the detector (live_view.py). If the stream
+        // is unreachable, fall back to reloading the camera{N}_live.jpg snapshot.
+        const LIVE_VIEW_URL = `${window.location.protocol}//${window.location.hostname}:8002`;
+        const cameraFeedFallback = {};
+
+        function startCameraStreams() {
+            [1, 2].forEach(cam => {
+                const img = document.getElementById(`camera${cam}Feed`);
+                if (img && cameraFeedFallback[cam] !== false) {
+                    cameraFeedFallback[cam] = false;
+                    img.style.display = '';
+                    img.nextElementSibling.style.display = 'none';
+                    img.src = `${LIVE_VIEW_URL}/camera/${cam}.mjpg`;
+                }
+            });
+        }
+
+        function onCameraFeedError(img) {
+            const cam = img.id.replace('camera', '').replace('Feed', '');
+            if (!cameraFeedFallback[cam]) {
+                cameraFeedFallback[cam] = true;
+                img.src = `camera_frames/camera${cam}_live.jpg?` + new Date().getTime();
+                return;
             }
+            img.style.display = 'none';
+            img.nextElementSibling.style.display = 'flex';
+        }
+
+        function refreshCameraFeeds() {
+            [1, 2].forEach(cam => {
+                const img = document.getElementById(`camera${cam}Feed`);
+                if (img && cameraFeedFallback[cam]) {
+                    img.src = `camera_frames/camera${cam}_live.jpg?` + new Date().getTime();
+                }
+            });
         }
 
         // ========================================
@@ -822,14 +899,21 @@ async function sendAlertToAllFirefighters() {
             initChart();
             await fetchData();
             
-            // Auto-refresh data every 3 seconds
-            setInterval(fetchData, 3000);
+            // Live updates are pushed by the event server; poll every 3 seconds
+            // only while the stream is not connected
+            connectEventStream();
+            setInterval(() => {
+                if (!eventStreamConnected) fetchData();
+            }, 3000);
             
-            // Auto-refresh camera feeds every 500ms
+            // Camera feeds stream live; snapshot fallback refreshes every 500ms,
+            // and the streams are retried every 30 seconds
+            startCameraStreams();
             setInterval(refreshCameraFeeds, 500);
+            setInterval(startCameraStreams, 30000);
             
             console.log('Dashboard initialized');
-            console.log('Data refreshes every 3 seconds');
+            console.log('Data is pushed live (falls back to refreshing every 3 seconds)');
         }
 
         document.addEventListener('DOMContentLoaded', init);
\ No newline at end of file
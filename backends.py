@@ -0,0 +1,377 @@
+"""
+Fire Detection System - Inference Backends
+Loads the fire/smoke model through PyTorch (Ultralytics), ONNX Runtime or
+OpenVINO and returns the same normalized detections from each
+"""
+
+import ast
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+import cv2
+
+# Defaults
+CONF_THRESHOLD = 0.25     # Same default confidence cut-off as Ultralytics predict
+IOU_THRESHOLD = 0.45      # NMS IoU threshold for exported models
+LETTERBOX_COLOR = (114, 114, 114)
+MAX_BOX_SIZE = 7680       # Class offset used to run class-aware NMS in one pass
+
+# Detection categories derived from the model's class names
+CATEGORY_OTHER = 0
+CATEGORY_FIRE = 1
+CATEGORY_SMOKE = 2
+NUM_CATEGORIES = 3
+
+
+class Detections(namedtuple('Detections', ['boxes', 'scores', 'classes', 'categories', 'names'])):
+    """
+    Detections for one frame, whatever backend produced them.
+
+    boxes are (N, 4) float32 x1, y1, x2, y2 in frame pixels, scores (N,)
+    float32, classes (N,) int64, categories (N,) the CATEGORY_* of each
+    class and names the model's {class_id: name} map.
+    """
+    __slots__ = ()
+
+    @property
+    def data(self):
+        """(N, 6) array of x1, y1, x2, y2, confidence, class"""
+        return np.concatenate(
+            [self.boxes, self.scores[:, None], self.classes[:, None].astype(np.float32)], axis=1)
+
+    def __len__(self):
+        return len(self.scores)
+
+
+def empty_detections(names):
+    return Detections(
+        np.empty((0, 4), dtype=np.float32),
+        np.empty(0, dtype=np.float32),
+        np.empty(0, dtype=np.int64),
+        np.empty(0, dtype=np.int64),
+        names
+    )
+
+
+def build_category_map(names):
+    """
+    Map every class id to CATEGORY_FIRE / CATEGORY_SMOKE / CATEGORY_OTHER
+    once per model, so per-frame work is a single array lookup.
+    """
+    size = max(names) + 1 if names else 0
+    category_map = np.full(size, CATEGORY_OTHER, dtype=np.int64)
+    for cls_id, name in names.items():
+        name = name.lower()
+        if 'fire' in name:
+            category_map[cls_id] = CATEGORY_FIRE
+        elif 'smoke' in name:
+            category_map[cls_id] = CATEGORY_SMOKE
+    return category_map
+
+
+def max_confidence_by_category(detections_list):
+    """
+    Highest confidence per category for a batch of frames, as an
+    (n_frames, NUM_CATEGORIES) array (0 where a category is absent).
+    """
+    result = np.zeros((len(detections_list), NUM_CATEGORIES), dtype=np.float32)
+    if not detections_list:
+        return result
+    counts = [len(d.scores) for d in detections_list]
+    if sum(counts) == 0:
+        return result
+    frame_index = np.repeat(np.arange(len(detections_list)), counts)
+    categories = np.concatenate([d.categories for d in detections_list])
+    scores = np.concatenate([d.scores for d in detections_list])
+    np.maximum.at(result, (frame_index, categories), scores)
+    return result
+
+
+class UltralyticsBackend:
+    """PyTorch model run through Ultralytics YOLO on the CPU"""
+
+    name = 'ultralytics'
+
+    def __init__(self, model_path, conf=CONF_THRESHOLD):
+        # FORCE CPU USAGE (fixes old GPU compatibility issues)
+        import torch
+        torch.cuda.is_available = lambda: False
+        from ultralytics import YOLO
+
+        self.model = YOLO(model_path)
+        self.names = dict(self.model.names)
+        self.category_map = build_category_map(self.names)
+        self.conf = conf
+
+    def predict(self, frames):
+        """Run the model on a list of BGR frames. Returns one Detections per frame."""
+        results = self.model.predict(source=list(frames), conf=self.conf, verbose=False)
+        detections = []
+        for result in results:
+            data = result.boxes.data.cpu().numpy()
+            classes = data[:, 5].astype(np.int64)
+            detections.append(Detections(
+                data[:, :4].astype(np.float32),
+                data[:, 4].astype(np.float32),
+                classes,
+                self.category_map[classes],
+                self.names
+            ))
+        return detections
+
+
+class _ExportedYoloBackend:
+    """
+    Shared pre/post-processing for YOLOv8 models exported by Ultralytics.
+    Input is (B, 3, S, S) RGB in [0, 1]; output is (B, 4 + classes, anchors)
+    holding cx, cy, w, h and per-class scores.
+    """
+
+    name = None
+
+    def __init__(self, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD):
+        self.conf = conf
+        self.iou = iou
+        self.imgsz = 640
+        self.batch_size = 1   # Fixed batch dimension of the exported graph (None = dynamic)
+        self.names = {}
+        self.category_map = build_category_map(self.names)
+
+    def _letterbox(self, frame):
+        """Resize keeping aspect ratio and pad to imgsz. Returns (blob, ratio, (pad_x, pad_y))."""
+        h, w = frame.shape[:2]
+        ratio = min(self.imgsz / h, self.imgsz / w)
+        new_w, new_h = int(round(w * ratio)), int(round(h * ratio))
+        pad_x = (self.imgsz - new_w) / 2
+        pad_y = (self.imgsz - new_h) / 2
+
+        resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        top, left = int(round(pad_y - 0.1)), int(round(pad_x - 0.1))
+        bottom, right = self.imgsz - new_h - top, self.imgsz - new_w - left
+        padded = cv2.copyMakeBorder(resized, top, bottom, left, right,
+                                    cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+
+        blob = cv2.dnn.blobFromImage(padded, scalefactor=1 / 255.0, swapRB=True)
+        return blob, ratio, (left, top)
+
+    def _postprocess(self, output, ratio, pad, shape):
+        """Decode one image's raw output into Detections in frame coordinates"""
+        predictions = output.T                       # (anchors, 4 + classes)
+        class_scores = predictions[:, 4:]
+        classes = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(classes)), classes]
+
+        keep = scores >= self.conf
+        if not np.any(keep):
+            return empty_detections(self.names)
+        predictions, classes, scores = predictions[keep], classes[keep], scores[keep]
+
+        cx, cy, w, h = predictions[:, 0], predictions[:, 1], predictions[:, 2], predictions[:, 3]
+        boxes = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1)
+
+        # Class-aware NMS in one call by shifting each class into its own region
+        offsets = classes[:, None] * MAX_BOX_SIZE
+        shifted = boxes + offsets
+        xywh = np.concatenate([shifted[:, :2], shifted[:, 2:] - shifted[:, :2]], axis=1)
+        indices = cv2.dnn.NMSBoxes(xywh.tolist(), scores.tolist(), self.conf, self.iou)
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+
+        boxes, scores, classes = boxes[indices], scores[indices], classes[indices]
+        boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad[0]) / ratio
+        boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad[1]) / ratio
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, shape[1])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, shape[0])
+
+        classes = classes.astype(np.int64)
+        return Detections(boxes.astype(np.float32), scores.astype(np.float32),
+                          classes, self._categories(classes), self.names)
+
+    def _categories(self, classes):
+        if len(self.category_map) == 0:
+            return np.full_like(classes, CATEGORY_OTHER)
+        # Classes missing from the names metadata count as 'other'
+        known = classes < len(self.category_map)
+        return np.where(known, self.category_map[np.where(known, classes, 0)], CATEGORY_OTHER)
+
+    def _infer(self, blob):
+        raise NotImplementedError
+
+    def predict(self, frames):
+        """Run the model on a list of BGR frames. Returns one Detections per frame."""
+        prepared = [self._letterbox(frame) for frame in frames]
+        step = self.batch_size or len(prepared)
+
+        detections = []
+        for start in range(0, len(prepared), step):
+            chunk = prepared[start:start + step]
+            blob = np.concatenate([blob for blob, _, _ in chunk], axis=0)
+            outputs = self._infer(blob)
+            for output, (_, ratio, pad), frame in zip(outputs, chunk, frames[start:start + step]):
+                detections.append(self._postprocess(output, ratio, pad, frame.shape))
+        return detections
+
+
+class OnnxBackend(_ExportedYoloBackend):
+    """Exported ONNX model (FP32 or INT8-quantized) run through ONNX Runtime on the CPU"""
+
+    name = 'onnx'
+
+    def __init__(self, model_path, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, threads=None):
+        super().__init__(conf, iou)
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("The ONNX backend needs onnxruntime: pip install onnxruntime")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        batch, _, height, _ = model_input.shape
+        self.imgsz = height if isinstance(height, int) else 640
+        self.batch_size = batch if isinstance(batch, int) else None
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = _parse_names(metadata.get('names'))
+        self.category_map = build_category_map(self.names)
+
+    def _infer(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVINOBackend(_ExportedYoloBackend):
+    """Exported OpenVINO IR model (FP32 or INT8) run on the CPU"""
+
+    name = 'openvino'
+
+    def __init__(self, model_path, conf=CONF_THRESHOLD, iou=IOU_THRESHOLD, threads=None):
+        super().__init__(conf, iou)
+        try:
+            import openvino as ov
+        except ImportError:
+            raise ImportError("The OpenVINO backend needs openvino: pip install openvino")
+
+        xml_path = _find_openvino_xml(model_path)
+        core = ov.Core()
+        config = {'PERFORMANCE_HINT': 'LATENCY'}
+        if threads:
+            config['INFERENCE_NUM_THREADS'] = threads
+        self.compiled = core.compile_model(xml_path, 'CPU', config)
+        self.output = self.compiled.output(0)
+
+        shape = self.compiled.input(0).get_partial_shape()
+        self.imgsz = shape[2].get_length() if shape[2].is_static else 640
+        self.batch_size = shape[0].get_length() if shape[0].is_static else None
+
+        self.names = _read_openvino_names(os.path.dirname(xml_path))
+        self.category_map = build_category_map(self.names)
+
+    def _infer(self, blob):
+        return self.compiled(blob)[self.output]
+
+
+BACKENDS = {
+    'ultralytics': UltralyticsBackend,
+    'onnx': OnnxBackend,
+    'openvino': OpenVINOBackend
+}
+
+
+def load_backend(model_path, backend='auto', **kwargs):
+    """
+    Load a model through the named backend. 'auto' picks one from the path:
+    .onnx -> onnx, an OpenVINO export folder or .xml -> openvino, anything
+    else -> ultralytics.
+    """
+    if backend == 'auto':
+        if model_path.endswith('.onnx'):
+            backend = 'onnx'
+        elif model_path.endswith('.xml') or model_path.rstrip('/').endswith('_openvino_model'):
+            backend = 'openvino'
+        else:
+            backend = 'ultralytics'
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}")
+
+    start = time.time()
+    loaded = BACKENDS[backend](model_path, **kwargs)
+    print(f"Loaded {model_path} with {backend} backend in {time.time() - start:.1f}s")
+    return loaded
+
+
+def export_model(model_path, fmt='onnx', int8=False, imgsz=640, calibration_data=None):
+    """
+    Export the PyTorch model for the ONNX or OpenVINO backend and return the
+    exported path. INT8 ONNX models are produced with ONNX Runtime dynamic
+    quantization; INT8 OpenVINO export needs a calibration dataset yaml.
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+    if fmt == 'onnx':
+        exported = model.export(format='onnx', imgsz=imgsz, dynamic=True, simplify=True)
+        if int8:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantized = exported.replace('.onnx', '_int8.onnx')
+            quantize_dynamic(exported, quantized, weight_type=QuantType.QUInt8)
+            exported = quantized
+    elif fmt == 'openvino':
+        kwargs = {'data': calibration_data} if int8 and calibration_data else {}
+        exported = model.export(format='openvino', imgsz=imgsz, int8=int8, **kwargs)
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    print(f"Exported {model_path} -> {exported}")
+    return exported
+
+
+def _parse_names(raw):
+    """Parse the names metadata Ultralytics stores in exported models"""
+    if not raw:
+        return {}
+    try:
+        return {int(k): str(v) for k, v in ast.literal_eval(raw).items()}
+    except (ValueError, SyntaxError):
+        return {}
+
+
+def _find_openvino_xml(model_path):
+    if os.path.isdir(model_path):
+        for filename in os.listdir(model_path):
+            if filename.endswith('.xml'):
+                return os.path.join(model_path, filename)
+        raise FileNotFoundError(f"No OpenVINO .xml model in {model_path}")
+    return model_path
+
+
+def _read_openvino_names(folder):
+    """Class names from the metadata.yaml Ultralytics writes next to an OpenVINO export"""
+    path = os.path.join(folder, 'metadata.yaml')
+    if not os.path.exists(path):
+        return {}
+    try:
+        import yaml
+    except ImportError:
+        return {}
+    with open(path) as f:
+        metadata = yaml.safe_load(f) or {}
+    return {int(k): str(v) for k, v in (metadata.get('names') or {}).items()}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export the fire model for CPU backends")
+    parser.add_argument("model", help="PyTorch model to export (e.g. 10best.pt)")
+    parser.add_argument("--format", choices=['onnx', 'openvino'], default='onnx')
+    parser.add_argument("--int8", action="store_true", help="Also quantize to INT8")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--data", help="Calibration dataset yaml (OpenVINO INT8)")
+    args = parser.parse_args()
+
+    export_model(args.model, args.format, args.int8, args.imgsz, args.data)
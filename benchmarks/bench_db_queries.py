@@ -0,0 +1,128 @@
+"""
+Fire Detection System - Database Query Benchmark
+Seeds a scratch database with large detection/alert/activity tables and
+times the dashboard and firefighter queries before and after the schema
+migrations (indexes) are applied
+
+Usage: python benchmarks/bench_db_queries.py [--rows 1000000] [--repeat 20]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+QUERIES = [
+    ("get_detections", lambda: database.get_detections(100)),
+    ("get_alerts", lambda: database.get_alerts(20)),
+    ("get_activity", lambda: database.get_activity(50)),
+    ("pending alerts (firefighter)", lambda: database.get_pending_firefighter_alerts(firefighter_id=7)),
+    ("pending alerts (station)", lambda: database.get_pending_firefighter_alerts(station_id=2)),
+    ("pending alerts (all)", lambda: database.get_pending_firefighter_alerts()),
+    ("alert history (firefighter)", lambda: database.get_firefighter_alert_history(firefighter_id=7)),
+    ("alert history (station)", lambda: database.get_firefighter_alert_history(station_id=2)),
+]
+
+# SQL behind the queries above, for EXPLAIN QUERY PLAN
+PLANS = [
+    ("get_detections", "SELECT * FROM detections ORDER BY timestamp DESC LIMIT 100"),
+    ("pending alerts (firefighter)",
+     "SELECT * FROM firefighter_alerts WHERE firefighter_id = 7 AND status = 'pending' ORDER BY received_at DESC"),
+    ("alert history (station)",
+     "SELECT * FROM firefighter_alerts WHERE station_id = 2 AND status != 'pending' ORDER BY received_at DESC LIMIT 20"),
+]
+
+
+def _timestamps(count, start):
+    for i in range(count):
+        yield (start + timedelta(seconds=i * 5)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def seed(rows):
+    """Fill detections/alerts/activity with `rows` rows each and firefighter_alerts with as many"""
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    with database.get_db() as conn:
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO detections (camera_id, camera_name, detection_type, confidence, location, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', ((1 + i % 2, f"Camera {1 + i % 2}", rng.choice(('fire', 'smoke')), rng.random(), 'Bench', ts)
+              for i, ts in enumerate(_timestamps(rows, start))))
+        cursor.executemany('''
+            INSERT INTO alerts (detection_id, alert_level, message, status, timestamp) VALUES (?, ?, ?, ?, ?)
+        ''', ((i + 1, 'warning', 'Bench alert', 'resolved', ts) for i, ts in enumerate(_timestamps(rows, start))))
+        cursor.executemany("INSERT INTO activity (message, timestamp) VALUES (?, ?)",
+                           (('Bench activity', ts) for ts in _timestamps(rows, start)))
+        # Almost every firefighter alert has been answered; a handful are still pending
+        cursor.executemany('''
+            INSERT INTO firefighter_alerts (alert_id, detection_id, firefighter_id, station_id, alert_type,
+                                            status, received_at)
+            VALUES (?, ?, ?, ?, 'fire', ?, ?)
+        ''', ((i + 1, i + 1, rng.randint(1, 50), rng.randint(1, 3),
+               'pending' if rng.random() < 0.001 else 'responded', ts)
+              for i, ts in enumerate(_timestamps(rows, start))))
+        conn.commit()
+
+
+def time_queries(repeat):
+    results = {}
+    for name, query in QUERIES:
+        query()  # warm the page cache
+        start = time.perf_counter()
+        for _ in range(repeat):
+            query()
+        results[name] = (time.perf_counter() - start) / repeat * 1000
+    return results
+
+
+def print_plans(title):
+    print(f"\n{title}")
+    with database.get_db() as conn:
+        for name, sql in PLANS:
+            details = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+            print(f"  {name:30s} {' | '.join(details)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dashboard queries before/after migrations')
+    parser.add_argument('--rows', type=int, default=1000000, help='Rows per seeded table')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE_PATH = os.path.join(tmp, 'bench.db')
+        database.init_database(migrate=False)
+
+        print(f"Seeding {args.rows:,} rows per table...")
+        start = time.perf_counter()
+        seed(args.rows)
+        print(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+        print_plans("Query plans before migrations:")
+        before = time_queries(args.repeat)
+
+        start = time.perf_counter()
+        database.migrate_database()
+        print(f"Migrations applied in {time.perf_counter() - start:.1f}s")
+
+        print_plans("Query plans after migrations:")
+        after = time_queries(args.repeat)
+
+        print(f"\n{'Query':30s} {'Before (ms)':>12s} {'After (ms)':>12s} {'Speedup':>9s}")
+        for name, _ in QUERIES:
+            speedup = before[name] / after[name] if after[name] > 0 else float('inf')
+            print(f"{name:30s} {before[name]:12.2f} {after[name]:12.2f} {speedup:8.1f}x")
+
+        database.close_db()
+
+
+if __name__ == "__main__":
+    main()
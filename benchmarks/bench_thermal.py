@@ -0,0 +1,93 @@
+"""
+Fire Detection System - Thermal Simulation Benchmark
+Times the old per-frame thermal chain (cvtColor -> CLAHE -> resize down ->
+resize up -> applyColorMap) against ThermalSimulator, checks that both give
+the same image, and counts the bytes allocated per frame
+
+Usage: python benchmarks/bench_thermal.py [--sizes 640x480 1280x720 1920x1080] [--repeat 100]
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from thermal import ThermalSimulator, THERMAL_GRID_WIDTH, CLAHE_CLIP_LIMIT, CLAHE_TILE_GRID, THERMAL_COLORMAP
+
+
+def legacy_thermal(frame, clahe):
+    """The chain detect_dual_cameras used to run on every frame"""
+    h, w, _ = frame.shape
+    thermal_h = int(h * (THERMAL_GRID_WIDTH / w))
+    gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    enhanced_gray = clahe.apply(gray_frame)
+    small_pixelated = cv2.resize(enhanced_gray, (THERMAL_GRID_WIDTH, thermal_h), interpolation=cv2.INTER_AREA)
+    pixelated_gray = cv2.resize(small_pixelated, (w, h), interpolation=cv2.INTER_NEAREST)
+    return cv2.applyColorMap(pixelated_gray, THERMAL_COLORMAP)
+
+
+def make_frame(width, height, seed=0):
+    """Smooth synthetic scene with bright blobs"""
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (9, 16, 3), dtype=np.uint8)
+    frame = cv2.resize(coarse, (width, height), interpolation=cv2.INTER_CUBIC)
+    noise = rng.integers(0, 32, (height, width, 3), dtype=np.uint8)
+    return cv2.add(frame, noise)
+
+
+def time_per_frame(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def allocated_per_frame(fn, repeat=10):
+    """Peak bytes traced by tracemalloc (NumPy buffers) over repeat calls"""
+    fn()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    for _ in range(repeat):
+        fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak - base
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Thermal simulation benchmark")
+    parser.add_argument("--sizes", nargs="+", default=["640x480", "1280x720", "1920x1080"],
+                        help="Frame sizes as WIDTHxHEIGHT")
+    parser.add_argument("--repeat", type=int, default=100, help="Frames per measurement")
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'legacy':>10} {'simulator':>10} {'cached':>10} {'speedup':>8} "
+          f"{'legacy alloc':>13} {'sim alloc':>10}  identical")
+    for size in args.sizes:
+        width, height = (int(v) for v in size.lower().split("x"))
+        frame = make_frame(width, height)
+        clahe = cv2.createCLAHE(clipLimit=CLAHE_CLIP_LIMIT, tileGridSize=CLAHE_TILE_GRID)
+        simulator = ThermalSimulator()
+
+        identical = np.array_equal(legacy_thermal(frame, clahe), simulator.render(frame))
+        legacy = time_per_frame(lambda: legacy_thermal(frame, clahe), args.repeat)
+        uncached = time_per_frame(lambda: simulator.render(frame), args.repeat)
+        simulator.render(frame, key=("bench", 1))
+        cached = time_per_frame(lambda: simulator.render(frame, key=("bench", 1)), args.repeat)
+        legacy_alloc = allocated_per_frame(lambda: legacy_thermal(frame, clahe))
+        simulator_alloc = allocated_per_frame(lambda: simulator.render(frame))
+
+        print(f"{size:>10} {legacy * 1000:>8.2f}ms {uncached * 1000:>8.2f}ms {cached * 1e6:>8.1f}us "
+              f"{legacy / uncached:>7.2f}x {legacy_alloc / 1024:>10.0f}KiB {simulator_alloc / 1024:>7.0f}KiB  {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,13 +7,17 @@ import cv2
 import time
 import sys
 import os
+import socket
+import http.client
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from datetime import datetime
 
 # Add parent directory to path for database import
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 try:
-    from database import get_cameras, update_camera_status, add_activity
+    from database import get_cameras, update_camera_statuses, get_camera_heartbeats
     HAS_DATABASE = True
 except ImportError:
     HAS_DATABASE = False
@@ -29,42 +33,93 @@ IP_CAMERAS = [
 
 CHECK_INTERVAL = 5  # Seconds between checks when monitoring
 FRAME_TIMEOUT = 3   # Seconds to wait for a frame
+PROBE_GRACE_SEC = 2  # Extra time a probe gets (opening the device) before the scan gives up on it
+SCAN_MAX_WORKERS = 16  # Cameras probed at the same time
 
+# Health monitor
+HEARTBEAT_STALE_SEC = 10   # A camera whose pipeline reported a frame this recently is online
+MAX_BACKOFF_SEC = 300      # Longest wait between probes of an offline camera
 
-def check_usb_camera(index, timeout=FRAME_TIMEOUT):
+
+def _open_capture(source, timeout):
+    """Open a capture, asking the backend to give up on slow network sources"""
+    if isinstance(source, str) and hasattr(cv2, "CAP_PROP_OPEN_TIMEOUT_MSEC"):
+        timeout_ms = int(timeout * 1000)
+        try:
+            return cv2.VideoCapture(source, cv2.CAP_FFMPEG, [
+                cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, timeout_ms,
+                cv2.CAP_PROP_READ_TIMEOUT_MSEC, timeout_ms
+            ])
+        except cv2.error:
+            pass
+    return cv2.VideoCapture(source)
+
+
+def parse_camera_source(source):
     """
-    Check if a USB camera at the given index is available and working.
-    Returns (is_active, frame) tuple.
+    Interpret a cameras.source value: a USB index ('0'), a stream URL, or
+    'thermal:<id>' for a thermal view simulated from camera <id>'s frames.
+    Returns (kind, value) with kind 'usb', 'url' or 'thermal', or None if unset.
+    """
+    if source is None or not str(source).strip():
+        return None
+    source = str(source).strip()
+    if source.isdigit():
+        return ("usb", int(source))
+    if source.startswith("thermal:"):
+        return ("thermal", int(source.split(":", 1)[1]))
+    return ("url", source)
+
+
+def probe_camera(source, timeout=FRAME_TIMEOUT):
+    """
+    Open a camera (USB index or URL) once, read its properties and try to
+    grab a frame within timeout seconds.
+    Returns a dict with is_active, frame, width, height, fps and probe_time.
     """
+    start_time = time.time()
+    result = {"is_active": False, "frame": None, "width": 0, "height": 0, "fps": 0.0}
+    cap = None
     try:
-        cap = cv2.VideoCapture(index)
+        cap = _open_capture(source, timeout)
         
-        if not cap.isOpened():
-            return False, None
-        
-        # Set a short timeout
-        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-        
-        # Try to read a frame
-        start_time = time.time()
-        ret = False
-        frame = None
-        
-        while time.time() - start_time < timeout:
-            ret, frame = cap.read()
-            if ret:
-                break
-            time.sleep(0.1)
-        
-        cap.release()
-        
-        if ret and frame is not None:
-            return True, frame
-        return False, None
+        if cap.isOpened():
+            # Set a short timeout
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            
+            # Properties come from this same open, no second VideoCapture needed
+            result["width"] = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            result["height"] = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            result["fps"] = cap.get(cv2.CAP_PROP_FPS)
+            
+            # Try to read a frame
+            while time.time() - start_time < timeout:
+                ret, frame = cap.read()
+                if ret and frame is not None:
+                    result["is_active"] = True
+                    result["frame"] = frame
+                    if not result["width"]:
+                        result["height"], result["width"] = frame.shape[:2]
+                    break
+                time.sleep(0.1)
         
     except Exception as e:
-        print(f"Error checking USB camera {index}: {e}")
-        return False, None
+        print(f"Error checking camera {source}: {e}")
+    finally:
+        if cap is not None:
+            cap.release()
+    
+    result["probe_time"] = time.time() - start_time
+    return result
+
+
+def check_usb_camera(index, timeout=FRAME_TIMEOUT):
+    """
+    Check if a USB camera at the given index is available and working.
+    Returns (is_active, frame) tuple.
+    """
+    result = probe_camera(index, timeout)
+    return result["is_active"], result["frame"]
 
 
 def check_ip_camera(url, timeout=FRAME_TIMEOUT):
@@ -72,37 +127,22 @@ def check_ip_camera(url, timeout=FRAME_TIMEOUT):
     Check if an IP camera at the given URL is available and working.
     Returns (is_active, frame) tuple.
     """
-    try:
-        cap = cv2.VideoCapture(url)
-        
-        if not cap.isOpened():
-            return False, None
-        
-        # Try to read a frame
-        start_time = time.time()
-        ret = False
-        frame = None
-        
-        while time.time() - start_time < timeout:
-            ret, frame = cap.read()
-            if ret:
-                break
-            time.sleep(0.1)
-        
-        cap.release()
-        
-        if ret and frame is not None:
-            return True, frame
-        return False, None
-        
-    except Exception as e:
-        print(f"Error checking IP camera {url}: {e}")
-        return False, None
+    result = probe_camera(url, timeout)
+    return result["is_active"], result["frame"]
+
 
+def _camera_label(target):
+    if target["type"] == "usb":
+        return f"USB camera index {target['index']}"
+    return f"IP camera {target['url'][:50]}"
 
-def detect_all_cameras():
+
+def detect_all_cameras(timeout=FRAME_TIMEOUT):
     """
     Scan for all available cameras (USB and IP).
+    All cameras are probed concurrently; a camera that has not answered
+    within timeout + PROBE_GRACE_SEC counts as not available, so the scan
+    takes about as long as the slowest camera, not the sum of all of them.
     Returns a list of detected cameras with their info.
     """
     detected = []
@@ -113,89 +153,87 @@ def detect_all_cameras():
     print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print("-"*60)
     
-    # Check USB cameras
-    print("\nScanning USB cameras...")
-    for index in USB_CAMERA_INDICES:
-        print(f"  Checking USB camera index {index}...", end=" ", flush=True)
-        is_active, frame = check_usb_camera(index)
+    targets = [{"type": "usb", "index": index, "id": index + 1, "source": index}  # Database ID (1-based)
+               for index in USB_CAMERA_INDICES]
+    targets += [{"type": "ip", "url": ip_cam["url"], "id": ip_cam["id"], "source": ip_cam["url"]}
+                for ip_cam in IP_CAMERAS]
+    
+    print(f"\nProbing {len(targets)} cameras in parallel...")
+    scan_start = time.time()
+    deadline = scan_start + timeout + PROBE_GRACE_SEC
+    
+    executor = ThreadPoolExecutor(max_workers=max(1, min(SCAN_MAX_WORKERS, len(targets))),
+                                  thread_name_prefix="camera-probe")
+    futures = [executor.submit(probe_camera, target["source"], timeout) for target in targets]
+    
+    for target, future in zip(targets, futures):
+        label = _camera_label(target)
+        try:
+            result = future.result(timeout=max(0.0, deadline - time.time()))
+        except FutureTimeout:
+            print(f"  {label}: ✗ No answer within {timeout + PROBE_GRACE_SEC:.0f}s")
+            continue
         
-        if is_active:
-            # Get camera properties
-            cap = cv2.VideoCapture(index)
-            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            cap.release()
-            
-            camera_info = {
-                "type": "usb",
-                "index": index,
-                "id": index + 1,  # Database ID (1-based)
-                "status": "online",
-                "resolution": f"{width}x{height}",
-                "fps": fps,
-                "frame": frame
-            }
-            detected.append(camera_info)
-            print(f"✓ ACTIVE ({width}x{height} @ {fps:.1f}fps)")
+        if not result["is_active"]:
+            print(f"  {label}: ✗ Not available")
+            continue
+        
+        camera_info = {
+            "type": target["type"],
+            "id": target["id"],
+            "status": "online",
+            "resolution": f"{result['width']}x{result['height']}",
+            "fps": result["fps"],
+            "probe_time": result["probe_time"],
+            "frame": result["frame"]
+        }
+        if target["type"] == "usb":
+            camera_info["index"] = target["index"]
         else:
-            print("✗ Not available")
+            camera_info["url"] = target["url"]
+        detected.append(camera_info)
+        print(f"  {label}: ✓ ACTIVE ({camera_info['resolution']} @ {result['fps']:.1f}fps, "
+              f"{result['probe_time']:.1f}s)")
     
-    # Check IP cameras
-    if IP_CAMERAS:
-        print("\nScanning IP cameras...")
-        for ip_cam in IP_CAMERAS:
-            print(f"  Checking IP camera {ip_cam['url'][:50]}...", end=" ", flush=True)
-            is_active, frame = check_ip_camera(ip_cam["url"])
-            
-            if is_active:
-                camera_info = {
-                    "type": "ip",
-                    "url": ip_cam["url"],
-                    "id": ip_cam["id"],
-                    "status": "online",
-                    "frame": frame
-                }
-                detected.append(camera_info)
-                print("✓ ACTIVE")
-            else:
-                print("✗ Not available")
+    # Don't wait for probes stuck past the deadline; they finish in the background
+    executor.shutdown(wait=False, cancel_futures=True)
     
     print("-"*60)
-    print(f"Total cameras detected: {len(detected)}")
+    print(f"Total cameras detected: {len(detected)} (scan took {time.time() - scan_start:.1f}s)")
     print("="*60 + "\n")
     
     return detected
 
 
-def update_database_status(detected_cameras):
+def update_database_status(detected_cameras, changes=None):
     """
     Update camera status in the database.
+    Pass changes as {camera_id: 'online'/'offline'} to write only those
+    cameras; otherwise every camera missing from detected_cameras is offline.
+    All changes are written in one transaction.
     """
     if not HAS_DATABASE:
         print("Database not available, skipping status update.")
         return
     
     try:
-        # Get all cameras from database
-        db_cameras = get_cameras()
-        db_camera_ids = {cam['id'] for cam in db_cameras}
+        db_cameras = {cam['id']: cam for cam in get_cameras()}
         
-        # Get IDs of detected cameras
-        detected_ids = {cam['id'] for cam in detected_cameras}
+        if changes is None:
+            detected_ids = {cam['id'] for cam in detected_cameras}
+            changes = {camera_id: 'online' if camera_id in detected_ids else 'offline'
+                       for camera_id in db_cameras}
         
-        # Update status for each camera
-        for cam in db_cameras:
-            if cam['id'] in detected_ids:
-                if cam['status'] != 'online':
-                    update_camera_status(cam['id'], 'online')
-                    add_activity(f"{cam['name']} came online")
-                    print(f"Updated {cam['name']} to ONLINE")
-            else:
-                if cam['status'] != 'offline':
-                    update_camera_status(cam['id'], 'offline')
-                    add_activity(f"{cam['name']} went offline")
-                    print(f"Updated {cam['name']} to OFFLINE")
+        updates = []
+        for camera_id, status in changes.items():
+            cam = db_cameras.get(camera_id)
+            if cam is None or cam['status'] == status:
+                continue
+            verb = "came online" if status == 'online' else "went offline"
+            updates.append((camera_id, status, f"{cam['name']} {verb}"))
+            print(f"Updated {cam['name']} to {status.upper()}")
+        
+        update_camera_statuses(updates)
                     
     except Exception as e:
         print(f"Error updating database: {e}")
@@ -215,6 +253,157 @@ def save_test_frames(detected_cameras, output_dir="camera_frames"):
             print(f"Saved test frame: {filepath}")
 
 
+def rtsp_probe(url, timeout=FRAME_TIMEOUT):
+    """
+    Lightweight RTSP liveness check: send OPTIONS and accept any RTSP reply
+    (401 still means the server is up). No media session is opened.
+    """
+    parts = urlsplit(url)
+    try:
+        with socket.create_connection((parts.hostname, parts.port or 554), timeout=timeout) as sock:
+            sock.settimeout(timeout)
+            sock.sendall(f"OPTIONS {url} RTSP/1.0\r\nCSeq: 1\r\n\r\n".encode())
+            return sock.recv(64).startswith(b"RTSP/1.0")
+    except (OSError, TypeError):
+        return False
+
+
+def http_probe(url, timeout=FRAME_TIMEOUT):
+    """Lightweight HTTP liveness check: a HEAD request answered without a server error"""
+    parts = urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+    try:
+        conn = connection_class(parts.hostname, parts.port, timeout=timeout)
+        try:
+            conn.request("HEAD", parts.path or "/")
+            return conn.getresponse().status < 500
+        finally:
+            conn.close()
+    except (OSError, http.client.HTTPException, TypeError):
+        return False
+
+
+def liveness_probe(source, timeout=FRAME_TIMEOUT):
+    """Cheapest available liveness check for a camera source"""
+    if isinstance(source, str):
+        scheme = urlsplit(source).scheme.lower()
+        if scheme in ("rtsp", "rtsps"):
+            return rtsp_probe(source, timeout)
+        if scheme in ("http", "https"):
+            return http_probe(source, timeout)
+    return probe_camera(source, timeout)["is_active"]
+
+
+class CameraHealthMonitor:
+    """
+    Incremental camera health tracking.
+
+    A camera whose running pipeline reported a frame within
+    HEARTBEAT_STALE_SEC is online without touching the device. Other cameras
+    get a cheap liveness probe (RTSP OPTIONS, HTTP HEAD, or a short open for
+    USB devices no pipeline is using); one that has not answered within
+    timeout + PROBE_GRACE_SEC counts as offline, and is not probed again
+    while that probe is still stuck. A camera that fails is probed again
+    after an exponentially growing delay, up to max_backoff. Only cameras
+    whose status changed are written, all in one transaction.
+    """
+
+    def __init__(self, interval=CHECK_INTERVAL, stale_after=HEARTBEAT_STALE_SEC,
+                 max_backoff=MAX_BACKOFF_SEC, timeout=FRAME_TIMEOUT):
+        self.interval = interval
+        self.stale_after = stale_after
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+        self.targets = {index + 1: index for index in USB_CAMERA_INDICES}  # Database ID (1-based)
+        self.targets.update({ip_cam["id"]: ip_cam["url"] for ip_cam in IP_CAMERAS})
+        self.status = {}       # camera_id -> 'online' / 'offline' as last written
+        self.failures = {}     # camera_id -> consecutive failed probes
+        self.next_probe = {}   # camera_id -> time the camera is due for a probe
+        self.hung = {}         # camera_id -> probe future that missed its deadline
+
+        # Counters
+        self.checks = 0
+        self.probes = 0
+        self.probe_timeouts = 0
+        self.heartbeat_hits = 0
+        self.changes_written = 0
+
+    def _backoff(self, failures):
+        return min(self.interval * (2 ** (failures - 1)), self.max_backoff)
+
+    def check(self, now=None):
+        """
+        One monitoring pass. Returns {camera_id: status} for the cameras
+        whose status changed.
+        """
+        now = now if now is not None else time.time()
+        self.checks += 1
+        heartbeats = get_camera_heartbeats() if HAS_DATABASE else {}
+
+        observed = {}
+        to_probe = []
+        for camera_id, source in self.targets.items():
+            heartbeat = heartbeats.get(camera_id)
+            if heartbeat and now - heartbeat['last_frame_at'] <= self.stale_after:
+                self.heartbeat_hits += 1
+                observed[camera_id] = True
+            elif camera_id in self.hung and not self.hung[camera_id].done():
+                # Still stuck in an earlier probe; don't open the device again
+                observed[camera_id] = False
+            elif now >= self.next_probe.get(camera_id, 0.0):
+                self.hung.pop(camera_id, None)
+                to_probe.append((camera_id, source))
+
+        if to_probe:
+            self.probes += len(to_probe)
+            deadline = time.time() + self.timeout + PROBE_GRACE_SEC
+            executor = ThreadPoolExecutor(max_workers=min(SCAN_MAX_WORKERS, len(to_probe)),
+                                          thread_name_prefix="camera-health")
+            futures = [executor.submit(liveness_probe, source, self.timeout) for _, source in to_probe]
+            for (camera_id, _), future in zip(to_probe, futures):
+                try:
+                    observed[camera_id] = future.result(timeout=max(0.0, deadline - time.time()))
+                except FutureTimeout:
+                    # A hung open must not hold up every other camera's status
+                    self.probe_timeouts += 1
+                    self.hung[camera_id] = future
+                    observed[camera_id] = False
+            # Don't wait for probes stuck past the deadline; they finish in the background
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        changes = {}
+        for camera_id, alive in observed.items():
+            if alive:
+                self.failures[camera_id] = 0
+                self.next_probe[camera_id] = now + self.interval
+            else:
+                self.failures[camera_id] = self.failures.get(camera_id, 0) + 1
+                self.next_probe[camera_id] = now + self._backoff(self.failures[camera_id])
+            status = 'online' if alive else 'offline'
+            if self.status.get(camera_id) != status:
+                self.status[camera_id] = status
+                changes[camera_id] = status
+        
+        if changes:
+            update_database_status([], changes)
+            self.changes_written += len(changes)
+        return changes
+
+    def get_stats(self):
+        """Monitor counters for monitoring"""
+        return {
+            'checks': self.checks,
+            'probes': self.probes,
+            'probe_timeouts': self.probe_timeouts,
+            'heartbeat_hits': self.heartbeat_hits,
+            'changes_written': self.changes_written,
+            'offline': {camera_id: {'failures': self.failures.get(camera_id, 0),
+                                    'next_probe': self.next_probe.get(camera_id)}
+                        for camera_id, status in self.status.items() if status == 'offline'}
+        }
+
+
 def monitor_cameras(interval=CHECK_INTERVAL):
     """
     Continuously monitor cameras and update their status.
@@ -224,15 +413,16 @@ def monitor_cameras(interval=CHECK_INTERVAL):
     print(f"Checking every {interval} seconds. Press Ctrl+C to stop.")
     print("="*60 + "\n")
     
+    monitor = CameraHealthMonitor(interval=interval)
     try:
         while True:
-            detected = detect_all_cameras()
-            update_database_status(detected)
+            changes = monitor.check()
             
-            # Print summary
-            online_count = len(detected)
-            print(f"\n[{datetime.now().strftime('%H:%M:%S')}] "
-                  f"Cameras online: {online_count}")
+            # Print summary when something changed
+            if changes:
+                online_count = sum(1 for status in monitor.status.values() if status == 'online')
+                print(f"\n[{datetime.now().strftime('%H:%M:%S')}] "
+                      f"Cameras online: {online_count}")
             
             time.sleep(interval)
             
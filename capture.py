@@ -0,0 +1,139 @@
+"""
+Fire Detection System - Capture Stage
+Reads each camera on its own thread and keeps only the latest frame, so a
+slow detector never makes the driver buffer stale frames
+"""
+
+import threading
+import time
+
+import cv2
+
+READ_RETRY_DELAY = 0.1   # Seconds to wait after a failed read before retrying
+MAX_READ_FAILURES = 50   # Consecutive failed reads before the source is treated as ended
+
+
+class CaptureStage:
+    """
+    Background capture for one cv2.VideoCapture source.
+
+    The capture thread overwrites a single slot with every new frame
+    (drop-oldest). read() returns the newest frame the consumer has not seen
+    yet; any frame replaced before it was read counts as dropped.
+
+    frame_ready (a threading.Event, possibly shared by several captures) is
+    set whenever a new frame arrives, so one consumer can wait on many.
+    """
+
+    def __init__(self, source, name=None, frame_ready=None):
+        self.source = source
+        self.name = name or f"capture-{source}"
+        self.frame_ready = frame_ready
+        self.cap = None
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._timestamp = 0.0
+        self._read_seq = 0
+        self._running = False
+        self._ended = False
+        self._thread = None
+
+        # Counters
+        self.frames_captured = 0
+        self.frames_dropped = 0
+
+    def start(self):
+        """Open the source and start the capture thread. Returns False if it cannot be opened."""
+        self.cap = cv2.VideoCapture(self.source)
+        if not self.cap.isOpened():
+            self.cap.release()
+            self.cap = None
+            return False
+        # Keep the driver-side queue as short as possible
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """Stop the capture thread and release the device"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def read(self, timeout=None):
+        """
+        Wait for a frame newer than the last one read.
+        Returns (seq, timestamp, frame), or None once the source has ended.
+        """
+        with self._cond:
+            deadline = None if timeout is None else time.time() + timeout
+            while self._seq == self._read_seq and not self._ended:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            if self._seq == self._read_seq:
+                return None
+            self._read_seq = self._seq
+            return self._seq, self._timestamp, self._frame
+
+    def queue_depth(self):
+        """Frames waiting for the consumer (0 or 1, older ones are dropped)"""
+        with self._cond:
+            return 1 if self._seq != self._read_seq else 0
+
+    @property
+    def ended(self):
+        return self._ended
+
+    def get_stats(self):
+        """Capture counters for monitoring"""
+        return {
+            'source': self.source,
+            'frames_captured': self.frames_captured,
+            'frames_dropped': self.frames_dropped,
+            'queue_depth': self.queue_depth(),
+            'last_frame_at': self._timestamp
+        }
+
+    def _run(self):
+        failures = 0
+        while self._running:
+            ret, frame = self.cap.read()
+            now = time.time()
+
+            if not ret:
+                failures += 1
+                if failures >= MAX_READ_FAILURES:
+                    break
+                time.sleep(READ_RETRY_DELAY)
+                continue
+            failures = 0
+
+            with self._cond:
+                if self._seq != self._read_seq:
+                    self.frames_dropped += 1
+                self._frame = frame
+                self._seq += 1
+                self._timestamp = now
+                self.frames_captured += 1
+                self._cond.notify_all()
+            if self.frame_ready is not None:
+                self.frame_ready.set()
+
+        with self._cond:
+            self._ended = True
+            self._cond.notify_all()
+        if self.frame_ready is not None:
+            self.frame_ready.set()
@@ -0,0 +1,518 @@
+"""
+Fire Detection System - Detection Clips
+Renders detection clips from buffered frames and the detections already
+computed for them. Encoding runs in a process pool fed by a persistent,
+prioritized job queue so live detection never pauses
+"""
+
+import heapq
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import cv2
+
+from database import (
+    update_detection_clip, create_clip_job, update_clip_job, get_unfinished_clip_jobs
+)
+from thermal import ThermalSimulator
+
+# Configuration
+MAX_HOLD_SEC = 1.0        # Longest gap a box is carried across with no keyframe on the other side
+MATCH_IOU = 0.1           # Min IoU for two boxes of the same class to be treated as one object
+
+CLIP_ENCODE_WORKERS = 2   # Encoder processes
+MAX_QUEUED_CLIPS = 16     # Clips waiting for an encoder before backpressure kicks in
+SPOOL_DIR = os.path.join("detected_clips", ".spool")
+SPOOL_JPEG_QUALITY = 95   # Quality used when spooling raw frames to disk
+
+# Lower value is encoded first; fire clips may evict queued smoke clips when full
+CLIP_PRIORITIES = {'fire': 0, 'smoke': 1}
+DEFAULT_CLIP_PRIORITY = 2
+
+BOX_COLORS = {
+    'fire': (0, 0, 255),
+    'smoke': (160, 160, 160)
+}
+DEFAULT_BOX_COLOR = (0, 255, 255)
+
+
+def box_iou(a, b):
+    """Pairwise IoU between two (N, 4+) and (M, 4+) xyxy box arrays"""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def match_boxes(d0, d1, min_iou=MATCH_IOU):
+    """Greedy same-class matching by IoU. Returns (pairs, unmatched_0, unmatched_1)."""
+    if len(d0) == 0 or len(d1) == 0:
+        return [], list(range(len(d0))), list(range(len(d1)))
+
+    iou = box_iou(d0, d1)
+    iou[d0[:, None, 5] != d1[None, :, 5]] = 0.0
+
+    pairs = []
+    used_0, used_1 = set(), set()
+    for flat in np.argsort(iou, axis=None)[::-1]:
+        i, j = np.unravel_index(flat, iou.shape)
+        if iou[i, j] < min_iou:
+            break
+        if i in used_0 or j in used_1:
+            continue
+        pairs.append((int(i), int(j)))
+        used_0.add(i)
+        used_1.add(j)
+
+    unmatched_0 = [i for i in range(len(d0)) if i not in used_0]
+    unmatched_1 = [j for j in range(len(d1)) if j not in used_1]
+    return pairs, unmatched_0, unmatched_1
+
+
+def interpolate_detections(t, t0, d0, t1, d1):
+    """
+    Estimate the detections at time t between keyframes (t0, d0) and (t1, d1).
+    Matched boxes are linearly interpolated; unmatched ones are kept by
+    whichever keyframe is closer.
+    """
+    alpha = (t - t0) / (t1 - t0) if t1 > t0 else 0.0
+    pairs, unmatched_0, unmatched_1 = match_boxes(d0, d1)
+
+    rows = []
+    for i, j in pairs:
+        row = d0[i].copy()
+        row[:5] = (1 - alpha) * d0[i, :5] + alpha * d1[j, :5]
+        rows.append(row)
+    if alpha < 0.5:
+        rows.extend(d0[i] for i in unmatched_0)
+    else:
+        rows.extend(d1[j] for j in unmatched_1)
+
+    if not rows:
+        return np.empty((0, 6), dtype=np.float32)
+    return np.stack(rows)
+
+
+def detections_at(t, keyframes, max_hold=MAX_HOLD_SEC):
+    """Detections for a frame at time t from sorted (timestamp, detections) keyframes"""
+    if not keyframes:
+        return None
+
+    times = [kt for kt, _ in keyframes]
+    idx = int(np.searchsorted(times, t, side='right'))
+
+    before = keyframes[idx - 1] if idx > 0 else None
+    after = keyframes[idx] if idx < len(keyframes) else None
+
+    if before is not None and before[0] == t:
+        return before[1]
+    if before is not None and after is not None and after[0] - before[0] <= 2 * max_hold:
+        return interpolate_detections(t, before[0], before[1], after[0], after[1])
+    if before is not None and t - before[0] <= max_hold:
+        return before[1]
+    if after is not None and after[0] - t <= max_hold:
+        return after[1]
+    return None
+
+
+def draw_detections(frame, detections, names):
+    """Draw boxes and labels on a copy of frame"""
+    annotated = frame.copy()
+    if detections is None:
+        return annotated
+
+    for x1, y1, x2, y2, conf, cls_id in detections:
+        name = names.get(int(cls_id), str(int(cls_id)))
+        key = name.lower()
+        color = DEFAULT_BOX_COLOR
+        for category, category_color in BOX_COLORS.items():
+            if category in key:
+                color = category_color
+                break
+
+        p1 = (int(x1), int(y1))
+        p2 = (int(x2), int(y2))
+        cv2.rectangle(annotated, p1, p2, color, 2)
+
+        label = f"{name} {conf:.2f}"
+        (tw, th), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        top = max(p1[1], th + baseline)
+        cv2.rectangle(annotated, (p1[0], top - th - baseline), (p1[0] + tw, top), color, -1)
+        cv2.putText(annotated, label, (p1[0], top - baseline), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.5, (255, 255, 255), 1, cv2.LINE_AA)
+    return annotated
+
+
+def write_clip(save_path, timestamps, frames, keyframes, names, fps, compressed=False, transform=None):
+    """
+    Encode a clip, drawing stored/interpolated detections on every frame.
+    transform='thermal' renders the frames as the simulated thermal view first.
+    """
+    if len(timestamps) == 0:
+        return None
+
+    first = cv2.imdecode(frames[0], cv2.IMREAD_COLOR) if compressed else frames[0]
+    height, width = first.shape[:2]
+    render = ThermalSimulator().render if transform == 'thermal' else None
+
+    # Encode to a temp file (same extension, so VideoWriter picks the container)
+    # and rename, so the dashboard never serves a partial clip
+    root, ext = os.path.splitext(save_path)
+    tmp_path = f"{root}.{os.getpid()}.tmp{ext}"
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    out = cv2.VideoWriter(tmp_path, fourcc, fps, (width, height))
+    try:
+        for t, frame in zip(timestamps, frames):
+            if compressed:
+                frame = cv2.imdecode(frame, cv2.IMREAD_COLOR)
+            if render is not None:
+                frame = render(frame)
+            out.write(draw_detections(frame, detections_at(float(t), keyframes), names))
+    except BaseException:
+        out.release()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    out.release()
+    os.replace(tmp_path, save_path)
+    return save_path
+
+
+def spool_clip(spool_path, timestamps, frames, keyframes, names, fps, compressed=False, transform=None):
+    """Write a clip job's frames (as JPEG packets) and detections to a spool file"""
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if compressed:
+        packets = [np.asarray(p, dtype=np.uint8).reshape(-1) for p in frames]
+    else:
+        packets = []
+        kept = []
+        for i, frame in enumerate(frames):
+            ok, packet = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, SPOOL_JPEG_QUALITY])
+            if ok:
+                packets.append(packet.reshape(-1))
+                kept.append(i)
+        timestamps = timestamps[kept]
+
+    offsets = np.cumsum([0] + [p.nbytes for p in packets], dtype=np.int64)
+    packet_data = np.concatenate(packets) if packets else np.empty(0, dtype=np.uint8)
+
+    keyframe_times = np.array([t for t, _ in keyframes], dtype=np.float64)
+    keyframe_counts = np.array([len(d) for _, d in keyframes], dtype=np.int64)
+    if keyframes:
+        keyframe_boxes = np.concatenate([np.asarray(d, dtype=np.float32).reshape(-1, 6) for _, d in keyframes])
+    else:
+        keyframe_boxes = np.empty((0, 6), dtype=np.float32)
+
+    tmp_path = spool_path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            timestamps=timestamps,
+            packet_data=packet_data,
+            packet_offsets=offsets,
+            keyframe_times=keyframe_times,
+            keyframe_counts=keyframe_counts,
+            keyframe_boxes=keyframe_boxes,
+            names=np.array(json.dumps({str(k): v for k, v in names.items()})),
+            fps=np.array(fps, dtype=np.float64),
+            transform=np.array(transform or '')
+        )
+    os.replace(tmp_path, spool_path)
+
+
+def load_spooled_clip(spool_path):
+    """Read a spool file back. Returns (timestamps, packets, keyframes, names, fps, transform)."""
+    with np.load(spool_path) as data:
+        timestamps = data['timestamps']
+        packet_data = data['packet_data']
+        offsets = data['packet_offsets']
+        packets = [packet_data[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+        keyframes = []
+        boxes = data['keyframe_boxes']
+        position = 0
+        for t, count in zip(data['keyframe_times'], data['keyframe_counts']):
+            keyframes.append((float(t), boxes[position:position + count]))
+            position += count
+
+        names = {int(k): v for k, v in json.loads(str(data['names'])).items()}
+        fps = float(data['fps'])
+        # Spool files written before transforms existed have none
+        transform = (str(data['transform']) or None) if 'transform' in data else None
+    return timestamps, packets, keyframes, names, fps, transform
+
+
+def encode_spooled_clip(spool_path, save_path):
+    """Encoder process entry point. Returns the encode time in seconds."""
+    start = time.time()
+    timestamps, packets, keyframes, names, fps, transform = load_spooled_clip(spool_path)
+    if write_clip(save_path, timestamps, packets, keyframes, names, fps, compressed=True,
+                  transform=transform) is None:
+        raise ValueError("Spooled clip has no frames")
+    return time.time() - start
+
+
+class ClipExporter:
+    """
+    Clip export subsystem.
+
+    The capture loop hands jobs to submit() (detection_id, camera_id,
+    detection_type, save_path, timestamps, frames, keyframes, names, fps,
+    compressed, optional transform) and returns immediately. The exporter thread spools each job
+    to disk, records it in the clip_jobs table and feeds a process pool in
+    priority order (fire before smoke, oldest first). Jobs still queued when
+    the process stops are picked up again on the next start().
+
+    When MAX_QUEUED_CLIPS jobs are waiting, a new job evicts the newest
+    queued job of lower priority, or is dropped if there is none.
+    """
+
+    def __init__(self, workers=CLIP_ENCODE_WORKERS, max_queued=MAX_QUEUED_CLIPS, spool_dir=SPOOL_DIR):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.spool_dir = spool_dir
+
+        self._cond = threading.Condition()
+        self._incoming = []    # Jobs from the capture loop, not yet spooled
+        self._heap = []        # (priority, created_at, job_id, entry) for spooled jobs
+        self._to_drop = []     # Spooled entries evicted by backpressure
+        self._in_flight = 0
+        self._running = False
+        self._thread = None
+        self._pool = None
+
+        # Metrics
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_encode_time = 0.0
+        self.avg_encode_time = 0.0
+        self.max_encode_time = 0.0
+        self.last_queue_lag = 0.0
+        self.avg_queue_lag = 0.0
+
+    def start(self):
+        """Start the encoder pool and re-queue jobs left over from a previous run"""
+        if self._running:
+            return self
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+        # Fork the encoders now, before the detector starts its other threads,
+        # so they do not re-import (and reload the model in) the main script.
+        context = None
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        self._pool.submit(time.time).result()
+
+        self._recover()
+
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="clip-exporter", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Spool pending jobs, wait for the clips being encoded, then stop"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def submit(self, job):
+        """Queue a clip job. Never blocks; returns False if the job was dropped."""
+        job['priority'] = CLIP_PRIORITIES.get(job.get('detection_type'), DEFAULT_CLIP_PRIORITY)
+        job['created_at'] = time.time()
+
+        with self._cond:
+            if len(self._incoming) + len(self._heap) >= self.max_queued and not self._evict_for(job['priority']):
+                self.dropped += 1
+                print(f"Clip queue full, dropping {job.get('detection_type')} clip for detection {job['detection_id']}")
+                return False
+            self._incoming.append(job)
+            self.submitted += 1
+            self._cond.notify_all()
+        return True
+
+    def queue_depth(self):
+        """Jobs waiting for an encoder"""
+        with self._cond:
+            return len(self._incoming) + len(self._heap)
+
+    def get_stats(self):
+        """Queue and encoder metrics for monitoring"""
+        now = time.time()
+        with self._cond:
+            waiting = [job['created_at'] for job in self._incoming]
+            waiting.extend(entry['created_at'] for _, _, _, entry in self._heap)
+            return {
+                'queue_depth': len(waiting),
+                'in_flight': self._in_flight,
+                'oldest_queued_age': (now - min(waiting)) if waiting else 0.0,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'last_encode_time': self.last_encode_time,
+                'avg_encode_time': self.avg_encode_time,
+                'max_encode_time': self.max_encode_time,
+                'last_queue_lag': self.last_queue_lag,
+                'avg_queue_lag': self.avg_queue_lag
+            }
+
+    def _evict_for(self, priority):
+        """Make room for a job of this priority by dropping the newest lower-priority job"""
+        victim = None
+        for job in self._incoming:
+            if job['priority'] > priority and (victim is None or (job['priority'], job['created_at']) > victim[0]):
+                victim = ((job['priority'], job['created_at']), 'incoming', job)
+        for item in self._heap:
+            entry = item[3]
+            if entry['priority'] > priority and (victim is None or (entry['priority'], entry['created_at']) > victim[0]):
+                victim = ((entry['priority'], entry['created_at']), 'heap', item)
+        if victim is None:
+            return False
+
+        _, where, item = victim
+        if where == 'incoming':
+            self._incoming.remove(item)
+            detection_id = item['detection_id']
+        else:
+            self._heap.remove(item)
+            heapq.heapify(self._heap)
+            self._to_drop.append(item[3])
+            detection_id = item[3]['detection_id']
+        self.dropped += 1
+        print(f"Clip queue full, evicted lower-priority clip for detection {detection_id}")
+        return True
+
+    def _recover(self):
+        """Re-queue unfinished jobs from the clip_jobs table"""
+        for row in get_unfinished_clip_jobs():
+            if row['spool_path'] and os.path.exists(row['spool_path']):
+                update_clip_job(row['id'], 'queued')
+                entry = {key: row[key] for key in (
+                    'id', 'detection_id', 'camera_id', 'detection_type',
+                    'priority', 'save_path', 'spool_path', 'created_at')}
+                heapq.heappush(self._heap, (entry['priority'], entry['created_at'], entry['id'], entry))
+            else:
+                update_clip_job(row['id'], 'failed', error='spool file missing', finished_at=time.time())
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while (self._running and not self._incoming and not self._to_drop
+                       and not (self._heap and self._in_flight < self.workers)):
+                    self._cond.wait()
+                incoming, self._incoming = self._incoming, []
+                to_drop, self._to_drop = self._to_drop, []
+                dispatch = []
+                if self._running:
+                    while self._heap and self._in_flight < self.workers:
+                        dispatch.append(heapq.heappop(self._heap)[3])
+                        self._in_flight += 1
+                elif not incoming and not to_drop:
+                    return
+
+            for entry in to_drop:
+                self._discard(entry)
+            for job in incoming:
+                self._spool(job)
+            for entry in dispatch:
+                self._dispatch(entry)
+
+    def _spool(self, job):
+        """Persist a job and push it onto the priority queue"""
+        spool_path = os.path.join(
+            self.spool_dir, f"clip_{job['detection_id']}_{int(job['created_at'] * 1000)}.npz")
+        try:
+            spool_clip(spool_path, job['timestamps'], job['frames'], job['keyframes'],
+                       job['names'], job['fps'], job.get('compressed', False), job.get('transform'))
+        except Exception as e:
+            print(f"Error spooling clip for detection {job['detection_id']}: {e}")
+            with self._cond:
+                self.failed += 1
+            return
+
+        job_id = create_clip_job(job['detection_id'], job.get('camera_id'), job.get('detection_type'),
+                                 job['priority'], job['save_path'], spool_path, job['created_at'])
+        entry = {
+            'id': job_id,
+            'detection_id': job['detection_id'],
+            'camera_id': job.get('camera_id'),
+            'detection_type': job.get('detection_type'),
+            'priority': job['priority'],
+            'save_path': job['save_path'],
+            'spool_path': spool_path,
+            'created_at': job['created_at']
+        }
+        with self._cond:
+            heapq.heappush(self._heap, (entry['priority'], entry['created_at'], job_id, entry))
+            self._cond.notify_all()
+
+    def _discard(self, entry):
+        """Drop a spooled job evicted by backpressure"""
+        update_clip_job(entry['id'], 'dropped', finished_at=time.time())
+        self._remove_spool(entry)
+
+    def _dispatch(self, entry):
+        started_at = time.time()
+        queue_lag = started_at - entry['created_at']
+        update_clip_job(entry['id'], 'encoding', started_at=started_at, queue_lag=queue_lag)
+        with self._cond:
+            self.last_queue_lag = queue_lag
+            self.avg_queue_lag = _ema(self.avg_queue_lag, queue_lag)
+
+        future = self._pool.submit(encode_spooled_clip, entry['spool_path'], entry['save_path'])
+        future.add_done_callback(lambda f: self._finished(entry, f))
+
+    def _finished(self, entry, future):
+        finished_at = time.time()
+        try:
+            encode_time = future.result()
+        except Exception as e:
+            print(f"Error encoding clip {entry['save_path']}: {e}")
+            update_clip_job(entry['id'], 'failed', error=str(e), finished_at=finished_at)
+            with self._cond:
+                self.failed += 1
+        else:
+            update_clip_job(entry['id'], 'done', encode_time=encode_time, finished_at=finished_at)
+            update_detection_clip(entry['detection_id'], entry['save_path'])
+            print(f"Saved detection clip with boxes: {entry['save_path']} ({encode_time:.1f}s)")
+            with self._cond:
+                self.completed += 1
+                self.last_encode_time = encode_time
+                self.avg_encode_time = _ema(self.avg_encode_time, encode_time)
+                self.max_encode_time = max(self.max_encode_time, encode_time)
+
+        self._remove_spool(entry)
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _remove_spool(self, entry):
+        try:
+            os.remove(entry['spool_path'])
+        except OSError:
+            pass
+
+
+def _ema(average, value, weight=0.1):
+    """Exponential moving average, seeded with the first value"""
+    return value if average == 0 else average * (1 - weight) + value * weight
@@ -5,23 +5,137 @@ Handles all database operations for the fire detection dashboard
 
 import sqlite3
 import os
-from datetime import datetime
+import json
+import threading
+import time
+from datetime import datetime, timezone
 from contextlib import contextmanager
 
 DATABASE_PATH = "fire_detection.db"
+# Camera heartbeats are rewritten every telemetry flush while a pipeline runs,
+# so they live in a file of their own: writing them must not move the change
+# generation (or PRAGMA data_version) the dashboard cache and event server
+# watch. None = DATABASE_PATH with a _heartbeats suffix.
+HEARTBEAT_DATABASE_PATH = None
+
+# Connection settings
+BUSY_TIMEOUT_MS = 5000        # Wait this long for a lock instead of failing with "database is locked"
+STATEMENT_CACHE_SIZE = 128    # Prepared statements kept per connection
+
+# Write-behind telemetry (camera status/temperature, activity log)
+TELEMETRY_FLUSH_INTERVAL_SEC = 1.0   # Flush queued telemetry at least this often
+TELEMETRY_MAX_PENDING = 200          # ...or as soon as this many rows are queued
+
+# One persistent connection per thread (sqlite3 connections are not shared across threads)
+_local = threading.local()
+
+# Change generation: bumped whenever a get_db() block in this process writes
+# rows, or a connection sees a commit from another process (the PHP dashboard)
+_generation = 0
+_generation_lock = threading.Lock()
+
+def _bump_generation():
+    global _generation
+    with _generation_lock:
+        _generation += 1
+
+def _connect(path=None):
+    """Open a connection tuned for one writer (the detector) and many readers (the dashboard)"""
+    conn = sqlite3.connect(
+        path or DATABASE_PATH,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE
+    )
+    conn.row_factory = sqlite3.Row
+    # WAL lets dashboard readers run while the detector writes, and with
+    # synchronous=NORMAL commits no longer fsync on every transaction.
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    return conn
 
 @contextmanager
 def get_db():
-    """Context manager for database connections"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+    """Context manager yielding this thread's persistent database connection"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.pid != os.getpid() or _local.path != DATABASE_PATH:
+        # First use in this thread, a forked child, or DATABASE_PATH was changed
+        conn = _connect()
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _local.path = DATABASE_PATH
+        _local.data_version = None
+    changes = conn.total_changes
+    try:
+        yield conn
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    if conn.total_changes != changes:
+        _bump_generation()
+
+def get_generation():
+    """
+    Change generation of the database. Increases after any write made
+    through get_db(), and after commits by other processes once noticed.
+    """
+    with get_db() as conn:
+        # data_version changes when another connection has committed since this
+        # connection last looked; in-process writes have already bumped the counter
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if _local.data_version is not None and data_version != _local.data_version:
+            _bump_generation()
+        _local.data_version = data_version
+    return _generation
+
+def _heartbeat_path():
+    if HEARTBEAT_DATABASE_PATH:
+        return HEARTBEAT_DATABASE_PATH
+    root, ext = os.path.splitext(DATABASE_PATH)
+    return f"{root}_heartbeats{ext or '.db'}"
+
+@contextmanager
+def get_heartbeat_db():
+    """
+    This thread's connection to the heartbeat database (camera_heartbeats).
+    Unlike get_db(), writes here never move the change generation.
+    """
+    path = _heartbeat_path()
+    conn = getattr(_local, 'heartbeat_conn', None)
+    if conn is None or _local.heartbeat_pid != os.getpid() or _local.heartbeat_path != path:
+        conn = _connect(path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS camera_heartbeats (
+                camera_id INTEGER PRIMARY KEY,
+                last_frame_at REAL NOT NULL,
+                frames INTEGER DEFAULT 0
+            )
+        ''')
+        conn.commit()
+        _local.heartbeat_conn = conn
+        _local.heartbeat_pid = os.getpid()
+        _local.heartbeat_path = path
     try:
         yield conn
-    finally:
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+
+def close_db():
+    """Close this thread's persistent connections"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.pid == os.getpid():
+        conn.close()
+    _local.conn = None
+    conn = getattr(_local, 'heartbeat_conn', None)
+    if conn is not None and _local.heartbeat_pid == os.getpid():
         conn.close()
+    _local.heartbeat_conn = None
 
-def init_database():
-    """Initialize the SQLite database with all required tables"""
+def init_database(migrate=True):
+    """Initialize the SQLite database with all required tables, then apply pending migrations"""
     with get_db() as conn:
         cursor = conn.cursor()
         
@@ -201,14 +315,42 @@ def init_database():
             )
         ''')
         
+        # Clip export jobs (persistent queue for the clip encoder)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS clip_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                detection_id INTEGER,
+                camera_id INTEGER,
+                detection_type TEXT,
+                priority INTEGER DEFAULT 1,
+                save_path TEXT NOT NULL,
+                spool_path TEXT,
+                status TEXT DEFAULT 'queued',
+                queue_lag REAL,
+                encode_time REAL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                FOREIGN KEY (detection_id) REFERENCES detections(id)
+            )
+        ''')
+        
         conn.commit()
         
         # Insert default data if tables are empty
         _insert_default_data(cursor, conn)
+    
+    if migrate:
+        migrate_database()
 
 def _insert_default_data(cursor, conn):
     """Insert default cameras, stations, and personnel if not exists"""
     
+    # Hold the write lock across the checks so processes starting together
+    # don't both see empty tables
+    conn.execute("BEGIN IMMEDIATE")
+    
     # Check if cameras exist
     cursor.execute("SELECT COUNT(*) FROM cameras")
     if cursor.fetchone()[0] == 0:
@@ -262,6 +404,102 @@ def _insert_default_data(cursor, conn):
     
     conn.commit()
 
+# ============================================
+# Schema Migrations
+# ============================================
+# Each migration runs once, in order, in its own transaction. The schema
+# version is kept in PRAGMA user_version; add new migrations at the end.
+
+MIGRATIONS = [
+    (1, "Indexes for dashboard and firefighter alert queries", [
+        # Dashboard lists: ORDER BY timestamp DESC LIMIT ?
+        "CREATE INDEX IF NOT EXISTS idx_detections_timestamp ON detections(timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_alerts_timestamp ON alerts(timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_activity_timestamp ON activity(timestamp)",
+        # Pending alerts are a small, hot subset: keep them in partial indexes
+        """CREATE INDEX IF NOT EXISTS idx_ff_alerts_pending ON firefighter_alerts(received_at)
+           WHERE status = 'pending'""",
+        """CREATE INDEX IF NOT EXISTS idx_ff_alerts_pending_firefighter
+           ON firefighter_alerts(firefighter_id, received_at) WHERE status = 'pending'""",
+        """CREATE INDEX IF NOT EXISTS idx_ff_alerts_pending_station
+           ON firefighter_alerts(station_id, received_at) WHERE status = 'pending'""",
+        # Alert history (everything already answered) per firefighter / station / overall
+        """CREATE INDEX IF NOT EXISTS idx_ff_alerts_history_firefighter
+           ON firefighter_alerts(firefighter_id, received_at) WHERE status != 'pending'""",
+        """CREATE INDEX IF NOT EXISTS idx_ff_alerts_history_station
+           ON firefighter_alerts(station_id, received_at) WHERE status != 'pending'""",
+        """CREATE INDEX IF NOT EXISTS idx_ff_alerts_history ON firefighter_alerts(received_at)
+           WHERE status != 'pending'""",
+        # Clip encoder recovery on startup
+        """CREATE INDEX IF NOT EXISTS idx_clip_jobs_unfinished ON clip_jobs(priority, created_at)
+           WHERE status IN ('queued', 'encoding')""",
+    ]),
+    (2, "Capture source per camera for the supervisor", [
+        # USB index ('0'), stream URL, or 'thermal:<id>' for a thermal view
+        # simulated from camera <id>'s frames
+        "ALTER TABLE cameras ADD COLUMN source TEXT",
+        "UPDATE cameras SET source = '0' WHERE id = 1 AND source IS NULL",
+        "UPDATE cameras SET source = 'thermal:1' WHERE id = 2 AND source IS NULL",
+    ]),
+    (3, "Alert outbox for notification dispatch", [
+        # One row per alert to deliver; 'delivered' lists the channels done so far
+        """CREATE TABLE IF NOT EXISTS alert_outbox (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               alert_id INTEGER,
+               detection_id INTEGER,
+               dedup_key TEXT NOT NULL UNIQUE,
+               payload TEXT NOT NULL,
+               status TEXT DEFAULT 'pending',
+               delivered TEXT DEFAULT '[]',
+               attempts INTEGER DEFAULT 0,
+               next_attempt_at REAL NOT NULL,
+               claimed_at REAL,
+               detected_at REAL,
+               created_at REAL NOT NULL,
+               completed_at REAL,
+               last_error TEXT,
+               FOREIGN KEY (alert_id) REFERENCES alerts(id)
+           )""",
+        """CREATE INDEX IF NOT EXISTS idx_alert_outbox_due ON alert_outbox(next_attempt_at)
+           WHERE status IN ('pending', 'sending')""",
+        # Which channel delivered a notification, and seconds from detection to delivery
+        "ALTER TABLE notifications ADD COLUMN channel TEXT",
+        "ALTER TABLE notifications ADD COLUMN latency_sec REAL",
+    ]),
+    (4, "Index firefighter alerts by alert for idempotent broadcasts", [
+        "CREATE INDEX IF NOT EXISTS idx_ff_alerts_alert ON firefighter_alerts(alert_id, firefighter_id)",
+    ]),
+]
+
+def get_schema_version():
+    """Current schema version (PRAGMA user_version)"""
+    with get_db() as conn:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate_database(target_version=None):
+    """Apply pending migrations up to target_version (default: latest). Returns the new version."""
+    with get_db() as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for migration_version, description, statements in MIGRATIONS:
+            if migration_version <= version:
+                continue
+            if target_version is not None and migration_version > target_version:
+                break
+            conn.execute("BEGIN IMMEDIATE")
+            # Another process (a second detector, a supervisor worker) may have
+            # migrated between the read above and taking the write lock
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if migration_version <= version:
+                conn.commit()
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {migration_version}")
+            conn.commit()
+            version = migration_version
+            print(f"[DATABASE] Migrated schema to version {version}: {description}")
+        return version
+
 # ============================================
 # Camera Operations
 # ============================================
@@ -275,7 +513,10 @@ def get_cameras():
 
 def update_camera_status(camera_id, status, temperature=None):
     """Update camera status and optionally temperature"""
-    with get_db() as conn:
+    with _flush_lock, get_db() as conn:
+        # This write supersedes anything still queued for the camera
+        with _telemetry_cond:
+            _pending_status.pop(camera_id, None)
         cursor = conn.cursor()
         if temperature is not None:
             cursor.execute('''
@@ -289,6 +530,34 @@ def update_camera_status(camera_id, status, temperature=None):
             ''', (status, camera_id))
         conn.commit()
 
+def update_camera_statuses(changes):
+    """
+    Apply several camera status changes in one transaction. changes is a list
+    of (camera_id, status, activity_message); a None message logs nothing.
+    """
+    if not changes:
+        return
+    now = _sqlite_now()
+    messages = [(message, now) for _, _, message in changes if message]
+    with _flush_lock, get_db() as conn:
+        with _telemetry_cond:
+            for camera_id, _, _ in changes:
+                _pending_status.pop(camera_id, None)
+        cursor = conn.cursor()
+        cursor.executemany("UPDATE cameras SET status = ?, updated_at = ? WHERE id = ?",
+                           [(status, now, camera_id) for camera_id, status, _ in changes])
+        cursor.executemany("INSERT INTO activity (message, timestamp) VALUES (?, ?)", messages)
+        conn.commit()
+    for message, _ in messages:
+        print(f"[ACTIVITY] {message}")
+
+def get_camera_heartbeats():
+    """Last frame time (unix seconds) and frame count reported by running pipelines, per camera"""
+    with get_heartbeat_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM camera_heartbeats")
+        return {row['camera_id']: dict(row) for row in cursor.fetchall()}
+
 def get_active_camera_count():
     """Get count of online cameras"""
     with get_db() as conn:
@@ -326,6 +595,13 @@ def update_detection_clip(detection_id, clip_path):
         cursor.execute("UPDATE detections SET clip_path = ? WHERE id = ?", (clip_path, detection_id))
         conn.commit()
 
+def update_detection_confidence(detection_id, confidence):
+    """Raise a detection's confidence as its incident grows"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE detections SET confidence = MAX(confidence, ?) WHERE id = ?", (confidence, detection_id))
+        conn.commit()
+
 def get_detections(limit=100):
     """Get recent detections"""
     with get_db() as conn:
@@ -379,20 +655,77 @@ def get_detection_history(hours=24):
         ''', (f'-{hours}',))
         return [dict(row) for row in cursor.fetchall()]
 
+# ============================================
+# Clip Job Operations
+# ============================================
+
+def create_clip_job(detection_id, camera_id, detection_type, priority, save_path, spool_path, created_at):
+    """Queue a clip export job and return its ID"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO clip_jobs (detection_id, camera_id, detection_type, priority, save_path, spool_path, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (detection_id, camera_id, detection_type, priority, save_path, spool_path, created_at))
+        conn.commit()
+        return cursor.lastrowid
+
+def update_clip_job(job_id, status, **fields):
+    """Update a clip job's status and any of started_at, finished_at, queue_lag, encode_time, error"""
+    allowed = ('started_at', 'finished_at', 'queue_lag', 'encode_time', 'error')
+    columns = ['status = ?']
+    values = [status]
+    for key in allowed:
+        if key in fields:
+            columns.append(f"{key} = ?")
+            values.append(fields[key])
+    values.append(job_id)
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"UPDATE clip_jobs SET {', '.join(columns)} WHERE id = ?", values)
+        conn.commit()
+
+def get_unfinished_clip_jobs():
+    """Get clip jobs that were queued or encoding when the exporter last stopped"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM clip_jobs WHERE status IN ('queued', 'encoding')
+            ORDER BY priority, created_at
+        ''')
+        return [dict(row) for row in cursor.fetchall()]
+
 # ============================================
 # Alert Operations
 # ============================================
 
-def create_alert(detection_id, alert_level, message):
-    """Create a new alert"""
+def create_alert(detection_id, alert_level, message, detected_at=None):
+    """
+    Create a new alert and queue its notification in the same transaction.
+    detected_at (unix seconds, default now) is when the fire was seen, for
+    measuring delivery latency.
+    """
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO alerts (detection_id, alert_level, message)
             VALUES (?, ?, ?)
         ''', (detection_id, alert_level, message))
+        alert_id = cursor.lastrowid
+
+        cursor.execute("SELECT * FROM detections WHERE id = ?", (detection_id,))
+        detection = cursor.fetchone()
+        payload = {'alert_id': alert_id, 'detection_id': detection_id, 'alert_level': alert_level, 'message': message}
+        if detection is not None:
+            for key in ('camera_id', 'camera_name', 'detection_type', 'confidence', 'location',
+                        'latitude', 'longitude', 'image_path', 'timestamp'):
+                payload[key] = detection[key]
+        # The same detection at the same level is only ever notified once
+        dedup_key = f"detection:{detection_id}:{alert_level}" if detection_id else f"alert:{alert_id}"
+        _queue_notification(cursor, dedup_key, payload, alert_id, detection_id, detected_at)
+
         conn.commit()
-        return cursor.lastrowid
+        return alert_id
 
 def get_alerts(limit=20):
     """Get recent alerts"""
@@ -408,6 +741,78 @@ def update_alert_status(alert_id, status):
         cursor.execute("UPDATE alerts SET status = ? WHERE id = ?", (status, alert_id))
         conn.commit()
 
+# ============================================
+# Alert Outbox
+# ============================================
+# Alerts to deliver are written to alert_outbox in the transaction that
+# creates them; dispatch.AlertDispatcher claims due rows, fans them out to
+# its channels and records the outcome. Rows move pending -> sending ->
+# sent | failed; a failed attempt goes back to pending with a later
+# next_attempt_at.
+
+def _queue_notification(cursor, dedup_key, payload, alert_id=None, detection_id=None, detected_at=None):
+    now = time.time()
+    cursor.execute('''
+        INSERT OR IGNORE INTO alert_outbox
+        (alert_id, detection_id, dedup_key, payload, next_attempt_at, detected_at, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (alert_id, detection_id, dedup_key, json.dumps(payload, default=str), now,
+          detected_at if detected_at is not None else now, now))
+    return cursor.lastrowid if cursor.rowcount else None
+
+def queue_notification(dedup_key, payload, alert_id=None, detection_id=None, detected_at=None):
+    """Add a notification to the outbox. Returns its ID, or None if dedup_key was already queued."""
+    with get_db() as conn:
+        outbox_id = _queue_notification(conn.cursor(), dedup_key, payload, alert_id, detection_id, detected_at)
+        conn.commit()
+        return outbox_id
+
+def claim_outbox_notifications(limit=20, stale_after=60.0):
+    """
+    Mark up to limit due notifications as 'sending' and return them, oldest
+    first, with payload and delivered decoded. Rows left in 'sending' for
+    stale_after seconds (their dispatcher died) are claimed again.
+    """
+    now = time.time()
+    with get_db() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT * FROM alert_outbox
+            WHERE (status = 'pending' AND next_attempt_at <= ?)
+               OR (status = 'sending' AND claimed_at <= ?)
+            ORDER BY next_attempt_at LIMIT ?
+        ''', (now, now - stale_after, limit))
+        rows = [dict(row) for row in cursor.fetchall()]
+        cursor.executemany("UPDATE alert_outbox SET status = 'sending', claimed_at = ? WHERE id = ?",
+                           [(now, row['id']) for row in rows])
+        conn.commit()
+    for row in rows:
+        row['payload'] = json.loads(row['payload'])
+        row['delivered'] = json.loads(row['delivered'] or '[]')
+    return rows
+
+def update_outbox_notification(outbox_id, status, delivered, attempts, next_attempt_at=None, error=None):
+    """Record a delivery attempt: status 'sent', 'failed', or 'pending' to retry at next_attempt_at"""
+    now = time.time()
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE alert_outbox
+            SET status = ?, delivered = ?, attempts = ?, next_attempt_at = COALESCE(?, next_attempt_at),
+                last_error = ?, completed_at = ?
+            WHERE id = ?
+        ''', (status, json.dumps(sorted(delivered)), attempts, next_attempt_at, error,
+              now if status in ('sent', 'failed') else None, outbox_id))
+        conn.commit()
+
+def get_outbox_counts():
+    """Number of outbox notifications per status"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT status, COUNT(*) FROM alert_outbox GROUP BY status")
+        return {status: count for status, count in cursor.fetchall()}
+
 # ============================================
 # Activity Log Operations
 # ============================================
@@ -427,6 +832,195 @@ def get_activity(limit=50):
         cursor.execute("SELECT * FROM activity ORDER BY timestamp DESC LIMIT ?", (limit,))
         return [dict(row) for row in cursor.fetchall()]
 
+# ============================================
+# Write-Behind Telemetry
+# ============================================
+# Frequent, non-critical writes (camera status/temperature, activity rows,
+# pipeline heartbeats) are queued in memory and written by a background
+# thread in a single transaction, every TELEMETRY_FLUSH_INTERVAL_SEC or as
+# soon as TELEMETRY_MAX_PENDING rows are queued. Detections and alerts are never
+# queued: log_detection() and create_alert() still commit synchronously.
+
+_telemetry_cond = threading.Condition()
+_flush_lock = threading.Lock()     # Serializes flushes with synchronous status writes
+_pending_status = {}               # camera_id -> (status, temperature, updated_at); last value wins
+_pending_activity = []             # (message, timestamp)
+_pending_heartbeats = {}           # camera_id -> [last_frame_at, frames]
+_telemetry_thread = None
+_telemetry_running = False
+_telemetry_stats = {
+    'queued': 0,
+    'coalesced': 0,
+    'flushes': 0,
+    'rows_written': 0,
+    'failed_flushes': 0,
+    'last_flush_latency': 0.0,
+    'max_flush_latency': 0.0,
+    'avg_flush_latency': 0.0
+}
+
+def _sqlite_now():
+    """Current UTC time in the format of SQLite's CURRENT_TIMESTAMP"""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def _telemetry_depth():
+    return len(_pending_status) + len(_pending_activity) + len(_pending_heartbeats)
+
+def _queued_row():
+    """Count a queued row; True if the caller must flush inline (size trigger, no writer thread)"""
+    _telemetry_stats['queued'] += 1
+    if _telemetry_depth() < TELEMETRY_MAX_PENDING:
+        return False
+    if _telemetry_running:
+        _telemetry_cond.notify()
+        return False
+    return True
+
+def queue_camera_status(camera_id, status, temperature=None):
+    """Queue a camera status/temperature update; only the latest per camera is written"""
+    with _telemetry_cond:
+        previous = _pending_status.get(camera_id)
+        if previous is not None:
+            _telemetry_stats['coalesced'] += 1
+            if temperature is None:
+                temperature = previous[1]
+        _pending_status[camera_id] = (status, temperature, _sqlite_now())
+        flush_now = _queued_row()
+    if flush_now:
+        flush_telemetry()
+
+def queue_activity(message):
+    """Queue an activity log row"""
+    with _telemetry_cond:
+        _pending_activity.append((message, _sqlite_now()))
+        flush_now = _queued_row()
+    print(f"[ACTIVITY] {message}")
+    if flush_now:
+        flush_telemetry()
+
+def queue_camera_heartbeat(camera_id, frame_time=None):
+    """Record that a pipeline received a frame; written at most once per camera per flush"""
+    frame_time = frame_time if frame_time is not None else time.time()
+    with _telemetry_cond:
+        heartbeat = _pending_heartbeats.get(camera_id)
+        if heartbeat is None:
+            _pending_heartbeats[camera_id] = [frame_time, 1]
+        else:
+            heartbeat[0] = max(heartbeat[0], frame_time)
+            heartbeat[1] += 1
+
+def _requeue_telemetry(statuses, activity, heartbeats):
+    """Put rows from a failed flush back in front of anything queued since"""
+    global _pending_status, _pending_activity
+    with _telemetry_cond:
+        # Statuses queued since the swap are newer than the ones that failed
+        _pending_status = {**statuses, **_pending_status}
+        _pending_activity = activity + _pending_activity
+        for camera_id, (last_frame_at, frames) in heartbeats.items():
+            heartbeat = _pending_heartbeats.setdefault(camera_id, [last_frame_at, 0])
+            heartbeat[0] = max(heartbeat[0], last_frame_at)
+            heartbeat[1] += frames
+        _telemetry_stats['failed_flushes'] += 1
+
+def flush_telemetry():
+    """
+    Write all queued telemetry: statuses and activity in one transaction,
+    heartbeats in one transaction on the heartbeat database. Returns the
+    number of rows written.
+    """
+    global _pending_status, _pending_activity, _pending_heartbeats
+    with _flush_lock:
+        with _telemetry_cond:
+            statuses, _pending_status = _pending_status, {}
+            activity, _pending_activity = _pending_activity, []
+            heartbeats, _pending_heartbeats = _pending_heartbeats, {}
+        if not statuses and not activity and not heartbeats:
+            return 0
+
+        start = time.time()
+        rows = 0
+        if statuses or activity:
+            try:
+                with get_db() as conn:
+                    cursor = conn.cursor()
+                    cursor.executemany('''
+                        UPDATE cameras SET status = ?, temperature = COALESCE(?, temperature), updated_at = ?
+                        WHERE id = ?
+                    ''', [(status, temperature, updated_at, camera_id)
+                          for camera_id, (status, temperature, updated_at) in statuses.items()])
+                    cursor.executemany("INSERT INTO activity (message, timestamp) VALUES (?, ?)", activity)
+                    conn.commit()
+                rows += len(statuses) + len(activity)
+            except sqlite3.Error as e:
+                print(f"[TELEMETRY] Flush failed, requeueing {len(statuses) + len(activity)} rows: {e}")
+                _requeue_telemetry(statuses, activity, {})
+        if heartbeats:
+            try:
+                with get_heartbeat_db() as conn:
+                    conn.executemany('''
+                        INSERT INTO camera_heartbeats (camera_id, last_frame_at, frames) VALUES (?, ?, ?)
+                        ON CONFLICT(camera_id) DO UPDATE SET
+                            last_frame_at = MAX(last_frame_at, excluded.last_frame_at),
+                            frames = frames + excluded.frames
+                    ''', [(camera_id, last_frame_at, frames)
+                          for camera_id, (last_frame_at, frames) in heartbeats.items()])
+                    conn.commit()
+                rows += len(heartbeats)
+            except sqlite3.Error as e:
+                print(f"[TELEMETRY] Heartbeat flush failed, requeueing {len(heartbeats)} rows: {e}")
+                _requeue_telemetry({}, [], heartbeats)
+        if rows == 0:
+            return 0
+        latency = time.time() - start
+
+    with _telemetry_cond:
+        stats = _telemetry_stats
+        stats['flushes'] += 1
+        stats['rows_written'] += rows
+        stats['last_flush_latency'] = latency
+        stats['max_flush_latency'] = max(stats['max_flush_latency'], latency)
+        if stats['flushes'] == 1:
+            stats['avg_flush_latency'] = latency
+        else:
+            stats['avg_flush_latency'] = stats['avg_flush_latency'] * 0.9 + latency * 0.1
+    return rows
+
+def _telemetry_loop():
+    while True:
+        with _telemetry_cond:
+            if _telemetry_running and _telemetry_depth() < TELEMETRY_MAX_PENDING:
+                _telemetry_cond.wait(TELEMETRY_FLUSH_INTERVAL_SEC)
+            running = _telemetry_running
+        flush_telemetry()
+        if not running:
+            return
+
+def start_telemetry_writer():
+    """Start the background thread that flushes queued telemetry"""
+    global _telemetry_thread, _telemetry_running
+    with _telemetry_cond:
+        if _telemetry_running:
+            return
+        _telemetry_running = True
+    _telemetry_thread = threading.Thread(target=_telemetry_loop, name="telemetry-writer", daemon=True)
+    _telemetry_thread.start()
+
+def stop_telemetry_writer():
+    """Stop the background writer after a final flush"""
+    global _telemetry_thread, _telemetry_running
+    with _telemetry_cond:
+        _telemetry_running = False
+        _telemetry_cond.notify_all()
+    if _telemetry_thread is not None:
+        _telemetry_thread.join()
+        _telemetry_thread = None
+    flush_telemetry()
+
+def get_telemetry_stats():
+    """Write-behind queue depth and flush latency for monitoring"""
+    with _telemetry_cond:
+        return {**_telemetry_stats, 'queue_depth': _telemetry_depth()}
+
 # ============================================
 # Firefighter Operations (User-Managed)
 # ============================================
@@ -532,11 +1126,7 @@ def get_stats():
     today = datetime.now().date().isoformat()
     with get_db() as conn:
         cursor = conn.cursor()
-        
-        # Ensure today's record exists
-        cursor.execute("INSERT OR IGNORE INTO stats (id, date) VALUES (1, ?)", (today,))
-        conn.commit()
-        
+        # Today's row is created by the first detection; until then the defaults apply
         cursor.execute("SELECT * FROM stats WHERE date = ?", (today,))
         row = cursor.fetchone()
         
@@ -556,6 +1146,30 @@ def get_stats():
         
         return stats
 
+def get_dashboard_stats():
+    """
+    Today's stats as the PHP API (assets/functions.php, ?api=1) computes
+    them: counted from detections rather than read from the stats table.
+    The range is the PHP date(timestamp) = date('now') test in a form that
+    uses idx_detections_timestamp.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT
+                date('now') AS date,
+                COUNT(*) AS detections_today,
+                COALESCE(SUM(CASE WHEN detection_type = 'fire' THEN 1 ELSE 0 END), 0) AS fire_today,
+                COALESCE(SUM(CASE WHEN detection_type = 'smoke' THEN 1 ELSE 0 END), 0) AS smoke_today,
+                3.2 AS avg_response_time
+            FROM detections
+            WHERE timestamp >= date('now') AND timestamp < date('now', '+1 day')
+        ''')
+        stats = dict(cursor.fetchone())
+        stats['active_cameras'] = get_active_camera_count()
+        stats['personnel_online'] = get_online_personnel_count()
+        return stats
+
 def reset_daily_stats():
     """Reset daily stats (call at midnight)"""
     with get_db() as conn:
@@ -571,14 +1185,14 @@ def reset_daily_stats():
 # Notification Operations
 # ============================================
 
-def log_notification(alert_id, firefighter_id, message):
-    """Log a sent notification"""
+def log_notification(alert_id, firefighter_id, message, channel=None, latency=None):
+    """Log a sent notification. latency is seconds from detection to delivery."""
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT INTO notifications (alert_id, firefighter_id, message)
-            VALUES (?, ?, ?)
-        ''', (alert_id, firefighter_id, message))
+            INSERT INTO notifications (alert_id, firefighter_id, message, channel, latency_sec)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (alert_id, firefighter_id, message, channel, latency))
         conn.commit()
         return cursor.lastrowid
 
@@ -739,25 +1353,32 @@ def get_firefighter_stats(firefighter_id=None, station_id=None):
         }
 
 def broadcast_alert_to_station(station_id, alert_id, detection_id, alert_type, location, area, confidence):
-    """Broadcast an alert to all firefighters in a station"""
+    """
+    Broadcast an alert to all firefighters in a station. Firefighters who
+    already have a row for alert_id are skipped, so repeating a broadcast
+    (a retried dispatch) adds nothing. Returns the IDs of the new rows.
+    """
     with get_db() as conn:
         cursor = conn.cursor()
         
-        # Get all firefighters in the station
+        # One write transaction, so the new rows are exactly those above last_id
+        conn.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM firefighter_alerts")
+        last_id = cursor.fetchone()[0]
+
+        # Every online firefighter in the station without this alert gets a row, in one statement
         cursor.execute('''
-            SELECT id FROM firefighters WHERE station = ? AND status = 'online'
-        ''', (station_id,))
-        firefighters = cursor.fetchall()
-        
-        alert_ids = []
-        for ff in firefighters:
-            cursor.execute('''
-                INSERT INTO firefighter_alerts 
-                (alert_id, detection_id, firefighter_id, station_id, alert_type, location, area, confidence, status)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'pending')
-            ''', (alert_id, detection_id, ff['id'], station_id, alert_type, location, area, confidence))
-            alert_ids.append(cursor.lastrowid)
-        
+            INSERT INTO firefighter_alerts 
+            (alert_id, detection_id, firefighter_id, station_id, alert_type, location, area, confidence, status)
+            SELECT ?, ?, ff.id, ?, ?, ?, ?, ?, 'pending'
+            FROM firefighters ff
+            WHERE ff.station = ? AND ff.status = 'online'
+              AND NOT EXISTS (SELECT 1 FROM firefighter_alerts fa
+                              WHERE fa.alert_id = ? AND fa.firefighter_id = ff.id)
+        ''', (alert_id, detection_id, station_id, alert_type, location, area, confidence, station_id, alert_id))
+
+        cursor.execute("SELECT id FROM firefighter_alerts WHERE id > ? ORDER BY id", (last_id,))
+        alert_ids = [row['id'] for row in cursor.fetchall()]
         conn.commit()
         return alert_ids
 
@@ -765,23 +1386,67 @@ def broadcast_alert_to_station(station_id, alert_id, detection_id, alert_type, l
 # Export for Dashboard
 # ============================================
 
+# Last snapshot: (generation, data, json); rebuilt only when the generation moves
+_dashboard_cache = (None, None, None)
+_dashboard_lock = threading.Lock()
+_dashboard_stats = {'requests': 0, 'rebuilds': 0, 'last_build_time': 0.0}
+
+def _build_dashboard_snapshot():
+    """Read everything the dashboard needs inside one read transaction"""
+    with get_db() as conn:
+        # The get_* helpers below reuse this thread's connection, so they all
+        # read from the same snapshot
+        conn.execute("BEGIN")
+        try:
+            cameras = get_cameras()
+            return {
+                'cameras': {cam['id']: cam for cam in cameras},
+                'detections': get_detections(),
+                'alerts': get_alerts(),
+                'activity': get_activity(),
+                'firefighters': get_firefighters(),
+                'personnel': get_personnel(),
+                'stations': get_stations(),
+                'stats': get_dashboard_stats(),
+                'detection_history': get_detection_history(),
+                'last_update': datetime.now().isoformat()
+            }
+        finally:
+            conn.rollback()
+
+def _dashboard_snapshot():
+    global _dashboard_cache
+    with _dashboard_lock:
+        _dashboard_stats['requests'] += 1
+        generation = get_generation()
+        if _dashboard_cache[0] != generation:
+            start = time.time()
+            data = _build_dashboard_snapshot()
+            _dashboard_cache = (generation, data, json.dumps(data, default=str))
+            _dashboard_stats['rebuilds'] += 1
+            _dashboard_stats['last_build_time'] = time.time() - start
+        return _dashboard_cache
+
 def get_dashboard_data():
-    """Get all data needed for dashboard as a dictionary"""
-    cameras = get_cameras()
-    cameras_dict = {cam['id']: cam for cam in cameras}
-    
-    return {
-        'cameras': cameras_dict,
-        'detections': get_detections(),
-        'alerts': get_alerts(),
-        'activity': get_activity(),
-        'firefighters': get_firefighters(),
-        'personnel': get_personnel(),
-        'stations': get_stations(),
-        'stats': get_stats(),
-        'detection_history': get_detection_history(),
-        'last_update': datetime.now().isoformat()
-    }
+    """
+    Get all data needed for dashboard as a dictionary. The snapshot is cached
+    until the database changes; treat the returned dict as read-only.
+    """
+    return _dashboard_snapshot()[1]
+
+def get_dashboard_json():
+    """Dashboard snapshot serialized as JSON, cached like get_dashboard_data()"""
+    return _dashboard_snapshot()[2]
+
+def get_dashboard_snapshot():
+    """(data, json) of one cached snapshot, for callers that need both to match"""
+    _, data, data_json = _dashboard_snapshot()
+    return data, data_json
+
+def get_dashboard_cache_stats():
+    """Dashboard cache requests/rebuilds for monitoring"""
+    with _dashboard_lock:
+        return {**_dashboard_stats, 'generation': _generation}
 
 # Initialize database on module import
 if __name__ == "__main__":
@@ -0,0 +1,360 @@
+"""
+Fire Detection System - Alert Dispatch
+Delivers alerts from the outbox table to pluggable channels (station
+firefighters, webhook, email, a local file for testing) with retries,
+deduplication and delivery latency tracking
+
+Usage: python dispatch.py   (or let fire_detection.py run it in-process)
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import smtplib
+import threading
+import time
+import urllib.request
+from email.message import EmailMessage
+
+from database import (
+    init_database, claim_outbox_notifications, update_outbox_notification, get_outbox_counts,
+    log_notification, get_stations, broadcast_alert_to_station
+)
+from metrics import latency_metrics
+
+# Configuration
+POLL_INTERVAL_SEC = 0.25      # How often the outbox is checked for due notifications
+CLAIM_BATCH_SIZE = 20         # Notifications claimed per poll
+MAX_IN_FLIGHT = 8             # Notifications delivered concurrently
+CHANNEL_TIMEOUT_SEC = 10.0    # One channel's delivery attempt gives up after this long
+MAX_ATTEMPTS = 6              # Attempts before a notification is marked failed
+RETRY_BACKOFF_SEC = 2.0       # First retry delay; doubles per attempt
+MAX_RETRY_BACKOFF_SEC = 300.0
+CLAIM_STALE_SEC = 60.0        # A claimed notification with no outcome after this long is retried
+
+# Channels alerts are sent to: (type, options). Types are the keys of
+# CHANNEL_TYPES; 'name' in options distinguishes two channels of one type.
+ALERT_CHANNELS = [
+    ('station', {}),
+    ('file', {'path': os.path.join('logs', 'alerts.jsonl')}),
+    # ('webhook', {'url': 'https://example.org/hooks/fire-alerts'}),
+    # ('smtp', {'host': 'smtp.example.org', 'port': 587, 'sender': 'alerts@example.org',
+    #           'recipients': ['duty-officer@example.org'], 'username': '...', 'password': '...'}),
+]
+
+
+class Channel:
+    """
+    A notification channel. send() delivers one alert payload and raises on
+    failure; blocking work belongs in asyncio.to_thread().
+    """
+
+    type = None
+
+    def __init__(self, name=None):
+        self.name = name or self.type
+
+    async def send(self, payload):
+        raise NotImplementedError
+
+
+class StationChannel(Channel):
+    """Alerts every online firefighter of the station nearest to the camera (safe to retry)"""
+
+    type = 'station'
+
+    def __init__(self, name=None):
+        super().__init__(name)
+        self._stations = None
+
+    def _nearest_station(self, latitude, longitude):
+        if self._stations is None:
+            self._stations = get_stations()
+        located = [station for station in self._stations
+                   if station['latitude'] is not None and station['longitude'] is not None]
+        if latitude is None or longitude is None or not located:
+            return self._stations[0]['id'] if self._stations else None
+        scale = math.cos(math.radians(latitude))
+        return min(located, key=lambda station: (
+            (station['latitude'] - latitude) ** 2 + ((station['longitude'] - longitude) * scale) ** 2
+        ))['id']
+
+    def _broadcast(self, payload):
+        station_id = self._nearest_station(payload.get('latitude'), payload.get('longitude'))
+        if station_id is None:
+            raise RuntimeError("No stations configured")
+        broadcast_alert_to_station(station_id, payload['alert_id'], payload.get('detection_id'),
+                                   payload.get('detection_type', payload['alert_level']),
+                                   payload.get('location'), payload.get('camera_name'),
+                                   payload.get('confidence'))
+
+    async def send(self, payload):
+        await asyncio.to_thread(self._broadcast, payload)
+
+
+class WebhookChannel(Channel):
+    """POSTs the alert payload as JSON"""
+
+    type = 'webhook'
+
+    def __init__(self, url, name=None, headers=None, timeout=CHANNEL_TIMEOUT_SEC):
+        super().__init__(name)
+        self.url = url
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+
+    def _post(self, payload):
+        body = json.dumps(payload, default=str).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, method='POST',
+                                         headers={'Content-Type': 'application/json', **self.headers})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            if response.status >= 300:
+                raise RuntimeError(f"HTTP {response.status}")
+
+    async def send(self, payload):
+        await asyncio.to_thread(self._post, payload)
+
+
+class SmtpChannel(Channel):
+    """Emails the alert to a fixed list of recipients"""
+
+    type = 'smtp'
+
+    def __init__(self, host, sender, recipients, port=587, username=None, password=None,
+                 starttls=True, name=None, timeout=CHANNEL_TIMEOUT_SEC):
+        super().__init__(name)
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.recipients = list(recipients)
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def _send_mail(self, payload):
+        message = EmailMessage()
+        message['Subject'] = f"[{payload['alert_level'].upper()}] {payload['message']}"
+        message['From'] = self.sender
+        message['To'] = ", ".join(self.recipients)
+        message.set_content("\n".join(f"{key}: {value}" for key, value in payload.items()))
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(message)
+
+    async def send(self, payload):
+        await asyncio.to_thread(self._send_mail, payload)
+
+
+class FileChannel(Channel):
+    """Appends each alert as a JSON line (for testing without external services)"""
+
+    type = 'file'
+
+    def __init__(self, path, name=None):
+        super().__init__(name)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _append(self, payload):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        line = json.dumps({'delivered_at': time.time(), **payload}, default=str)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+
+    async def send(self, payload):
+        await asyncio.to_thread(self._append, payload)
+
+
+CHANNEL_TYPES = {cls.type: cls for cls in (StationChannel, WebhookChannel, SmtpChannel, FileChannel)}
+
+
+def build_channels(config=None):
+    """Instantiate channels from (type, options) pairs (default ALERT_CHANNELS)"""
+    channels = []
+    for channel_type, options in (ALERT_CHANNELS if config is None else config):
+        channels.append(CHANNEL_TYPES[channel_type](**options))
+    names = [channel.name for channel in channels]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Channel names must be unique: {names}")
+    return channels
+
+
+class AlertDispatcher:
+    """
+    Outbox worker.
+
+    An asyncio loop on a background thread claims due rows from the
+    alert_outbox table and delivers each to every channel concurrently. A
+    channel that succeeds is recorded on the row, so a retry only goes to the
+    channels that failed, and the claim keeps two dispatchers (e.g. one per
+    supervisor worker) from sending the same alert twice. Failed rows retry
+    with exponential backoff until MAX_ATTEMPTS. Every delivery is logged to
+    the notifications table with its latency from detection.
+    """
+
+    def __init__(self, channels=None, poll_interval=POLL_INTERVAL_SEC, max_in_flight=MAX_IN_FLIGHT,
+                 max_attempts=MAX_ATTEMPTS):
+        self.channels = channels if channels is not None else build_channels()
+        self.poll_interval = poll_interval
+        self.max_in_flight = max_in_flight
+        self.max_attempts = max_attempts
+
+        self._loop = None
+        self._stopping = None
+        self._thread = None
+
+        # Counters
+        self.delivered = 0
+        self.retried = 0
+        self.failed = 0
+        self.channel_failures = {channel.name: 0 for channel in self.channels}
+        self.avg_latency = 0.0        # EMA of detection -> delivery seconds
+        self.max_latency = 0.0
+
+    def start(self):
+        """Run the dispatcher loop on a background thread"""
+        if self._thread is not None:
+            return self
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._stopping = asyncio.Event()
+            ready.set()
+            try:
+                self._loop.run_until_complete(self.run())
+            finally:
+                self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="alert-dispatcher", daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        """Finish in-flight deliveries and stop"""
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._stopping.set)
+        self._thread.join()
+        self._thread = None
+
+    async def run(self):
+        """Poll and deliver until stopped (call stop() from another thread)"""
+        if self._stopping is None:
+            self._stopping = asyncio.Event()
+        slots = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+        while not self._stopping.is_set():
+            free = self.max_in_flight - len(tasks)
+            rows = []
+            if free > 0:
+                try:
+                    rows = await asyncio.to_thread(claim_outbox_notifications, min(free, CLAIM_BATCH_SIZE),
+                                                   CLAIM_STALE_SEC)
+                except Exception as e:
+                    print(f"[DISPATCH] Failed to read the outbox: {e}")
+            for row in rows:
+                task = asyncio.create_task(self._deliver(row, slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _send(self, channel, payload):
+        return await asyncio.wait_for(channel.send(payload), CHANNEL_TIMEOUT_SEC)
+
+    async def _deliver(self, row, slots):
+        async with slots:
+            payload = row['payload']
+            delivered = set(row['delivered'])
+            pending = [channel for channel in self.channels if channel.name not in delivered]
+            results = await asyncio.gather(*(self._send(channel, payload) for channel in pending),
+                                           return_exceptions=True)
+
+            errors = []
+            now = time.time()
+            latency = now - row['detected_at'] if row['detected_at'] else None
+            for channel, result in zip(pending, results):
+                if isinstance(result, BaseException):
+                    self.channel_failures[channel.name] += 1
+                    errors.append(f"{channel.name}: {result!r}")
+                    continue
+                delivered.add(channel.name)
+                try:
+                    await asyncio.to_thread(log_notification, row['alert_id'], None, payload['message'],
+                                            channel.name, latency)
+                except Exception as e:
+                    # Delivered all the same; the outcome below must still be recorded
+                    print(f"[DISPATCH] Failed to log {channel.name} notification for alert {row['alert_id']}: {e}")
+                if latency is not None:
+                    latency_metrics.observe(payload.get('camera_id'), 'first_seen_to_delivery', latency)
+                    self.avg_latency = latency if self.delivered == 0 else self.avg_latency * 0.9 + latency * 0.1
+                    self.max_latency = max(self.max_latency, latency)
+                self.delivered += 1
+
+            attempts = row['attempts'] + 1
+            if not errors:
+                status, next_attempt_at = 'sent', None
+            elif attempts >= self.max_attempts:
+                status, next_attempt_at = 'failed', None
+                self.failed += 1
+                print(f"[DISPATCH] Giving up on alert {row['alert_id']} after {attempts} attempts: {'; '.join(errors)}")
+            else:
+                status = 'pending'
+                next_attempt_at = now + min(RETRY_BACKOFF_SEC * 2 ** (attempts - 1), MAX_RETRY_BACKOFF_SEC)
+                self.retried += 1
+            try:
+                await asyncio.to_thread(update_outbox_notification, row['id'], status, delivered, attempts,
+                                        next_attempt_at, '; '.join(errors) or None)
+            except Exception as e:
+                # The claim goes stale and the row is claimed again later
+                print(f"[DISPATCH] Failed to record delivery of alert {row['alert_id']}: {e}")
+
+    def get_stats(self):
+        """Dispatcher counters for monitoring"""
+        return {
+            'channels': [channel.name for channel in self.channels],
+            'delivered': self.delivered,
+            'retried': self.retried,
+            'failed': self.failed,
+            'channel_failures': dict(self.channel_failures),
+            'avg_latency': self.avg_latency,
+            'max_latency': self.max_latency
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fire Detection System - Alert Dispatch")
+    parser.add_argument("--stats-interval", type=float, default=30.0, help="Seconds between stats lines")
+    args = parser.parse_args()
+
+    init_database()
+    dispatcher = AlertDispatcher().start()
+    print(f"[DISPATCH] Delivering alerts to: {', '.join(channel.name for channel in dispatcher.channels)}")
+    try:
+        while True:
+            time.sleep(args.stats_interval)
+            stats = dispatcher.get_stats()
+            print(f"[DISPATCH] delivered={stats['delivered']} retried={stats['retried']} failed={stats['failed']} "
+                  f"latency={stats['avg_latency']:.2f}s (max {stats['max_latency']:.2f}s) outbox={get_outbox_counts()}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        dispatcher.stop()
+
+
+if __name__ == "__main__":
+    main()
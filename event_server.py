@@ -0,0 +1,280 @@
+"""
+Fire Detection System - Dashboard Event Server
+Pushes dashboard changes (detections, alerts, camera status, activity) to
+browsers over Server-Sent Events, so clients no longer poll the database
+
+Usage: python event_server.py [--host 0.0.0.0] [--port 8001]
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from database import init_database, get_generation, get_dashboard_snapshot
+
+# Configuration
+EVENT_SERVER_PORT = 8001      # Dashboard (index.js) connects to this port on the same host
+POLL_INTERVAL_SEC = 0.25      # How often the database change generation is checked
+KEEPALIVE_SEC = 15.0          # Comment line sent to idle clients so proxies keep the stream open
+CLIENT_QUEUE_SIZE = 256       # Events buffered per client before it is resynced with a snapshot
+CLIENT_RETRY_MS = 2000        # Reconnect delay suggested to EventSource clients
+
+# Row lists: new rows (by id) become one event each, oldest first
+ROW_SECTIONS = {'detections': 'detection', 'alerts': 'alert', 'activity': 'activity'}
+# Sections sent whole whenever they change
+WHOLE_SECTIONS = ('stats', 'firefighters', 'personnel', 'stations', 'detection_history')
+
+
+def diff_snapshots(old, new):
+    """
+    List of (event, data) turning dashboard snapshot old into new: one event
+    per new or changed detection/alert/activity row and camera, and the whole
+    section for everything else that changed.
+    """
+    events = []
+    for section, event in ROW_SECTIONS.items():
+        previous = {row['id']: row for row in old.get(section, [])}
+        for row in reversed(new.get(section, [])):
+            if previous.get(row['id']) != row:
+                events.append((event, row))
+
+    old_cameras = old.get('cameras', {})
+    for camera_id, camera in new.get('cameras', {}).items():
+        if old_cameras.get(camera_id) != camera:
+            events.append(('camera', camera))
+
+    for section in WHOLE_SECTIONS:
+        if old.get(section) != new.get(section):
+            events.append((section, new.get(section)))
+    return events
+
+
+def format_event(event_id, event, data):
+    """Encode one SSE message"""
+    payload = data if isinstance(data, str) else json.dumps(data, default=str)
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n".encode('utf-8')
+
+
+class EventBroadcaster:
+    """
+    Watches the database change generation and fans deltas out to clients.
+
+    A single thread reads the (cached) dashboard snapshot once per change and
+    diffs it against the previous one; each connected client gets the
+    resulting events through its own bounded queue, so adding clients adds
+    no database reads. A client that falls CLIENT_QUEUE_SIZE events behind is
+    sent a fresh snapshot instead of the backlog.
+    """
+
+    def __init__(self, poll_interval=POLL_INTERVAL_SEC, client_queue_size=CLIENT_QUEUE_SIZE):
+        self.poll_interval = poll_interval
+        self.client_queue_size = client_queue_size
+
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+        self._generation = None
+        self._snapshot = {}
+        self._snapshot_json = "{}"
+        self._event_id = 0
+
+        # Counters
+        self.polls = 0
+        self.changes = 0
+        self.events_published = 0
+        self.resyncs = 0
+        self.last_publish_time = 0.0
+
+    def start(self):
+        """Load the first snapshot and start the watcher thread"""
+        if self._running:
+            return self
+        self._snapshot_json = self._refresh()[1]
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="event-broadcaster", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the watcher and end every client stream"""
+        self._running = False
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            for client in self._clients:
+                self._put(client, None)
+
+    def subscribe(self):
+        """Register a client. Returns (queue, snapshot message) to send first."""
+        client = queue.Queue(maxsize=self.client_queue_size)
+        with self._lock:
+            self._clients.add(client)
+            message = format_event(self._event_id, 'snapshot', self._snapshot_json)
+        return client, message
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def snapshot_json(self):
+        """Latest dashboard snapshot as JSON"""
+        return self._snapshot_json
+
+    def get_stats(self):
+        """Broadcaster counters for monitoring"""
+        with self._lock:
+            clients = len(self._clients)
+            backlog = max((client.qsize() for client in self._clients), default=0)
+        return {
+            'clients': clients,
+            'max_client_backlog': backlog,
+            'polls': self.polls,
+            'changes': self.changes,
+            'events_published': self.events_published,
+            'resyncs': self.resyncs,
+            'last_publish_time': self.last_publish_time
+        }
+
+    def _refresh(self):
+        """Load the current snapshot; returns the events since the previous one and its JSON"""
+        self._generation = get_generation()
+        # Diffed dict and JSON from the same cache read, so they are one generation
+        snapshot, snapshot_json = get_dashboard_snapshot()
+        events = diff_snapshots(self._snapshot, snapshot)
+        self._snapshot = snapshot
+        return events, snapshot_json
+
+    def _put(self, client, message):
+        try:
+            client.put_nowait(message)
+            return True
+        except queue.Full:
+            return False
+
+    def _publish(self, events, snapshot_json):
+        start = time.time()
+        with self._lock:
+            # Swapped together with sending its events: a client subscribing
+            # now gets either the old snapshot and these events, or the new
+            # snapshot and none of them
+            self._snapshot_json = snapshot_json
+            messages = []
+            for event, data in events:
+                self._event_id += 1
+                messages.append(format_event(self._event_id, event, data))
+            for client in self._clients:
+                for message in messages:
+                    if not self._put(client, message):
+                        # Too far behind: drop the backlog and resync
+                        self.resyncs += 1
+                        while not client.empty():
+                            try:
+                                client.get_nowait()
+                            except queue.Empty:
+                                break
+                        self._put(client, format_event(self._event_id, 'snapshot', self._snapshot_json))
+                        break
+        self.events_published += len(messages)
+        self.last_publish_time = time.time() - start
+
+    def _run(self):
+        while self._running:
+            time.sleep(self.poll_interval)
+            self.polls += 1
+            try:
+                if get_generation() == self._generation:
+                    continue
+                events, snapshot_json = self._refresh()
+            except Exception as e:
+                print(f"[EVENTS] Failed to read dashboard snapshot: {e}")
+                continue
+            self.changes += 1
+            self._publish(events, snapshot_json)
+
+
+class EventRequestHandler(BaseHTTPRequestHandler):
+    """GET /events streams SSE, /snapshot returns the dashboard JSON, /stats the counters"""
+
+    broadcaster = None
+
+    def _send_headers(self, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Cache-Control', 'no-cache')
+        # The dashboard is served by PHP on another port
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+
+    def _send_json(self, body):
+        payload = body.encode('utf-8')
+        self._send_headers('application/json')
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/events':
+            self._stream()
+        elif path == '/snapshot':
+            self._send_json(self.broadcaster.snapshot_json())
+        elif path == '/stats':
+            self._send_json(json.dumps(self.broadcaster.get_stats()))
+        else:
+            self.send_error(404)
+
+    def _stream(self):
+        client, snapshot = self.broadcaster.subscribe()
+        try:
+            self._send_headers('text/event-stream')
+            self.wfile.write(f"retry: {CLIENT_RETRY_MS}\n\n".encode('utf-8') + snapshot)
+            self.wfile.flush()
+            while True:
+                try:
+                    message = client.get(timeout=KEEPALIVE_SEC)
+                except queue.Empty:
+                    message = b": keepalive\n\n"
+                if message is None:
+                    return
+                self.wfile.write(message)
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.broadcaster.unsubscribe(client)
+
+    def log_message(self, format, *args):
+        # Streams are long-lived; skip the per-request access log
+        pass
+
+
+def serve(host='0.0.0.0', port=EVENT_SERVER_PORT):
+    """Run the event server until interrupted"""
+    init_database()
+    broadcaster = EventBroadcaster().start()
+    EventRequestHandler.broadcaster = broadcaster
+    server = ThreadingHTTPServer((host, port), EventRequestHandler)
+    server.daemon_threads = True
+    print(f"Dashboard event stream at http://{host}:{port}/events")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        broadcaster.stop()
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fire Detection System - Dashboard Event Server")
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=EVENT_SERVER_PORT, help="Port to listen on")
+    args = parser.parse_args()
+    serve(args.host, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,44 @@
+import argparse
 import cv2
-from ultralytics import YOLO
+import numpy as np
 import os
+import signal
+import sys
+import threading
 from datetime import datetime
+from functools import partial
 import time
 
-# FORCE CPU USAGE (fixes old GPU compatibility issues)
-import torch
-torch.cuda.is_available = lambda: False
-
 # Import database module
 from database import (
-    init_database, get_cameras, update_camera_status, log_detection,
-    update_detection_clip, create_alert, add_activity, get_stats
+    init_database, get_cameras, update_camera_statuses, log_detection,
+    update_detection_confidence, create_alert, add_activity,
+    queue_camera_status, queue_activity, queue_camera_heartbeat, start_telemetry_writer,
+    stop_telemetry_writer, get_telemetry_stats
+)
+from inference import InferenceScheduler, AdaptiveRateController
+from backends import (
+    load_backend, empty_detections, max_confidence_by_category, CATEGORY_FIRE, CATEGORY_SMOKE
 )
+from capture import CaptureStage
+from camera import parse_camera_source
+from frame_buffer import FrameRingBuffer
+from clips import ClipExporter, draw_detections
+from motion import MotionGate
+from tiling import RegionInference
+from live_view import LiveViewPublisher
+from frame_encoder import FrameEncoder
+from thermal import ThermalSimulator
+from tracking import IncidentTracker
+from dispatch import AlertDispatcher
+from metrics import latency_metrics
 
 # -------- SETTINGS --------
 MODEL_PATH = "10best.pt"
+# 'auto' picks the backend from MODEL_PATH: 10best.pt -> ultralytics (PyTorch),
+# 10best.onnx / 10best_int8.onnx -> onnx, 10best_openvino_model/ -> openvino.
+# Export with: python backends.py 10best.pt --format onnx [--int8]
+INFERENCE_BACKEND = "auto"
 SAVE_DIR_IMG = "detected_images"
 CAMERA_FRAMES_DIR = "camera_frames"
 
@@ -27,14 +50,79 @@ CLIP_BUFFER_SEC = CLIP_DURATION_SEC + 2.0
 
 SAVE_DIR_CLIP = "detected_clips"
 
-# Frame buffers and pending clips
+# Frame buffers and pending clips (camera_id -> list of pending clips)
 FRAME_BUFFERS = {}
 PENDING_CLIPS = {}
 
+# Simulated thermal cameras keep no frames of their own: camera_id -> the
+# camera whose buffered frames (and detections) their clips are rendered from
+FRAME_BUFFER_SOURCES = {}
+
+# Frame buffer memory per camera. Cameras missing from FRAME_BUFFER_CONFIG use
+# the defaults; 'compressed' keeps JPEG packets instead of raw frames, 'fps'
+# sets the frame rate the buffer is sized for.
+FRAME_BUFFER_BUDGET_MB = 256
+FRAME_BUFFER_FPS = 30.0   # Buffers hold CLIP_BUFFER_SEC of frames at this rate, within the budget
+FRAME_BUFFER_CONFIG = {
+    # 2: {'memory_budget_mb': 64, 'compressed': True},
+}
+
+# Motion gating ahead of inference. Cameras missing from MOTION_GATE_CONFIG use
+# the MotionGate defaults; keys are MotionGate arguments (method, sensitivity,
+# pixel_threshold, heartbeat_sec, ...).
+MOTION_GATE_ENABLED = True
+MOTION_GATE_CONFIG = {
+    # 1: {'method': 'histogram', 'heartbeat_sec': 30.0},
+}
+MOTION_GATES = {}
+
+# ROI masks and tiled inference per camera (RegionInference arguments; polygons
+# are in 0..1 frame coordinates). Cameras missing here infer the whole frame.
+# An int value shares another camera's plan, for cameras fed the same frame.
+REGION_CONFIG = {
+    # 1: {'mode': 'auto', 'exclude': [[(0, 0), (1, 0), (1, 0.25), (0, 0.25)]]},  # skip the sky
+    # 2: 1,
+}
+REGION_PLANNERS = {}
+
+# Live view: MJPEG streams at http://<host>:LIVE_VIEW_PORT/camera/<id>.mjpg, plus a
+# camera{id}_live.jpg fallback refreshed every LIVE_SNAPSHOT_INTERVAL_SEC
+LIVE_VIEW_PORT = 8002
+LIVE_SNAPSHOT_INTERVAL_SEC = 5.0
+
+# How often the loops print capture/inference queue stats
+STATS_INTERVAL_SEC = 30.0
+
+# Per-stage latency histograms (metrics.py) are served at /metrics on the live
+# view port and dumped here as camera{id}_latency.json with the stats (None = never)
+LATENCY_METRICS_DIR = "logs"
+
+# Preview windows need a display. None = headless only when no display is
+# available; --headless on the command line forces it
+HEADLESS = None
+
+# Camera groups (run_camera_group): longest wait on one camera's next
+# frame before the others are checked, so an idle camera does not stall the group
+GROUP_READ_TIMEOUT_SEC = 0.05
+
 # Detection thresholds
 FIRE_CONFIDENCE_THRESHOLD = 0.70
 SMOKE_CONFIDENCE_THRESHOLD = 0.65
 
+# Incidents reported at or above this confidence also raise an alert
+ALERT_CONFIDENCE_THRESHOLD = 0.6
+
+# Any fire/smoke box at or above this confidence switches the camera to dense
+# sampling until it is confirmed or rejected
+CANDIDATE_CONFIDENCE_THRESHOLD = 0.35
+
+# Latest Detections per camera, drawn on every live frame until the next inference
+LIVE_DETECTIONS = {}
+
+# Detections are grouped into incidents per camera (tracking.IncidentTracker):
+# an incident is logged and alerted once when confirmed, then only updated
+INCIDENT_TRACKERS = {}
+
 # Create directories
 os.makedirs(SAVE_DIR_IMG, exist_ok=True)
 os.makedirs(CAMERA_FRAMES_DIR, exist_ok=True)
@@ -44,10 +132,58 @@ os.makedirs(SAVE_DIR_CLIP, exist_ok=True)
 print("Initializing database...")
 init_database()
 
-# Load model
-print("Loading YOLO model...")
-model = YOLO(MODEL_PATH)
-print("Model loaded successfully!")
+# The model and its inference queue are loaded by load_model() (via
+# start_pipeline()), once per process; every camera pipeline in the process shares them
+model = None
+scheduler = None
+
+# Per-camera inference rate, driven by predict latency and detection state
+rate_controller = AdaptiveRateController()
+
+# Clips are encoded by a process pool off the capture loop
+clip_exporter = ClipExporter()
+# One JPEG cache for the live view, detection images and manual saves; frames are
+# keyed (camera_id, capture seq, variant) so each image is encoded at most once
+frame_encoder = FrameEncoder()
+live_view = LiveViewPublisher(encoder=frame_encoder, snapshot_dir=CAMERA_FRAMES_DIR,
+                              snapshot_interval=LIVE_SNAPSHOT_INTERVAL_SEC, metrics=latency_metrics)
+# Simulated thermal views are rendered only when shown or saved, cached per (camera, seq)
+thermal_simulator = ThermalSimulator()
+# Alerts are queued in the database with the detection and delivered off the capture loop
+alert_dispatcher = AlertDispatcher()
+
+def load_model():
+    """Load the detection model and create its inference scheduler (once per process)"""
+    global model, scheduler
+    if model is None:
+        print("Loading YOLO model...")
+        model = load_backend(MODEL_PATH, INFERENCE_BACKEND)
+        print("Model loaded successfully!")
+        scheduler = InferenceScheduler(model)
+    return model
+
+def start_pipeline(live_view_port=LIVE_VIEW_PORT):
+    """Start the background stages: clip encoders, model and scheduler, telemetry writer, alert dispatcher, live view"""
+    # Start the clip encoders first so they fork before the model is loaded
+    # and before any other threads exist
+    clip_exporter.start()
+    load_model()
+    scheduler.start()
+    start_telemetry_writer()
+    alert_dispatcher.start()
+    live_view.start(port=live_view_port)
+
+def stop_pipeline():
+    """Stop the background stages started by start_pipeline()"""
+    live_view.stop()
+    alert_dispatcher.stop()
+    stop_telemetry_writer()
+    if scheduler is not None:
+        scheduler.stop()
+    clip_exporter.stop()
+
+# Set by SIGINT/SIGTERM; the camera loops stop after the current frame
+shutdown_event = threading.Event()
 
 # Cache camera data
 CAMERAS_CACHE = None
@@ -67,352 +203,666 @@ def refresh_camera_cache():
     CAMERAS_CACHE = {cam['id']: cam for cam in cameras}
 
 # Frame buffer utilities
-def update_frame_buffer(camera_id, frame):
+def get_frame_buffer(camera_id):
+    """Get (or create) the ring buffer for a camera."""
+    camera_id = FRAME_BUFFER_SOURCES.get(camera_id, camera_id)
+    buf = FRAME_BUFFERS.get(camera_id)
+    if buf is None:
+        config = FRAME_BUFFER_CONFIG.get(camera_id, {})
+        buf = FrameRingBuffer(
+            memory_budget_mb=config.get('memory_budget_mb', FRAME_BUFFER_BUDGET_MB),
+            compressed=config.get('compressed', False),
+            duration_sec=CLIP_BUFFER_SEC,
+            fps=config.get('fps', FRAME_BUFFER_FPS),
+            name=f"Camera {camera_id} frame buffer"
+        )
+        FRAME_BUFFERS[camera_id] = buf
+    return buf
+
+def update_frame_buffer(camera_id, frame, timestamp=None):
     """Keep a rolling buffer of frames for each camera."""
-    now = time.time()
-    if camera_id not in FRAME_BUFFERS:
-        FRAME_BUFFERS[camera_id] = []
-    buf = FRAME_BUFFERS[camera_id]
-    buf.append((now, frame.copy()))
-    
-    cutoff = now - CLIP_BUFFER_SEC
-    while buf and buf[0][0] < cutoff:
-        buf.pop(0)
-
-def save_detection_clip(camera_id, detection_id, trigger_time):
-    """Save a clip from 1 second before to 4 seconds after trigger_time with bounding boxes."""
-    buf = FRAME_BUFFERS.get(camera_id, [])
+    now = timestamp if timestamp is not None else time.time()
+    get_frame_buffer(camera_id).append(frame, now)
+
+# Motion gate utilities
+def get_motion_gate(camera_id):
+    """Get (or create) the motion gate for a camera."""
+    gate = MOTION_GATES.get(camera_id)
+    if gate is None:
+        gate = MotionGate(**MOTION_GATE_CONFIG.get(camera_id, {}))
+        MOTION_GATES[camera_id] = gate
+    return gate
+
+def passes_motion_gate(camera_id, frame, timestamp=None):
+    """True if the scene changed enough (or the heartbeat is due) to run the model."""
+    if not MOTION_GATE_ENABLED:
+        return True
+    return get_motion_gate(camera_id).check(frame, timestamp)
+
+def should_run_inference(camera_id, frame, timestamp):
+    """
+    Decide whether this frame goes to the model: the camera must be due per
+    the adaptive rate controller, and the scene must have changed unless a
+    fire/smoke candidate is being confirmed.
+    """
+    if not rate_controller.should_infer(camera_id, timestamp):
+        return False
+    if rate_controller.is_candidate(camera_id, timestamp):
+        return True
+    return passes_motion_gate(camera_id, frame, timestamp)
+
+def record_inference_outcome(camera_id, detection_infos, latency, timestamp):
+    """Feed a frame's predict latency and candidate state back to the rate controller."""
+    rate_controller.record_latency(latency)
+    candidate = any(
+        max(info['max_fire_confidence'], info['max_smoke_confidence']) >= CANDIDATE_CONFIDENCE_THRESHOLD
+        for info in detection_infos
+    )
+    rate_controller.record_result(camera_id, candidate, timestamp)
+
+# ROI / tiling utilities
+def get_region_planner(camera_id):
+    """Get (or create) the ROI/tiling planner for a camera, or None for whole-frame inference."""
+    config = REGION_CONFIG.get(camera_id)
+    if config is None:
+        return None
+    if isinstance(config, int):
+        return get_region_planner(config)
+    planner = REGION_PLANNERS.get(camera_id)
+    if planner is None:
+        planner = RegionInference(**config)
+        REGION_PLANNERS[camera_id] = planner
+    return planner
+
+def submit_frames(requests):
+    """
+    Queue (camera_id, frame) requests with the scheduler as one batch without
+    waiting; collect_frames() returns their Detections. Cameras with an
+    ROI/tiling config are expanded into their regions.
+    """
+    plans = []
+    scheduler_requests = []
+    for camera_id, frame in requests:
+        planner = get_region_planner(camera_id)
+        regions = [(frame, (0, 0))] if planner is None else planner.plan(frame)
+        plans.append((planner, regions, len(scheduler_requests)))
+        scheduler_requests.extend((camera_id, image) for image, _ in regions)
+
+    futures = scheduler.submit_many(scheduler_requests) if scheduler_requests else []
+    return plans, futures
+
+def collect_frames(submitted):
+    """Wait for submit_frames() requests; one Detections per request, regions merged back into frame coordinates"""
+    plans, futures = submitted
+    results = [future.result() for future in futures]
+
+    detections = []
+    for planner, regions, offset in plans:
+        region_detections = results[offset:offset + len(regions)]
+        if not regions:
+            # Everything is masked out
+            detections.append(empty_detections(model.names))
+        elif planner is None:
+            detections.append(region_detections[0])
+        else:
+            planner.record_latency(scheduler.image_latency)
+            detections.append(planner.merge(regions, region_detections, model.names))
+    return detections
+
+def infer_frames(requests):
+    """Run (camera_id, frame) requests through the scheduler as one batch; one Detections per request"""
+    return collect_frames(submit_frames(requests))
+
+def record_detections(camera_id, timestamp, detections):
+    """Keep the boxes from an inference frame next to it in the frame buffer."""
+    get_frame_buffer(camera_id).set_detections(timestamp, detections.data)
+
+def save_detection_clip(camera_id, detection_id, trigger_time, detection_type=None):
+    """
+    Queue a clip from 1 second before to 4 seconds after trigger_time with bounding boxes.
+    Boxes come from the detections stored in the frame buffer, interpolated for
+    frames that were not inferred, so no extra model runs are needed.
+    """
+    buf = FRAME_BUFFERS.get(FRAME_BUFFER_SOURCES.get(camera_id, camera_id))
     if not buf:
         return None
 
     start_time = trigger_time - CLIP_BEFORE_SEC
     end_time = trigger_time + CLIP_AFTER_SEC
 
-    selected_frames = [frame for (t, frame) in buf if start_time <= t <= end_time]
-    if not selected_frames:
-        selected_frames = [frame for (_, frame) in buf]
-        if not selected_frames:
-            return None
+    frame_count = buf.count_range(start_time, end_time)
+    if frame_count == 0:
+        # Nothing inside the window, fall back to whatever is buffered
+        start_time, end_time = None, None
+        frame_count = len(buf)
 
-    height, width, _ = selected_frames[0].shape
-    duration = end_time - start_time
-    if duration <= 0:
-        duration = CLIP_DURATION_SEC
-    fps = len(selected_frames) / duration if len(selected_frames) > 1 else 10
+    duration = CLIP_DURATION_SEC
+    fps = frame_count / duration if frame_count > 1 else 10
 
     filename = f"camera{camera_id}_det_{detection_id}.mp4"
     save_path = os.path.join(SAVE_DIR_CLIP, filename)
 
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-    out = cv2.VideoWriter(save_path, fourcc, fps, (width, height))
-
-    for fr in selected_frames:
-        results = model.predict(source=fr, verbose=False)
-        annotated = results[0].plot()
-        out.write(annotated)
-
-    out.release()
-
-    # Update detection with clip path in database
-    update_detection_clip(detection_id, save_path)
-    
-    print(f"Saved detection clip with boxes: {save_path}")
+    # Copy the frames out of the ring before it wraps over them
+    timestamps, frames = buf.snapshot_range(start_time, end_time)
+
+    # Keyframes just outside the window let the edges interpolate too
+    keyframes = buf.get_keyframes(
+        None if start_time is None else start_time - CLIP_BEFORE_SEC,
+        None if end_time is None else end_time + CLIP_BEFORE_SEC
+    )
+
+    # The clip path is written to the database once the clip is encoded
+    clip_exporter.submit({
+        'detection_id': detection_id,
+        'camera_id': camera_id,
+        'detection_type': detection_type,
+        'save_path': save_path,
+        'timestamps': timestamps,
+        'frames': frames,
+        'keyframes': keyframes,
+        'names': model.names,
+        'fps': fps,
+        'compressed': buf.compressed,
+        # Simulated cameras' clips are rendered from their source's frames
+        'transform': 'thermal' if camera_id in FRAME_BUFFER_SOURCES else None
+    })
     return save_path
 
 def handle_pending_clips(camera_id):
-    """Check if we can now save a pending clip for this camera."""
+    """Save any pending clips for this camera whose window has passed."""
     pending = PENDING_CLIPS.get(camera_id)
     if not pending:
         return
 
     now = time.time()
-    trigger_time = pending["trigger_time"]
-
-    if now >= trigger_time + CLIP_AFTER_SEC:
-        save_detection_clip(camera_id, pending["detection_id"], trigger_time)
-        del PENDING_CLIPS[camera_id]
+    while pending and now >= pending[0]["trigger_time"] + CLIP_AFTER_SEC:
+        clip = pending.pop(0)
+        save_detection_clip(camera_id, clip["detection_id"], clip["trigger_time"], clip["detection_type"])
+
+def get_incident_tracker(camera_id):
+    """Get (or create) the incident tracker for a camera."""
+    tracker = INCIDENT_TRACKERS.get(camera_id)
+    if tracker is None:
+        tracker = IncidentTracker(thresholds={
+            CATEGORY_FIRE: FIRE_CONFIDENCE_THRESHOLD,
+            CATEGORY_SMOKE: SMOKE_CONFIDENCE_THRESHOLD
+        })
+        INCIDENT_TRACKERS[camera_id] = tracker
+    return tracker
+
+def log_incident(incident, camera_id, annotated, frame_key):
+    """Save the detection image, log the detection and raise the alert for a newly confirmed incident"""
+    log_type = 'fire' if incident.category == CATEGORY_FIRE else 'smoke'
+    # The peak is what confirmed it; the confirming frame may score lower
+    confidence = incident.peak_confidence
+
+    # Save annotated image
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    save_name = f"camera{camera_id}_{log_type}_{timestamp}.jpg"
+    save_path = os.path.join(SAVE_DIR_IMG, save_name)
+    # Stage latencies are measured from the frame that confirmed the incident,
+    # end to end also from the first frame it was seen in
+    captured_at = incident.last_seen
+    start = time.time()
+    frame_encoder.write(save_path, frame_key, annotated)
+    start = latency_metrics.since(camera_id, 'image_write', start, time.time())
+
+    # Get camera info
+    camera = get_camera_info(camera_id)
 
-def process_detection_results(results, camera_id, frame, save_image=True):
-    """Process YOLO detection results"""
+    # Log detection to database
+    detection_id = log_detection(
+        camera_id=camera_id,
+        detection_type=log_type,
+        confidence=confidence,
+        image_path=save_path,
+        location=camera['location'],
+        latitude=camera['latitude'],
+        longitude=camera['longitude'],
+        camera_name=camera['name']
+    )
+    incident.detection_id = detection_id
+    now = latency_metrics.since(camera_id, 'log_detection', start, time.time())
+    latency_metrics.observe(camera_id, 'capture_to_detection', now - captured_at)
+    latency_metrics.observe(camera_id, 'first_seen_to_detection', now - incident.first_seen)
+
+    # Create alert if high confidence
+    if confidence >= ALERT_CONFIDENCE_THRESHOLD:
+        raise_incident_alert(incident, camera_id, camera, confidence, captured_at, start=now)
+
+    # Mark pending clip
+    trigger_time = time.time()
+    PENDING_CLIPS.setdefault(camera_id, []).append({
+        "detection_id": detection_id,
+        "detection_type": log_type,
+        "trigger_time": trigger_time
+    })
+
+    print(f"\nDETECTED {log_type.upper()} with confidence {confidence:.1%} (incident {incident.id})")
+    return detection_id
+
+def raise_incident_alert(incident, camera_id, camera, confidence, captured_at, start=None):
+    """
+    Create the alert for a logged incident and report it in the activity log.
+    captured_at is the capture time of the frame that raised it; delivery
+    latency in the outbox counts from the incident's first frame.
+    """
+    log_type = 'fire' if incident.category == CATEGORY_FIRE else 'smoke'
+    alert_level = 'critical' if log_type == 'fire' else 'warning'
+    message = f"{log_type.upper()} detected at {camera['location']} - Confidence: {confidence:.1%}"
+    start = start if start is not None else time.time()
+    incident.alert_id = create_alert(incident.detection_id, alert_level, message, detected_at=incident.first_seen)
+    now = latency_metrics.since(camera_id, 'create_alert', start, time.time())
+    latency_metrics.observe(camera_id, 'capture_to_alert', now - captured_at)
+    latency_metrics.observe(camera_id, 'first_seen_to_alert', now - incident.first_seen)
+    queue_activity(f"ALERT: {message}")
+
+def process_detection_results(detections, camera_id, frame, timestamp=None, max_confidences=None,
+                              annotated=None, frame_key=None):
+    """
+    Process the Detections for one frame. The camera's incident tracker
+    decides what gets recorded: a newly confirmed incident is logged and
+    alerted once, a confirmed one whose confidence rose is updated, and
+    further frames of the same fire record nothing.
+
+    max_confidences is this frame's row from max_confidence_by_category()
+    when a batch was already summarized. annotated is the frame with these
+    detections already drawn (or a callable drawing it), and frame_key its
+    FrameEncoder key, so a frame the live view already encoded is reused and
+    an unsaved frame is never drawn.
+    """
+    if max_confidences is None:
+        max_confidences = max_confidence_by_category([detections])[0]
+    
+    max_fire = float(max_confidences[CATEGORY_FIRE])
+    max_smoke = float(max_confidences[CATEGORY_SMOKE])
     detection_info = {
-        'has_fire': False,
-        'has_smoke': False,
-        'max_fire_confidence': 0,
-        'max_smoke_confidence': 0
+        'has_fire': max_fire > 0,
+        'has_smoke': max_smoke > 0,
+        'max_fire_confidence': max_fire,
+        'max_smoke_confidence': max_smoke
     }
-    
-    for result in results:
-        boxes = result.boxes
-        for box in boxes:
-            cls_id = int(box.cls[0])
-            confidence = float(box.conf[0])
-            class_name = result.names[cls_id].lower()
-            
-            if 'fire' in class_name:
-                detection_info['has_fire'] = True
-                detection_info['max_fire_confidence'] = max(
-                    detection_info['max_fire_confidence'], 
-                    confidence
-                )
-            elif 'smoke' in class_name:
-                detection_info['has_smoke'] = True
-                detection_info['max_smoke_confidence'] = max(
-                    detection_info['max_smoke_confidence'], 
-                    confidence
-                )
-    
-    if save_image and (detection_info['has_fire'] or detection_info['has_smoke']):
-        if detection_info['max_fire_confidence'] >= detection_info['max_smoke_confidence']:
-            log_type = 'fire'
-            confidence = detection_info['max_fire_confidence']
-        else:
-            log_type = 'smoke'
-            confidence = detection_info['max_smoke_confidence']
-        
-        threshold = FIRE_CONFIDENCE_THRESHOLD if log_type == 'fire' else SMOKE_CONFIDENCE_THRESHOLD
-        
-        if confidence >= threshold:
-            # Save annotated image
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            save_name = f"camera{camera_id}_{log_type}_{timestamp}.jpg"
-            save_path = os.path.join(SAVE_DIR_IMG, save_name)
-            
-            annotated_frame = results[0].plot()
-            cv2.imwrite(save_path, annotated_frame)
-            
-            # Get camera info
+
+    timestamp = timestamp if timestamp is not None else time.time()
+    start = time.time()
+    events = get_incident_tracker(camera_id).update(detections, timestamp)
+    latency_metrics.since(camera_id, 'tracking', start, time.time())
+    for event, incident in events:
+        log_type = 'fire' if incident.category == CATEGORY_FIRE else 'smoke'
+        if event == 'confirmed':
+            if annotated is None:
+                annotated = partial(draw_detections, frame, detections.data, detections.names)
+            detection_info['detection_id'] = log_incident(incident, camera_id, annotated, frame_key)
+        elif event == 'updated' and incident.detection_id is not None:
+            update_detection_confidence(incident.detection_id, incident.confidence)
             camera = get_camera_info(camera_id)
-            
-            # Log detection to database
-            detection_id = log_detection(
-                camera_id=camera_id,
-                detection_type=log_type,
-                confidence=confidence,
-                image_path=save_path,
-                location=camera['location'],
-                latitude=camera['latitude'],
-                longitude=camera['longitude'],
-                camera_name=camera['name']
-            )
-            
-            detection_info['detection_id'] = detection_id
-            
-            # Create alert if high confidence
-            if confidence >= 0.6:
-                alert_level = 'critical' if log_type == 'fire' else 'warning'
-                message = f"{log_type.upper()} detected at {camera['location']} - Confidence: {confidence:.1%}"
-                create_alert(detection_id, alert_level, message)
-                add_activity(f"ALERT: {message}")
-
-            # Mark pending clip
-            trigger_time = time.time()
-            PENDING_CLIPS[camera_id] = {
-                "detection_id": detection_id,
-                "trigger_time": trigger_time
-            }
-            
-            print(f"\nDETECTED {log_type.upper()} with confidence {confidence:.1%}")
-    
+            if incident.alert_id is None and incident.confidence >= ALERT_CONFIDENCE_THRESHOLD:
+                # Logged below the alert level and has now crossed it
+                raise_incident_alert(incident, camera_id, camera, incident.confidence, timestamp)
+            else:
+                queue_activity(f"UPDATE: {log_type.upper()} at {camera['location']} now at {incident.confidence:.1%}")
+        elif event == 'closed' and incident.detection_id is not None:
+            camera = get_camera_info(camera_id)
+            duration = incident.last_seen - incident.first_seen
+            queue_activity(f"{log_type.capitalize()} at {camera['location']} no longer detected "
+                           f"(seen for {duration:.0f}s, peak {incident.peak_confidence:.1%})")
+
     return detection_info
 
-def detect_from_webcam(camera_id=1):
-    """Run detection on webcam"""
-    cap = cv2.VideoCapture(0)
-    
-    if not cap.isOpened():
-        print("Error: Could not open webcam.")
+def get_pipeline_stats(captures):
+    """Queue depths and counters for each pipeline stage"""
+    return {
+        'capture': {camera_id: capture.get_stats() for camera_id, capture in captures.items()},
+        'motion': {camera_id: gate.get_stats() for camera_id, gate in MOTION_GATES.items()},
+        'rate': rate_controller.get_stats(),
+        'regions': {camera_id: planner.last_plan_size for camera_id, planner in REGION_PLANNERS.items()},
+        'inference': scheduler.get_stats(),
+        'clips': clip_exporter.get_stats(),
+        'telemetry': get_telemetry_stats(),
+        'live_view': live_view.get_stats(),
+        'encoder': frame_encoder.get_stats(),
+        'thermal': thermal_simulator.get_stats(),
+        'alerts': alert_dispatcher.get_stats(),
+        'incidents': {camera_id: tracker.get_stats() for camera_id, tracker in INCIDENT_TRACKERS.items()},
+        'latency': latency_metrics.get_stats()
+    }
+
+def print_pipeline_stats(captures):
+    """Print a one-line summary of each pipeline stage"""
+    stats = get_pipeline_stats(captures)
+    for camera_id, cap_stats in stats['capture'].items():
+        print(f"[PIPELINE] Camera {camera_id}: captured={cap_stats['frames_captured']} "
+              f"dropped={cap_stats['frames_dropped']} queue={cap_stats['queue_depth']}")
+    for camera_id, gate_stats in stats['motion'].items():
+        print(f"[PIPELINE] Motion gate {camera_id}: passed={gate_stats['passed']} "
+              f"skipped={gate_stats['skipped']} heartbeats={gate_stats['heartbeats']}")
+    rate = stats['rate']
+    for camera_id, cam_rate in rate['cameras'].items():
+        print(f"[PIPELINE] Rate {camera_id}: interval={cam_rate['interval']:.2f}s "
+              f"candidate={cam_rate['candidate']} latency={rate['latency'] * 1000:.0f}ms")
+    inf = stats['inference']
+    print(f"[PIPELINE] Inference: requests={inf['requests']} unique={inf['unique_frames']} "
+          f"batches={inf['batches']} queue={inf['queue_depth']} "
+          f"last_batch={inf['last_batch_time'] * 1000:.0f}ms")
+    clips = stats['clips']
+    print(f"[PIPELINE] Clips: queue={clips['queue_depth']} encoding={clips['in_flight']} "
+          f"done={clips['completed']} dropped={clips['dropped']} "
+          f"encode={clips['avg_encode_time']:.1f}s lag={clips['avg_queue_lag']:.1f}s")
+    live = stats['live_view']
+    encoder = stats['encoder']
+    print(f"[PIPELINE] Live view: viewers={sum(live['viewers'].values())} "
+          f"published={live['frames_published']} sent={live['frames_sent']} "
+          f"skipped={live['frames_skipped']}")
+    print(f"[PIPELINE] JPEG cache: encoded={encoder['misses']} reused={encoder['hits']} "
+          f"encode={encoder['encode_time'] * 1000:.1f}ms")
+    thermal = stats['thermal']
+    print(f"[PIPELINE] Thermal: rendered={thermal['renders']} reused={thermal['hits']} "
+          f"render={thermal['render_time'] * 1000:.1f}ms")
+    alerts = stats['alerts']
+    print(f"[PIPELINE] Alerts: delivered={alerts['delivered']} retried={alerts['retried']} "
+          f"failed={alerts['failed']} latency={alerts['avg_latency']:.2f}s (max {alerts['max_latency']:.2f}s)")
+    for camera_id, incidents in stats['incidents'].items():
+        print(f"[PIPELINE] Incidents {camera_id}: open={incidents['active']} confirmed={incidents['confirmed']} "
+              f"updates={incidents['updates']} merged={incidents['merged']} suppressed={incidents['suppressed']}")
+    for camera_id, stages in stats['latency'].items():
+        print(f"[PIPELINE] Latency {camera_id}: " + " ".join(
+            f"{stage}={stage_stats['p50'] * 1000:.0f}/{stage_stats['p95'] * 1000:.0f}ms"
+            for stage, stage_stats in stages.items()) + " (p50/p95)")
+    if LATENCY_METRICS_DIR:
+        latency_metrics.write_json(LATENCY_METRICS_DIR)
+    telemetry = stats['telemetry']
+    print(f"[PIPELINE] Telemetry: queue={telemetry['queue_depth']} flushes={telemetry['flushes']} "
+          f"coalesced={telemetry['coalesced']} flush={telemetry['avg_flush_latency'] * 1000:.1f}ms")
+
+def begin_group_frame(camera_id, thermal_ids, item):
+    """
+    First half of process_group_frame(): buffer the frame and, if it is due,
+    queue it for inference for camera_id and the simulated thermal cameras
+    (thermal_ids) derived from it, without waiting. Submitting every ready
+    camera before finishing any lets the scheduler batch them together.
+    """
+    seq, captured_at, frame = item
+    # Every simulated camera of this source shows the same thermal image
+    thermal_view = partial(thermal_simulator.render, frame, (camera_id, seq))
+
+    # Thermal cameras share this buffer (FRAME_BUFFER_SOURCES)
+    update_frame_buffer(camera_id, frame, captured_at)
+    for cid in [camera_id] + list(thermal_ids):
+        queue_camera_heartbeat(cid, captured_at)
+        handle_pending_clips(cid)
+
+    submitted = None
+    inference_start = None
+    if should_run_inference(camera_id, frame, captured_at):
+        inference_start = latency_metrics.since(camera_id, 'queue', captured_at, time.time())
+        submitted = submit_frames([(cid, frame) for cid in [camera_id] + list(thermal_ids)])
+    return camera_id, thermal_ids, item, thermal_view, submitted, inference_start
+
+def finish_group_frame(started):
+    """
+    Second half of process_group_frame(): wait for the inference queued by
+    begin_group_frame() and record its results.
+
+    Returns {camera_id: (displayed frame, variant)}; (camera_id, seq, variant)
+    is the frame's FrameEncoder key. Every frame shows the camera's most
+    recent detections. Thermal views and annotated frames are callables that
+    render when first asked for, so nothing is drawn unless the live view, a
+    detection image or the preview needs it; frames without boxes are passed
+    on as captured, without copies.
+    """
+    camera_id, thermal_ids, item, thermal_view, submitted, inference_start = started
+    seq, captured_at, frame = item
+    camera_ids = [camera_id] + list(thermal_ids)
+    if submitted is None:
+        return displayed_frames(camera_ids, frame, thermal_view)
+
+    frame_key = (camera_id, seq, 'annotated')
+    detections = collect_frames(submitted)
+    inference_latency = time.time() - inference_start
+    latency_metrics.observe(camera_id, 'inference', inference_latency)
+    max_confidences = max_confidence_by_category(detections)
+    annotated = partial(draw_detections, frame, detections[0].data, detections[0].names)
+
+    detection_infos = []
+    # Thermal cameras' clips show the boxes stored with the shared visual frames
+    record_detections(camera_id, captured_at, detections[0])
+    for index, (cid, cam_detections) in enumerate(zip(camera_ids, detections)):
+        LIVE_DETECTIONS[cid] = cam_detections
+        # Detection images are the visual frame; with the same boxes that is
+        # exactly the annotated visual frame, so its encoding is reused
+        if index == 0 or np.array_equal(detections[0].data, cam_detections.data):
+            visual, visual_key = annotated, frame_key
+        else:
+            visual, visual_key = None, (cid, seq, 'visual-annotated')
+        detection_info = process_detection_results(cam_detections, cid, frame, timestamp=captured_at,
+                                                    max_confidences=max_confidences[index],
+                                                    annotated=visual, frame_key=visual_key)
+        detection_infos.append(detection_info)
+
+        camera = get_camera_info(cid)
+        if camera and camera['type'] == 'thermal':
+            temp = 22 + (detection_info['max_fire_confidence'] * 100)
+            queue_camera_status(cid, 'online', temperature=temp)
+
+    # The wall-clock wait above covers the whole shared batch; the rate
+    # controller budgets predict time, i.e. this frame's images (tiles) alone
+    plans, _ = submitted
+    frame_latency = scheduler.image_latency * len(plans[0][1])
+    record_inference_outcome(camera_id, detection_infos, frame_latency, captured_at)
+    return displayed_frames(camera_ids, frame, thermal_view, annotated)
+
+def displayed_frames(camera_ids, frame, thermal_view, annotated=None):
+    """
+    {camera_id: (frame, variant)} for a captured camera (camera_ids[0]) and
+    its thermal views, each with that camera's latest detections drawn on.
+    annotated is the visual frame already drawn with them, if there is one.
+    """
+    displayed = {}
+    for index, cid in enumerate(camera_ids):
+        detections = LIVE_DETECTIONS.get(cid)
+        has_boxes = detections is not None and len(detections) > 0
+        if index == 0:
+            if has_boxes:
+                displayed[cid] = (annotated or partial(draw_detections, frame, detections.data, detections.names),
+                                  'annotated')
+            else:
+                displayed[cid] = (frame, 'raw')
+        elif has_boxes:
+            displayed[cid] = (partial(_draw_on_thermal, thermal_view, detections), 'annotated')
+        else:
+            displayed[cid] = (thermal_view, 'thermal')
+    return displayed
+
+def process_group_frame(camera_id, thermal_ids, item):
+    """
+    Run one captured frame of camera_id through the pipeline, together with
+    the simulated thermal cameras (thermal_ids) derived from it. All of them
+    infer on the visual frame in one batch. See finish_group_frame() for the
+    result.
+    """
+    return finish_group_frame(begin_group_frame(camera_id, thermal_ids, item))
+
+def _draw_on_thermal(thermal_view, detections):
+    return draw_detections(thermal_view(), detections.data, detections.names)
+
+def show_preview(camera_id, seq, displayed):
+    """
+    Show one captured camera and the thermal views derived from it side by
+    side (displayed as returned by finish_group_frame(), already rendered).
+    Returns the key pressed (or -1). Only used when not headless.
+    """
+    frames = [displayed[camera_id][0]] + [f for cid, (f, _) in displayed.items() if cid != camera_id]
+    combined = frames[0] if len(frames) == 1 else cv2.hconcat(frames)
+    cv2.imshow(f"Fire & Smoke Detection - Camera {camera_id}", combined)
+
+    key = cv2.waitKey(1) & 0xFF
+    if key == ord('s'):
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        save_name = f"camera{camera_id}_manual_{timestamp}.jpg"
+        save_path = os.path.join(SAVE_DIR_IMG, save_name)
+        frame, variant = displayed[camera_id]
+        frame_encoder.write(save_path, (camera_id, seq, variant), frame)
+        print(f"Saved: {save_name}")
+    return key
+
+def run_camera_group(cameras, stop_event=None, show=False):
+    """
+    Pipeline for a group of cameras (rows of the cameras table).
+    Cameras with a USB index or URL source are captured; 'thermal:<id>'
+    cameras are simulated from camera <id>'s frames and share its inference.
+    Runs until stop_event is set or every capture has ended. With show, each
+    captured camera gets a preview window ('q' quits, 's' saves a frame);
+    otherwise nothing is drawn or composited unless a consumer asks for it.
+    """
+    captures = {}
+    thermal = {}
+    names = {}
+    # Set by any capture with a new frame, so the loop waits on all of them at once
+    frame_ready = threading.Event()
+    for camera in cameras:
+        source = parse_camera_source(camera.get('source'))
+        if source is None:
+            print(f"[PIPELINE] {camera['name']} has no source configured, skipping")
+            continue
+        kind, value = source
+        if kind == 'thermal':
+            thermal.setdefault(value, []).append(camera['id'])
+            FRAME_BUFFER_SOURCES[camera['id']] = value
+            names[camera['id']] = camera['name']
+            continue
+        capture = CaptureStage(value, name=f"camera{camera['id']}-capture", frame_ready=frame_ready)
+        if not capture.start():
+            print(f"[PIPELINE] Could not open {camera['name']} ({camera['source']})")
+            continue
+        captures[camera['id']] = capture
+        names[camera['id']] = camera['name']
+
+    for source_id in list(thermal):
+        if source_id not in captures:
+            print(f"[PIPELINE] Camera {source_id} is not captured here, skipping cameras {thermal.pop(source_id)}")
+    running = list(captures) + [cid for thermal_ids in thermal.values() for cid in thermal_ids]
+    if not running:
         return
-    
+
+    refresh_camera_cache()
+    update_camera_statuses([(cid, 'online', f"{names[cid]} started") for cid in running])
+
+    active = dict(captures)
+    last_stats = time.time()
+
+    try:
+        while active and not (stop_event is not None and stop_event.is_set()):
+            # Take the new frame of every camera that has one and queue them
+            # all before waiting on any, so their inference shares a batch
+            frame_ready.clear()
+            started = []
+            for camera_id, capture in list(active.items()):
+                item = capture.read(timeout=0)
+                if item is None:
+                    if capture.ended:
+                        print(f"[PIPELINE] {names[camera_id]} feed ended.")
+                        del active[camera_id]
+                    continue
+                started.append((camera_id, item, begin_group_frame(camera_id, thermal.get(camera_id, []), item)))
+            if not started:
+                frame_ready.wait(GROUP_READ_TIMEOUT_SEC)
+
+            for camera_id, item, pending in started:
+                seq, captured_at, _ = item
+                displayed = finish_group_frame(pending)
+
+                published = displayed
+                if show:
+                    # The preview needs the pixels anyway; draw once and share them.
+                    # A plain thermal render is the simulator's cached buffer,
+                    # reused after THERMAL_CACHE_SIZE newer renders, so the live
+                    # view (which encodes when a viewer asks) keeps the callable
+                    displayed = {cid: (f() if callable(f) else f, variant) for cid, (f, variant) in displayed.items()}
+                    published = {cid: published[cid] if variant == 'thermal' else (f, variant)
+                                 for cid, (f, variant) in displayed.items()}
+                for cid, (cam_frame, variant) in published.items():
+                    live_view.publish(cid, cam_frame, captured_at, key=(cid, seq, variant))
+                if show and show_preview(camera_id, seq, displayed) == ord('q'):
+                    active.clear()
+                    break
+
+            if time.time() - last_stats >= STATS_INTERVAL_SEC:
+                print_pipeline_stats(captures)
+                last_stats = time.time()
+
+    finally:
+        update_camera_statuses([(cid, 'offline', f"{names[cid]} stopped") for cid in running])
+        for capture in captures.values():
+            capture.stop()
+        if show:
+            cv2.destroyAllWindows()
+
+def detect_from_webcam(camera_id=1, headless=False):
+    """Run detection on webcam"""
     camera = get_camera_info(camera_id)
-    
+
     print(f"\n{'='*60}")
     print(f"Camera: {camera['name']}")
     print(f"{'='*60}")
-    print("Press 'q' to quit, 's' to save current frame")
+    print("Press Ctrl+C to stop" if headless else "Press 'q' to quit, 's' to save current frame")
     print("Camera feed is also streaming to dashboard at http://localhost:8000")
     print(f"{'='*60}\n")
-    
-    update_camera_status(camera_id, 'online')
-    add_activity(f"{camera['name']} started")
-    
-    frame_count = 0
-    detection_cooldown = 0
-    last_frame_save = 0
-    
-    try:
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            update_frame_buffer(camera_id, frame)
-            handle_pending_clips(camera_id)
-            
-            frame_count += 1
-            
-            if frame_count - last_frame_save >= 10:
-                frame_path = os.path.join(CAMERA_FRAMES_DIR, f"camera{camera_id}_live.jpg")
-                cv2.imwrite(frame_path, frame)
-                last_frame_save = frame_count
-            
-            if frame_count % 5 == 0:
-                results = model.predict(source=frame, verbose=False)
-                annotated_frame = results[0].plot()
-                
-                should_save = (detection_cooldown <= 0)
-                detection_info = process_detection_results(results, camera_id, frame, save_image=should_save)
-                
-                if detection_info.get('detection_id'):
-                    detection_cooldown = 300
-                
-                if detection_cooldown > 0:
-                    detection_cooldown -= 1
-                
-                if camera_id == 2:
-                    temp = 22 + (detection_info['max_fire_confidence'] * 100)
-                    update_camera_status(camera_id, 'online', temperature=temp)
-            else:
-                annotated_frame = frame
-            
-            cv2.imshow("Fire & Smoke Detection", annotated_frame)
-            
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q'):
-                break
-            elif key == ord('s'):
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                save_name = f"camera{camera_id}_manual_{timestamp}.jpg"
-                save_path = os.path.join(SAVE_DIR_IMG, save_name)
-                cv2.imwrite(save_path, annotated_frame)
-                print(f"Saved: {save_name}")
-    
-    finally:
-        update_camera_status(camera_id, 'offline')
-        add_activity(f"{camera['name']} stopped")
-        cap.release()
-        cv2.destroyAllWindows()
 
-def detect_dual_cameras():
+    run_camera_group([dict(camera, source='0')], stop_event=shutdown_event, show=not headless)
+
+def detect_dual_cameras(headless=False):
     """Run detection on a single webcam, simulating a second thermal camera."""
     print(f"\n{'='*60}")
     print("DUAL CAMERA MODE (Visual + Simulated Thermal)")
     print(f"{'='*60}")
-    
-    cap1 = cv2.VideoCapture(0)
-    
-    if not cap1.isOpened():
-        print("Error: Could not open webcam.")
-        return
-    
-    refresh_camera_cache()
-    
-    update_camera_status(1, 'online')
-    update_camera_status(2, 'online')
-    add_activity('Dual camera monitoring started')
-    
-    print("Press 'q' to quit")
+    print("Press Ctrl+C to stop" if headless else "Press 'q' to quit")
     print("Camera feeds are streaming to dashboard at http://localhost:8000")
     print(f"{'='*60}\n")
-    
-    frame_count = 0
-    detection_cooldown_1 = 0
-    detection_cooldown_2 = 0
-    last_frame_save = 0
-    
-    # Create a CLAHE object for contrast enhancement in the thermal view
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    
-    try:
-        while True:
-            ret1, frame1 = cap1.read()
-            if not ret1:
-                print("Webcam feed ended.")
-                break
-            
-            frame_count += 1
- 
-            # Create a more realistic simulated thermal frame based on light intensity
-            # 1. Convert to grayscale.
-            # 2. Enhance contrast to make bright areas (higher intensity) stand out.
-            # 3. Downscale to create a "pixelated" effect.
-            # 4. Upscale back to original size using nearest-neighbor to keep the blocks.
-            # 5. Apply a thermal colormap (JET: blue=cold, red=hot).
-            h, w, _ = frame1.shape
-            thermal_w = 32  # Width of the thermal pixel grid
-            thermal_h = int(h * (thermal_w / w))
-            gray_frame = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY)
-            enhanced_gray = clahe.apply(gray_frame)
-            small_pixelated = cv2.resize(enhanced_gray, (thermal_w, thermal_h), interpolation=cv2.INTER_AREA)
-            pixelated_gray = cv2.resize(small_pixelated, (w, h), interpolation=cv2.INTER_NEAREST)
-            frame2 = cv2.applyColorMap(pixelated_gray, cv2.COLORMAP_HOT)
-
-            update_frame_buffer(1, frame1)
-            update_frame_buffer(2, frame2)
-            handle_pending_clips(1)
-            handle_pending_clips(2)
-            
-            if frame_count % 5 == 0:
-                results1 = model.predict(source=frame1, verbose=False)
-                annotated_frame1 = results1[0].plot()
-                
-                should_save_1 = (detection_cooldown_1 <= 0)
-                detection_info_1 = process_detection_results(results1, 1, frame1, save_image=should_save_1)
-                
-                if detection_info_1.get('detection_id'):
-                    detection_cooldown_1 = 300
-                if detection_cooldown_1 > 0:
-                    detection_cooldown_1 -= 1
-            else:
-                annotated_frame1 = frame1
-            
-            # Process the simulated thermal frame
-            if frame_count % 5 == 0:
-                # We run prediction on the original frame (frame1) for the thermal camera as well,
-                # as the model is trained on RGB images, not colormapped ones.
-                # We just use the thermal frame (frame2) for visualization.
-                results2 = model.predict(source=frame1, verbose=False)
-                annotated_frame2 = results2[0].plot(img=frame2) # Annotate on the thermal image
-                
-                should_save_2 = (detection_cooldown_2 <= 0)
-                detection_info_2 = process_detection_results(results2, 2, frame1, save_image=should_save_2)
-                
-                if detection_info_2.get('detection_id'):
-                    detection_cooldown_2 = 300
-                if detection_cooldown_2 > 0:
-                    detection_cooldown_2 -= 1
-                
-                temp = 22 + (detection_info_2.get('max_fire_confidence', 0) * 100)
-                update_camera_status(2, 'online', temperature=temp)
-            else:
-                annotated_frame2 = frame2
 
-            # Save live frames for the dashboard
-            if frame_count - last_frame_save >= 10:
-                cv2.imwrite(os.path.join(CAMERA_FRAMES_DIR, "camera1_live.jpg"), annotated_frame1)
-                cv2.imwrite(os.path.join(CAMERA_FRAMES_DIR, "camera2_live.jpg"), annotated_frame2)
-                last_frame_save = frame_count
+    cameras = [dict(get_camera_info(1), source='0'), dict(get_camera_info(2), source='thermal:1')]
+    run_camera_group(cameras, stop_event=shutdown_event, show=not headless)
 
-            combined = cv2.hconcat([annotated_frame1, annotated_frame2])
-            cv2.imshow("Dual Camera Detection (Visual | Thermal)", combined)
+def request_shutdown(signum=None, frame=None):
+    """Signal handler: let the running loop finish its frame and shut down cleanly"""
+    if not shutdown_event.is_set():
+        print("\nShutting down...")
+    shutdown_event.set()
 
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-    
-    finally:
-        update_camera_status(1, 'offline')
-        update_camera_status(2, 'offline')
-        add_activity('Dual camera monitoring stopped')
-        cap1.release()
-        cv2.destroyAllWindows()
+def has_display():
+    """True if preview windows can be opened"""
+    if sys.platform.startswith('linux'):
+        return bool(os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+    return True
 
 def main():
+    parser = argparse.ArgumentParser(description="Fire Detection System - Detector")
+    parser.add_argument("--headless", action="store_true", default=None,
+                        help="No preview windows (default when no display is available)")
+    parser.add_argument("--single", type=int, metavar="CAMERA_ID",
+                        help="Run only this camera on the webcam instead of visual + simulated thermal")
+    args = parser.parse_args()
+    headless = args.headless if args.headless is not None else HEADLESS
+    if headless is None:
+        headless = not has_display()
+
+    # Ctrl+C / SIGTERM end the loop like the 'q' key does
+    signal.signal(signal.SIGINT, request_shutdown)
+    signal.signal(signal.SIGTERM, request_shutdown)
+
     add_activity('Fire detection system started')
-    
-    # Directly start the dual camera detection without showing a menu.
-    detect_dual_cameras()
-    
+    start_pipeline()
+
+    try:
+        if args.single is not None:
+            detect_from_webcam(args.single, headless=headless)
+        else:
+            # Directly start the dual camera detection without showing a menu.
+            detect_dual_cameras(headless=headless)
+    finally:
+        stop_pipeline()
+
     add_activity('Fire detection system stopped')
     print("Exiting...")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,215 @@
+"""
+Fire Detection System - Frame Ring Buffer
+Fixed-capacity, preallocated per-camera frame history used for detection clips
+"""
+
+import math
+
+import numpy as np
+import cv2
+
+# Defaults (overridable per camera)
+DEFAULT_MEMORY_BUDGET_MB = 256   # Upper bound on buffered frame data per camera
+DEFAULT_MAX_FRAMES = 300         # Slot count for compressed mode (~10 s at 30 fps)
+DEFAULT_JPEG_QUALITY = 90        # Quality used when storing compressed frames
+DEFAULT_FPS = 30.0               # Highest frame rate the buffer is sized for
+
+
+class FrameRingBuffer:
+    """
+    Rolling frame history for one camera.
+
+    Raw mode preallocates a (capacity, h, w, c) uint8 array once the first
+    frame arrives, and copies every frame into the next slot. Capacity is
+    duration_sec of frames at fps, capped by the memory budget (a warning is
+    printed when the budget cannot hold that window). Compressed mode keeps
+    JPEG packets instead and evicts the oldest packets when the budget is
+    exceeded.
+
+    Timestamps are stored alongside every slot, so a time range maps to at
+    most two contiguous slices of the ring. Raw-mode ranges are returned as
+    views into the ring: they are only valid until the ring wraps over them.
+
+    Each slot can also carry the detections computed for that frame (an
+    (N, 6) array of x1, y1, x2, y2, confidence, class), so clips can be
+    drawn later without running the model again.
+    """
+
+    def __init__(self, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, compressed=False,
+                 max_frames=DEFAULT_MAX_FRAMES, jpeg_quality=DEFAULT_JPEG_QUALITY,
+                 duration_sec=None, fps=DEFAULT_FPS, name=None):
+        self.memory_budget = int(memory_budget_mb * 1024 * 1024)
+        self.compressed = compressed
+        self.max_frames = max_frames
+        self.jpeg_quality = jpeg_quality
+        self.duration_sec = duration_sec   # History the clips need (None = as much as the budget holds)
+        self.fps = fps
+        self.name = name or "frame buffer"
+
+        self.capacity = 0
+        self.frame_shape = None
+        self._frames = None
+        self._packets = None
+        self._packet_bytes = 0
+        self._timestamps = None
+        self._detections = None
+        self._start = 0   # Physical index of the oldest frame
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _window_frames(self):
+        """Slots needed to cover duration_sec at fps, or None when unbounded"""
+        if not self.duration_sec:
+            return None
+        return math.ceil(self.duration_sec * self.fps) + 1
+
+    def _allocate(self, frame):
+        """Size the ring for this frame shape"""
+        self.frame_shape = frame.shape
+        window = self._window_frames()
+        if self.compressed:
+            self.capacity = self.max_frames if window is None else min(self.max_frames, window)
+            self._packets = [None] * self.capacity
+            self._packet_bytes = 0
+            self._frames = None
+        else:
+            by_budget = self.memory_budget // frame.nbytes
+            if window is not None and by_budget < window:
+                print(f"Warning: {self.name} budget of {self.memory_budget / 2**20:.0f} MB holds "
+                      f"{by_budget / self.fps:.1f}s of {frame.shape[1]}x{frame.shape[0]} frames; "
+                      f"clips need {self.duration_sec:.1f}s and will be cut short")
+            self.capacity = max(2, by_budget if window is None else min(by_budget, window))
+            self._frames = np.empty((self.capacity,) + frame.shape, dtype=frame.dtype)
+            self._packets = None
+        self._timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self._detections = [None] * self.capacity
+        self._start = 0
+        self._count = 0
+
+    def append(self, frame, timestamp):
+        """Store a frame, overwriting the oldest one when the ring is full"""
+        if self.frame_shape != frame.shape:
+            # First frame, or the camera changed resolution
+            self._allocate(frame)
+
+        if self._count == self.capacity:
+            self._evict_oldest()
+
+        index = (self._start + self._count) % self.capacity
+        if self.compressed:
+            ok, packet = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if not ok:
+                return
+            self._packets[index] = packet
+            self._packet_bytes += packet.nbytes
+        else:
+            np.copyto(self._frames[index], frame)
+        self._timestamps[index] = timestamp
+        self._detections[index] = None
+        self._count += 1
+
+        if self.compressed:
+            while self._packet_bytes > self.memory_budget and self._count > 1:
+                self._evict_oldest()
+
+    def _evict_oldest(self):
+        if self.compressed:
+            packet = self._packets[self._start]
+            if packet is not None:
+                self._packet_bytes -= packet.nbytes
+            self._packets[self._start] = None
+        self._detections[self._start] = None
+        self._start = (self._start + 1) % self.capacity
+        self._count -= 1
+
+    def memory_usage(self):
+        """Bytes currently held for frame data"""
+        if self.compressed:
+            return self._packet_bytes
+        return 0 if self._frames is None else self._frames.nbytes
+
+    def _segments(self):
+        """Physical (start, end) slices covering the buffer in time order"""
+        if self._count == 0:
+            return []
+        end = self._start + self._count
+        if end <= self.capacity:
+            return [(self._start, end)]
+        return [(self._start, self.capacity), (0, end - self.capacity)]
+
+    def _range_segments(self, start_time, end_time):
+        """Physical slices holding frames with start_time <= t <= end_time"""
+        segments = []
+        for lo, hi in self._segments():
+            ts = self._timestamps[lo:hi]
+            a = int(np.searchsorted(ts, start_time, side='left'))
+            b = int(np.searchsorted(ts, end_time, side='right'))
+            if a < b:
+                segments.append((lo + a, lo + b))
+        return segments
+
+    def get_range(self, start_time=None, end_time=None):
+        """
+        Frames in a time range as a list of (timestamps, frames) chunks in
+        time order. Raw mode chunks are zero-copy views; compressed mode
+        chunks hold the JPEG packets.
+        """
+        if start_time is None:
+            start_time = -np.inf
+        if end_time is None:
+            end_time = np.inf
+        chunks = []
+        for lo, hi in self._range_segments(start_time, end_time):
+            if self.compressed:
+                chunks.append((self._timestamps[lo:hi], self._packets[lo:hi]))
+            else:
+                chunks.append((self._timestamps[lo:hi], self._frames[lo:hi]))
+        return chunks
+
+    def count_range(self, start_time=None, end_time=None):
+        """Number of frames in a time range"""
+        return sum(len(ts) for ts, _ in self.get_range(start_time, end_time))
+
+    def iter_frames(self, start_time=None, end_time=None):
+        """Yield (timestamp, frame) in time order, decoding packets in compressed mode"""
+        for timestamps, frames in self.get_range(start_time, end_time):
+            for t, frame in zip(timestamps, frames):
+                if self.compressed:
+                    frame = cv2.imdecode(frame, cv2.IMREAD_COLOR)
+                yield float(t), frame
+
+    def set_detections(self, timestamp, detections):
+        """Attach detections to the buffered frame captured at timestamp"""
+        for lo, hi in self._range_segments(timestamp, timestamp):
+            self._detections[lo] = detections
+            return True
+        return False
+
+    def get_keyframes(self, start_time=None, end_time=None):
+        """(timestamp, detections) for every frame in range that went through inference"""
+        keyframes = []
+        for lo, hi in self._range_segments(
+                -np.inf if start_time is None else start_time,
+                np.inf if end_time is None else end_time):
+            for index in range(lo, hi):
+                if self._detections[index] is not None:
+                    keyframes.append((float(self._timestamps[index]), self._detections[index]))
+        return keyframes
+
+    def snapshot_range(self, start_time=None, end_time=None):
+        """
+        Copy a time range out of the ring so it survives later appends.
+        Returns (timestamps, frames); frames is one stacked array in raw
+        mode and a list of JPEG packets in compressed mode.
+        """
+        chunks = self.get_range(start_time, end_time)
+        if not chunks:
+            return np.empty(0, dtype=np.float64), []
+        timestamps = np.concatenate([ts for ts, _ in chunks])
+        if self.compressed:
+            frames = [packet for _, packets in chunks for packet in packets]
+        else:
+            frames = np.concatenate([f for _, f in chunks])
+        return timestamps, frames
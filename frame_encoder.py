@@ -0,0 +1,129 @@
+"""
+Fire Detection System - Frame Encoder
+Shared JPEG encoding cache, so a frame shown in the live view, saved as a
+detection snapshot and saved manually is encoded only once, and atomic file
+writes so the dashboard never reads a half-written image
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+
+# Configuration
+JPEG_QUALITY = 90          # Default quality shared by live view, detection images and manual saves
+ENCODE_CACHE_SIZE = 32     # Encoded frames kept (LRU); a few per camera is enough
+
+
+def atomic_write(path, data):
+    """Write bytes to path via a temp file in the same directory and os.replace()"""
+    tmp_path = f"{path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+class FrameEncoder:
+    """
+    JPEG encoder with a per-frame cache.
+
+    Frames are identified by a caller-chosen key, normally (camera_id, seq,
+    variant) where seq is the capture sequence number and variant names the
+    image ('annotated', 'thermal', ...). encode(key, frame, quality) returns
+    the cached bytes for (key, quality) when they exist; otherwise it encodes
+    once, even when several threads ask for the same frame at the same time.
+    A key must always refer to the same image content.
+
+    frame may also be a zero-argument callable returning the image (e.g. a
+    deferred draw_detections); it is only called when the key is not cached.
+    """
+
+    def __init__(self, max_entries=ENCODE_CACHE_SIZE, quality=JPEG_QUALITY):
+        self.max_entries = max_entries
+        self.quality = quality
+
+        self._cache = OrderedDict()   # (key, quality) -> bytes
+        self._in_flight = {}          # (key, quality) -> Event set when encoded
+        self._lock = threading.Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.bytes_encoded = 0
+        self.encode_time = 0.0        # EMA of encode time
+
+    def _encode(self, frame, quality):
+        if callable(frame):
+            frame = frame()
+        start = time.time()
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        elapsed = time.time() - start
+        self.encode_time = elapsed if self.encode_time == 0 else self.encode_time * 0.9 + elapsed * 0.1
+        return buffer.tobytes() if ok else None
+
+    def encode(self, key, frame, quality=None):
+        """JPEG bytes for frame, or None if encoding failed. key=None bypasses the cache."""
+        quality = quality if quality is not None else self.quality
+        if key is None:
+            return self._encode(frame, quality)
+
+        cache_key = (key, quality)
+        while True:
+            with self._lock:
+                data = self._cache.get(cache_key)
+                if data is not None:
+                    self._cache.move_to_end(cache_key)
+                    self.hits += 1
+                    return data
+                waiting = self._in_flight.get(cache_key)
+                if waiting is None:
+                    done = self._in_flight[cache_key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another thread is encoding this frame; wait and look again
+            waiting.wait()
+
+        data = None
+        try:
+            data = self._encode(frame, quality)
+        finally:
+            with self._lock:
+                if data is not None:
+                    self._cache[cache_key] = data
+                    self.bytes_encoded += len(data)
+                    while len(self._cache) > self.max_entries:
+                        self._cache.popitem(last=False)
+                else:
+                    self.failures += 1
+                del self._in_flight[cache_key]
+            done.set()
+        return data
+
+    def write(self, path, key, frame, quality=None):
+        """Atomically write the frame's JPEG to path. Returns path, or None if encoding failed."""
+        data = self.encode(key, frame, quality)
+        if data is None:
+            return None
+        return atomic_write(path, data)
+
+    def get_stats(self):
+        """Cache counters for monitoring"""
+        with self._lock:
+            entries = len(self._cache)
+        return {
+            'entries': entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'failures': self.failures,
+            'bytes_encoded': self.bytes_encoded,
+            'encode_time': self.encode_time
+        }
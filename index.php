@@ -254,7 +254,7 @@ include 'assets/functions.php';
                 <div class="camera-feed">
                     <img id="camera1Feed" src="camera_frames/camera1_live.jpg" 
                          style="width: 100%; height: 100%; object-fit: cover;" 
-                         onerror="this.style.display='none'; this.nextElementSibling.style.display='flex';">
+                         onerror="onCameraFeedError(this)">
                     <div style="display: none; width: 100%; height: 100%; align-items: center; justify-content: center; color: #666;">
                         No camera feed
                     </div>
@@ -270,7 +270,7 @@ include 'assets/functions.php';
                 <div class="camera-feed">
                     <img id="camera2Feed" src="camera_frames/camera2_live.jpg" 
                          style="width: 100%; height: 100%; object-fit: cover;" 
-                         onerror="this.style.display='none'; this.nextElementSibling.style.display='flex';">
+                         onerror="onCameraFeedError(this)">
                     <div style="display: none; width: 100%; height: 100%; align-items: center; justify-content: center; color: #666;">
                         No camera feed
                     </div>
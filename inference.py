@@ -0,0 +1,281 @@
+"""
+Fire Detection System - Inference Scheduler
+Collects frames from every camera pipeline and runs them through the model
+in shared, de-duplicated batches, and decides how often each camera is
+inferred
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+
+# Configuration
+MAX_BATCH_SIZE = 8        # Max unique frames per backend.predict call
+BATCH_WAIT_SEC = 0.005    # How long to wait for more cameras to join a batch
+
+# Adaptive inference rate
+CPU_BUDGET = 1.0               # CPU cores the model may keep busy across all cameras
+CANDIDATE_INTERVAL_SEC = 0.2   # Inference interval while confirming a fire/smoke candidate
+QUIET_INTERVAL_SEC = 1.0       # Inference interval for a quiet scene (target detection latency)
+MAX_INTERVAL_SEC = 3.0         # Never sample a camera less often than this
+CANDIDATE_HOLD_SEC = 10.0      # How long a candidate keeps a camera in dense sampling
+
+
+class InferenceScheduler:
+    """
+    Central inference queue shared by all camera pipelines.
+
+    Pipelines call submit()/submit_many() from their own threads and get a
+    Future per camera. A single worker thread drains the queue, groups the
+    pending requests into one batch, runs the backend once over the unique
+    source frames and hands each camera the Detections for its frame.
+    """
+
+    def __init__(self, backend, max_batch_size=MAX_BATCH_SIZE, batch_wait=BATCH_WAIT_SEC):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.batch_wait = batch_wait
+
+        self._pending = []
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        # Counters
+        self.requests = 0
+        self.unique_frames = 0
+        self.batches = 0
+        self.last_batch_time = 0.0
+        self.image_latency = 0.0   # EMA of batch time per unique frame
+
+    def start(self):
+        """Start the worker thread"""
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="inference-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the worker thread, failing any requests still queued"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for _, _, future in self._pending:
+            if future.set_running_or_notify_cancel():
+                self._complete(future, error=RuntimeError("Inference scheduler stopped"))
+        self._pending = []
+
+    def submit(self, camera_id, frame):
+        """Queue a frame for a camera. Returns a Future resolving to its Detections."""
+        return self.submit_many([(camera_id, frame)])[0]
+
+    def submit_many(self, requests):
+        """
+        Queue several (camera_id, frame) requests atomically so they always
+        land in the same batch. Requests that pass the very same frame object
+        are only inferred once.
+        """
+        futures = []
+        with self._cond:
+            if not self._running:
+                raise RuntimeError("Inference scheduler is not running")
+            for camera_id, frame in requests:
+                future = Future()
+                self._pending.append((camera_id, frame, future))
+                futures.append(future)
+            self.requests += len(requests)
+            self._cond.notify()
+        return futures
+
+    def queue_depth(self):
+        """Number of requests waiting for the next batch"""
+        with self._cond:
+            return len(self._pending)
+
+    def get_stats(self):
+        """Scheduler counters for monitoring"""
+        return {
+            'requests': self.requests,
+            'unique_frames': self.unique_frames,
+            'batches': self.batches,
+            'queue_depth': self.queue_depth(),
+            'last_batch_time': self.last_batch_time,
+            'image_latency': self.image_latency
+        }
+
+    def _next_batch(self):
+        """Block until requests are queued, then take up to max_batch_size unique frames"""
+        with self._cond:
+            while self._running and not self._pending:
+                self._cond.wait()
+            if not self._running:
+                return None
+
+        # Give other cameras a moment to join this batch
+        if self.batch_wait > 0:
+            time.sleep(self.batch_wait)
+
+        with self._cond:
+            batch = []
+            seen = set()
+            remaining = []
+            for request in self._pending:
+                key = id(request[1])
+                if key not in seen and len(seen) >= self.max_batch_size:
+                    remaining.append(request)
+                    continue
+                seen.add(key)
+                batch.append(request)
+            self._pending = remaining
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._run_batch(batch)
+
+    @staticmethod
+    def _complete(future, result=None, error=None):
+        """Resolve a future; one whose caller gave up must not stop the worker"""
+        try:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+        except Exception:
+            pass
+
+    def _run_batch(self, batch):
+        # Requests whose futures were cancelled are dropped here and never
+        # inferred; the rest can no longer be cancelled
+        batch = [request for request in batch if request[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        # Every frame in the batch is still referenced by its request, so
+        # id() is a safe identity key for de-duplication here.
+        sources = []
+        index_of = {}
+        for _, frame, _ in batch:
+            key = id(frame)
+            if key not in index_of:
+                index_of[key] = len(sources)
+                sources.append(frame)
+
+        start = time.time()
+        try:
+            detections = self.backend.predict(sources)
+        except Exception as e:
+            for _, _, future in batch:
+                self._complete(future, error=e)
+            return
+        self.last_batch_time = time.time() - start
+
+        self.batches += 1
+        self.unique_frames += len(sources)
+        per_image = self.last_batch_time / len(sources)
+        self.image_latency = per_image if self.image_latency == 0 else self.image_latency * 0.8 + per_image * 0.2
+
+        for _, frame, future in batch:
+            self._complete(future, detections[index_of[id(frame)]])
+
+
+class AdaptiveRateController:
+    """
+    Picks when each camera should run inference.
+
+    Every camera has a target interval: candidate_interval while a fire/smoke
+    candidate was seen in the last candidate_hold_sec, quiet_interval
+    otherwise. The measured per-frame predict latency is used to keep the
+    total inference load (latency x rate over all cameras) within cpu_budget
+    cores; when it would not fit, every camera's rate is scaled down, but no
+    camera is ever sampled less often than max_interval.
+    """
+
+    def __init__(self, cpu_budget=CPU_BUDGET, candidate_interval=CANDIDATE_INTERVAL_SEC,
+                 quiet_interval=QUIET_INTERVAL_SEC, max_interval=MAX_INTERVAL_SEC,
+                 candidate_hold_sec=CANDIDATE_HOLD_SEC):
+        self.cpu_budget = cpu_budget
+        self.candidate_interval = candidate_interval
+        self.quiet_interval = quiet_interval
+        self.max_interval = max_interval
+        self.candidate_hold_sec = candidate_hold_sec
+
+        self.latency = 0.0          # EMA of per-frame predict latency
+        self._last_decision = {}    # camera_id -> time of the last inference decision
+        self._candidate_until = {}  # camera_id -> time the candidate state expires
+        self._intervals = {}
+
+    def is_candidate(self, camera_id, now=None):
+        now = now if now is not None else time.time()
+        return self._candidate_until.get(camera_id, 0.0) > now
+
+    def _update_intervals(self, now):
+        cameras = list(self._last_decision)
+        targets = {
+            camera_id: self.candidate_interval if self.is_candidate(camera_id, now) else self.quiet_interval
+            for camera_id in cameras
+        }
+        load = self.latency * sum(1.0 / interval for interval in targets.values())
+        scale = max(1.0, load / self.cpu_budget) if self.cpu_budget > 0 else 1.0
+        self._intervals = {
+            camera_id: min(interval * scale, max(self.max_interval, interval))
+            for camera_id, interval in targets.items()
+        }
+
+    def interval(self, camera_id):
+        """Current inference interval for a camera in seconds"""
+        return self._intervals.get(camera_id, self.quiet_interval)
+
+    def should_infer(self, camera_id, now=None):
+        """
+        True if the camera is due for inference. A True answer starts the
+        next interval, whether or not the frame is then actually inferred.
+        """
+        now = now if now is not None else time.time()
+        if camera_id not in self._last_decision:
+            self._last_decision[camera_id] = float('-inf')
+            self._update_intervals(now)
+        if now - self._last_decision[camera_id] < self.interval(camera_id):
+            return False
+        self._last_decision[camera_id] = now
+        return True
+
+    def record_latency(self, latency):
+        """Feed back the measured predict latency for one frame"""
+        self.latency = latency if self.latency == 0 else self.latency * 0.8 + latency * 0.2
+        self._update_intervals(time.time())
+
+    def record_result(self, camera_id, candidate, now=None):
+        """Feed back whether the last inference saw a fire/smoke candidate"""
+        now = now if now is not None else time.time()
+        if candidate:
+            was_candidate = self.is_candidate(camera_id, now)
+            self._candidate_until[camera_id] = now + self.candidate_hold_sec
+            if not was_candidate:
+                self._update_intervals(now)
+        elif camera_id in self._candidate_until and not self.is_candidate(camera_id, now):
+            del self._candidate_until[camera_id]
+            self._update_intervals(now)
+
+    def get_stats(self):
+        """Per-camera intervals and state for monitoring"""
+        now = time.time()
+        return {
+            'latency': self.latency,
+            'cpu_budget': self.cpu_budget,
+            'cameras': {
+                camera_id: {
+                    'interval': self.interval(camera_id),
+                    'candidate': self.is_candidate(camera_id, now)
+                }
+                for camera_id in self._last_decision
+            }
+        }
@@ -0,0 +1,270 @@
+"""
+Fire Detection System - Live View
+Serves each camera's latest frame from memory as a multipart MJPEG stream,
+encoding every frame at most once no matter how many viewers are watching
+
+Stream: http://<host>:8002/camera/<id>.mjpg   Single frame: /camera/<id>.jpg
+Latency metrics (when given a LatencyMetrics): /metrics (Prometheus), /metrics.json
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from frame_encoder import FrameEncoder, atomic_write
+
+# Configuration
+LIVE_VIEW_PORT = 8002            # Dashboard <img> tags point at this port on the same host
+LIVE_VIEW_MAX_FPS = 15.0         # Per-viewer frame rate cap; newer frames replace older ones
+SNAPSHOT_INTERVAL_SEC = 5.0      # Refresh camera{id}_live.jpg this often as a fallback (None = never)
+WAIT_TIMEOUT_SEC = 5.0           # Viewer wait before re-sending the last frame as a keepalive
+
+BOUNDARY = b"frame"
+
+
+class _Channel:
+    """Latest frame of one camera and its encoded form"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.frame = None
+        self.key = None
+        self.timestamp = 0.0
+        self.viewers = 0
+
+
+class LiveViewPublisher:
+    """
+    In-process live view for the dashboard.
+
+    The detector loop calls publish() with each displayed frame; that only
+    swaps a reference. The frame may be a callable that renders it (see
+    FrameEncoder), so an annotated frame nobody watches is never drawn. A frame is JPEG-encoded through the shared
+    FrameEncoder the first time any viewer (or the fallback snapshot writer)
+    asks for it, and the bytes are shared by every viewer and by any other
+    consumer that encodes the same frame key. Each viewer always gets the newest frame, so a slow client
+    simply skips frames instead of building a backlog.
+
+    Published frames must not be modified afterwards.
+    """
+
+    def __init__(self, encoder=None, jpeg_quality=None, max_fps=LIVE_VIEW_MAX_FPS,
+                 snapshot_dir=None, snapshot_interval=SNAPSHOT_INTERVAL_SEC, metrics=None):
+        self.encoder = encoder if encoder is not None else FrameEncoder()
+        self.metrics = metrics             # metrics.LatencyMetrics served at /metrics
+        self.jpeg_quality = jpeg_quality   # None = the encoder's default quality
+        self.max_fps = max_fps
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_interval = snapshot_interval
+
+        self._channels = {}
+        self._lock = threading.Lock()
+        self._running = False
+        self._stopped = threading.Event()
+        self._server = None
+        self._server_thread = None
+        self._snapshot_thread = None
+
+        # Counters
+        self.frames_published = 0
+        self.frames_sent = 0
+        self.frames_skipped = 0
+
+    def _channel(self, camera_id):
+        with self._lock:
+            channel = self._channels.get(camera_id)
+            if channel is None:
+                channel = self._channels[camera_id] = _Channel()
+            return channel
+
+    def publish(self, camera_id, frame, timestamp=None, key=None):
+        """
+        Make frame the camera's current live frame. key is its FrameEncoder
+        key, so other consumers of the same frame reuse the encoding.
+        """
+        channel = self._channel(camera_id)
+        with channel.cond:
+            channel.seq += 1
+            channel.frame = frame
+            channel.key = key if key is not None else ('live', camera_id, channel.seq)
+            channel.timestamp = timestamp if timestamp is not None else time.time()
+            channel.cond.notify_all()
+        self.frames_published += 1
+
+    def latest(self, camera_id):
+        """(seq, jpeg_bytes) of the camera's newest frame, or None before the first publish"""
+        channel = self._channel(camera_id)
+        with channel.cond:
+            seq, frame, key = channel.seq, channel.frame, channel.key
+        if frame is None:
+            return None
+        data = self.encoder.encode(key, frame, self.jpeg_quality)
+        if data is None:
+            return None
+        return seq, data
+
+    def wait_for_frame(self, camera_id, after_seq, timeout=WAIT_TIMEOUT_SEC):
+        """Block until the camera has a frame newer than after_seq, then return latest()"""
+        channel = self._channel(camera_id)
+        with channel.cond:
+            channel.cond.wait_for(lambda: channel.seq > after_seq or not self._running, timeout)
+        return self.latest(camera_id)
+
+    def start(self, host='0.0.0.0', port=LIVE_VIEW_PORT):
+        """Start the HTTP server (and snapshot writer) in background threads"""
+        if self._running:
+            return self
+        self._running = True
+        self._stopped.clear()
+        handler = type('LiveViewHandler', (LiveViewRequestHandler,), {'publisher': self})
+        try:
+            self._server = ThreadingHTTPServer((host, port), handler)
+        except OSError as e:
+            print(f"[LIVE] Could not start live view on port {port}: {e}")
+            self._server = None
+        else:
+            self._server.daemon_threads = True
+            self._server_thread = threading.Thread(target=self._server.serve_forever,
+                                                   name="live-view", daemon=True)
+            self._server_thread.start()
+            print(f"[LIVE] Live view at http://{host}:{port}/camera/<id>.mjpg")
+        if self.snapshot_dir and self.snapshot_interval:
+            self._snapshot_thread = threading.Thread(target=self._snapshot_loop,
+                                                     name="live-snapshots", daemon=True)
+            self._snapshot_thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and release viewers"""
+        self._running = False
+        self._stopped.set()
+        with self._lock:
+            channels = list(self._channels.values())
+        for channel in channels:
+            with channel.cond:
+                channel.cond.notify_all()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._snapshot_thread is not None:
+            self._snapshot_thread.join()
+            self._snapshot_thread = None
+
+    def get_stats(self):
+        """Live view counters for monitoring"""
+        with self._lock:
+            viewers = {camera_id: channel.viewers for camera_id, channel in self._channels.items()}
+        return {
+            'viewers': viewers,
+            'frames_published': self.frames_published,
+            'frames_sent': self.frames_sent,
+            'frames_skipped': self.frames_skipped
+        }
+
+    def _snapshot_loop(self):
+        written = {}
+        while not self._stopped.wait(self.snapshot_interval):
+            with self._lock:
+                camera_ids = list(self._channels)
+            for camera_id in camera_ids:
+                latest = self.latest(camera_id)
+                if latest is None or written.get(camera_id) == latest[0]:
+                    continue
+                # Atomic, so the PHP side never serves a half-written file
+                atomic_write(os.path.join(self.snapshot_dir, f"camera{camera_id}_live.jpg"), latest[1])
+                written[camera_id] = latest[0]
+
+    def _add_viewer(self, camera_id, delta):
+        channel = self._channel(camera_id)
+        with self._lock:
+            channel.viewers += delta
+
+
+class LiveViewRequestHandler(BaseHTTPRequestHandler):
+    """GET /camera/<id>.mjpg streams, /camera/<id>.jpg returns the current frame, /metrics the latencies"""
+
+    publisher = None
+    PATH_RE = re.compile(r'^/camera/(\d+)\.(mjpg|jpg)$')
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path in ('/metrics', '/metrics.json') and self.publisher.metrics is not None:
+            self._send_metrics(path.endswith('.json'))
+            return
+        match = self.PATH_RE.match(path)
+        if not match:
+            self.send_error(404)
+            return
+        camera_id, kind = int(match.group(1)), match.group(2)
+        if kind == 'jpg':
+            self._send_frame(camera_id)
+        else:
+            self._stream(camera_id)
+
+    def _send_frame(self, camera_id):
+        latest = self.publisher.latest(camera_id)
+        if latest is None:
+            self.send_error(404, "No frame yet")
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(latest[1])))
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(latest[1])
+
+    def _send_metrics(self, as_json):
+        metrics = self.publisher.metrics
+        if as_json:
+            body = json.dumps(metrics.get_stats()).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            body = metrics.render_prometheus().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, camera_id):
+        publisher = self.publisher
+        min_interval = 1.0 / publisher.max_fps if publisher.max_fps else 0.0
+        self.send_response(200)
+        self.send_header('Content-Type', f"multipart/x-mixed-replace; boundary={BOUNDARY.decode()}")
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        publisher._add_viewer(camera_id, 1)
+        last_seq = 0
+        try:
+            while publisher._running:
+                sent_at = time.time()
+                latest = publisher.wait_for_frame(camera_id, last_seq)
+                if latest is None:
+                    continue
+                seq, jpeg = latest
+                if last_seq and seq > last_seq + 1:
+                    publisher.frames_skipped += seq - last_seq - 1
+                last_seq = seq
+                self.wfile.write(b"--" + BOUNDARY + b"\r\nContent-Type: image/jpeg\r\n"
+                                 + f"Content-Length: {len(jpeg)}\r\n\r\n".encode() + jpeg + b"\r\n")
+                self.wfile.flush()
+                publisher.frames_sent += 1
+                # Cap this viewer's rate; frames published meanwhile are skipped
+                delay = min_interval - (time.time() - sent_at)
+                if delay > 0:
+                    time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            publisher._add_viewer(camera_id, -1)
+
+    def log_message(self, format, *args):
+        pass
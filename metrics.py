@@ -0,0 +1,159 @@
+"""
+Fire Detection System - Latency Metrics
+Per-camera histograms of how long each pipeline stage takes, from frame
+capture to the alert row and its delivery, exported as Prometheus text or
+JSON
+
+Endpoint: http://<host>:8002/metrics (Prometheus) and /metrics.json, served by the live view
+"""
+
+import bisect
+import json
+import os
+import threading
+
+from frame_encoder import atomic_write
+
+# Configuration
+# Histogram bucket upper bounds in seconds (Prometheus 'le'); +Inf is implicit
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRIC_NAME = "fire_detection_stage_seconds"
+
+# Stages, in pipeline order. The first six are the durations of one step;
+# capture_to_* are end to end from the capture of the frame that confirmed the
+# incident, first_seen_to_* from the capture of the first frame it was seen in
+# (so they include the K-of-N confirmation delay).
+STAGES = (
+    'queue',                     # Capture -> inference start (read, buffering, motion gate)
+    'inference',                 # Inference start -> Detections back (scheduler queue + predict)
+    'tracking',                  # process_detection_results: incident tracker update
+    'image_write',               # Detection image drawn, encoded and written
+    'log_detection',             # log_detection() committed
+    'create_alert',              # create_alert() (alert + outbox row) committed
+    'capture_to_detection',      # Capture -> detection row committed
+    'capture_to_alert',          # Capture -> alert row committed
+    'first_seen_to_detection',   # First seen on camera -> detection row committed
+    'first_seen_to_alert',       # First seen on camera -> alert row committed
+    'first_seen_to_delivery',    # First seen on camera -> alert delivered by a channel (dispatch.py)
+)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram (Prometheus semantics)"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)   # Last slot: above every bound
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def copy(self):
+        histogram = Histogram(self.buckets)
+        histogram.counts = list(self.counts)
+        histogram.count, histogram.sum, histogram.max = self.count, self.sum, self.max
+        return histogram
+
+    def quantile(self, q):
+        """Estimate like PromQL histogram_quantile(): linear within the bucket"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.buckets):
+                    return self.max
+                upper = self.buckets[index]
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+            if index < len(self.buckets):
+                lower = self.buckets[index]
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'avg': self.sum / self.count if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'max': self.max
+        }
+
+
+class LatencyMetrics:
+    """
+    Per-camera, per-stage latency histograms.
+
+    The pipeline calls observe() (or since(), which also returns the current
+    time for chaining the next stage) with plain time.time() readings, so
+    recording costs a bisect and a few additions under one lock. Thread-safe.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._histograms = {}   # (camera_id, stage) -> Histogram
+        self._lock = threading.Lock()
+
+    def observe(self, camera_id, stage, seconds):
+        """Record one duration for a camera's stage"""
+        with self._lock:
+            histogram = self._histograms.get((camera_id, stage))
+            if histogram is None:
+                histogram = self._histograms[(camera_id, stage)] = Histogram(self.buckets)
+            histogram.observe(max(0.0, seconds))
+
+    def since(self, camera_id, stage, start, now):
+        """Record now - start; returns now"""
+        self.observe(camera_id, stage, now - start)
+        return now
+
+    def _sorted_histograms(self):
+        order = {stage: index for index, stage in enumerate(STAGES)}
+        with self._lock:
+            items = [(key, histogram.copy()) for key, histogram in self._histograms.items()]
+        return sorted(items, key=lambda item: (str(item[0][0]), order.get(item[0][1], len(order)), item[0][1]))
+
+    def get_stats(self):
+        """{camera_id: {stage: {count, avg, p50, p95, p99, max}}}"""
+        stats = {}
+        for (camera_id, stage), histogram in self._sorted_histograms():
+            stats.setdefault(camera_id, {})[stage] = histogram.summary()
+        return stats
+
+    def render_prometheus(self):
+        """All histograms in the Prometheus text exposition format"""
+        lines = [f"# HELP {METRIC_NAME} Seconds spent in each detection pipeline stage, per camera",
+                 f"# TYPE {METRIC_NAME} histogram"]
+        for (camera_id, stage), histogram in self._sorted_histograms():
+            labels = f'camera="{camera_id}",stage="{stage}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), histogram.counts):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"{METRIC_NAME}_sum{{{labels}}} {histogram.sum!r}")
+            lines.append(f"{METRIC_NAME}_count{{{labels}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, directory):
+        """Write camera{id}_latency.json (stage summaries) per camera. Returns the paths."""
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for camera_id, stages in self.get_stats().items():
+            path = os.path.join(directory, f"camera{camera_id}_latency.json")
+            atomic_write(path, json.dumps({'camera_id': camera_id, 'stages': stages}, indent=2).encode('utf-8'))
+            paths.append(path)
+        return paths
+
+
+# Shared by every stage in the process (the detector loop, the alert dispatcher)
+latency_metrics = LatencyMetrics()
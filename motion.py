@@ -0,0 +1,118 @@
+"""
+Fire Detection System - Motion Gate
+Cheap change detection on a downscaled frame, run before YOLO so static
+scenes skip inference
+"""
+
+import time
+
+import numpy as np
+import cv2
+
+# Defaults (overridable per camera)
+GATE_WIDTH = 96               # Width of the downscaled frame used for change detection
+PIXEL_THRESHOLD = 18          # Grey-level delta for a pixel to count as changed
+SENSITIVITY = 0.005           # Fraction of changed pixels that counts as scene change
+BACKGROUND_RATE = 0.05        # Background model learning rate
+HISTOGRAM_THRESHOLD = 0.08    # Bhattacharyya distance that counts as a colour change
+HEARTBEAT_SEC = 10.0          # Always let a frame through at least this often
+
+
+class MotionGate:
+    """
+    Decides whether a frame is worth sending to the model.
+
+    Each checked frame is converted to a small blurred greyscale image and
+    compared against a running-average background ('diff' method), or its
+    hue/saturation histogram is compared with the last frame that passed
+    ('histogram' method). A frame passes when the change exceeds the
+    configured sensitivity, or when no frame has passed for heartbeat_sec.
+    """
+
+    def __init__(self, method='diff', width=GATE_WIDTH, pixel_threshold=PIXEL_THRESHOLD,
+                 sensitivity=SENSITIVITY, background_rate=BACKGROUND_RATE,
+                 histogram_threshold=HISTOGRAM_THRESHOLD, heartbeat_sec=HEARTBEAT_SEC):
+        if method not in ('diff', 'histogram'):
+            raise ValueError(f"Unknown motion gate method: {method}")
+        self.method = method
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.sensitivity = sensitivity
+        self.background_rate = background_rate
+        self.histogram_threshold = histogram_threshold
+        self.heartbeat_sec = heartbeat_sec
+
+        self._background = None
+        self._reference_hist = None
+        self._current_hist = None
+        self._last_pass = 0.0
+
+        # Counters
+        self.checked = 0
+        self.passed = 0
+        self.skipped = 0
+        self.heartbeats = 0
+        self.last_change = 0.0
+
+    def _small(self, frame):
+        h, w = frame.shape[:2]
+        height = max(1, int(h * self.width / w))
+        return cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+
+    def _diff_change(self, small):
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+        if self._background is None or self._background.shape != gray.shape:
+            self._background = gray.astype(np.float32)
+            return 1.0
+        delta = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        cv2.accumulateWeighted(gray, self._background, self.background_rate)
+        return np.count_nonzero(delta > self.pixel_threshold) / delta.size
+
+    def _histogram_change(self, small):
+        hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv], [0, 1], None, [30, 32], [0, 180, 0, 256])
+        cv2.normalize(hist, hist, 1.0, 0.0, cv2.NORM_L1)
+        self._current_hist = hist
+        if self._reference_hist is None:
+            return 1.0
+        return cv2.compareHist(self._reference_hist, hist, cv2.HISTCMP_BHATTACHARYYA)
+
+    def check(self, frame, now=None):
+        """Return True if the frame should go to the model"""
+        now = now if now is not None else time.time()
+        self.checked += 1
+
+        small = self._small(frame)
+        if self.method == 'diff':
+            change = self._diff_change(small)
+            changed = change >= self.sensitivity
+        else:
+            change = self._histogram_change(small)
+            changed = change >= self.histogram_threshold
+        self.last_change = float(change)
+
+        heartbeat = now - self._last_pass >= self.heartbeat_sec
+        if changed or heartbeat:
+            if not changed:
+                self.heartbeats += 1
+            if self.method == 'histogram':
+                # Later frames are compared with the last one the model saw
+                self._reference_hist = self._current_hist
+            self._last_pass = now
+            self.passed += 1
+            return True
+
+        self.skipped += 1
+        return False
+
+    def get_stats(self):
+        """Gate counters for monitoring"""
+        return {
+            'method': self.method,
+            'checked': self.checked,
+            'passed': self.passed,
+            'skipped': self.skipped,
+            'heartbeats': self.heartbeats,
+            'last_change': self.last_change
+        }
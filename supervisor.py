@@ -0,0 +1,263 @@
+"""
+Fire Detection System - Supervisor
+Runs the detector headless as one worker process per group of cameras from
+the cameras table, pins each worker to its own CPU cores and restarts
+workers that crash. Every worker loads the model once and shares it between
+its cameras.
+
+Usage: python supervisor.py [--cameras-per-worker 4] [--cameras 1 2 3] [--no-affinity]
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import time
+
+from database import init_database, get_cameras, get_camera_heartbeats, add_activity
+
+# Configuration
+CAMERAS_PER_WORKER = 4            # Captured cameras per worker (their frames share inference batches);
+                                  # simulated thermal cameras follow their source
+RESTART_BACKOFF_SEC = 2.0         # First delay before restarting a worker that exited
+MAX_RESTART_BACKOFF_SEC = 60.0    # Longest restart delay (doubles after each quick failure)
+HEALTHY_RUN_SEC = 60.0            # A worker that ran this long restarts with the initial delay again
+WORKER_STOP_TIMEOUT_SEC = 10.0    # Time a worker gets to shut down cleanly before it is terminated
+POLL_INTERVAL_SEC = 1.0           # How often worker processes are checked
+STATS_INTERVAL_SEC = 30.0         # How often aggregate frame rates are printed
+LIVE_VIEW_BASE_PORT = 8002        # Worker N serves its live view on LIVE_VIEW_BASE_PORT + N
+
+# Thread pools inside a worker (OpenMP/BLAS, PyTorch, OpenCV) are sized to its cores
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+def group_cameras(cameras, per_worker=CAMERAS_PER_WORKER):
+    """
+    Split camera rows into worker groups of per_worker captured cameras.
+    A 'thermal:<id>' camera joins the group capturing camera <id>, since it is
+    simulated from that camera's frames. Cameras without a source are left out.
+    """
+    captured = [camera for camera in cameras
+                if camera.get('source') and not str(camera['source']).startswith('thermal:')]
+    groups = [captured[i:i + per_worker] for i in range(0, len(captured), per_worker)]
+    group_of = {camera['id']: group for group in groups for camera in group}
+    for camera in cameras:
+        source = str(camera.get('source') or '')
+        if source.startswith('thermal:'):
+            group = group_of.get(int(source.split(':', 1)[1]))
+            if group is not None:
+                group.append(camera)
+    return groups
+
+
+def assign_cores(worker_count, cores=None):
+    """
+    Split the available CPU cores between workers: each gets an equal,
+    disjoint share, or one core round-robin when there are more workers than cores.
+    Returns a list of core lists, or None entries where affinity is unsupported.
+    """
+    if cores is None:
+        if not hasattr(os, "sched_getaffinity"):
+            return [None] * worker_count
+        cores = sorted(os.sched_getaffinity(0))
+    if worker_count > len(cores):
+        return [[cores[i % len(cores)]] for i in range(worker_count)]
+    share = len(cores) // worker_count
+    return [cores[i * share:(i + 1) * share] for i in range(worker_count)]
+
+
+def _worker_main(camera_ids, cores, live_view_port, stop_event):
+    """Worker process entry point: run one camera group until stop_event is set"""
+    # The supervisor handles Ctrl+C and tells workers to stop through stop_event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+        for name in THREAD_ENV_VARS:
+            os.environ.setdefault(name, str(len(cores)))
+
+    # Imported here so thread settings apply before the model libraries load
+    import cv2
+    import fire_detection
+
+    if cores:
+        cv2.setNumThreads(len(cores))
+    cameras = [camera for camera in get_cameras() if camera['id'] in camera_ids]
+    fire_detection.start_pipeline(live_view_port=live_view_port)
+    try:
+        fire_detection.run_camera_group(cameras, stop_event=stop_event)
+    finally:
+        fire_detection.stop_pipeline()
+
+
+class _Worker:
+    """Bookkeeping for one supervised worker process"""
+
+    def __init__(self, index, cameras, cores):
+        self.index = index
+        self.camera_ids = [camera['id'] for camera in cameras]
+        self.names = [camera['name'] for camera in cameras]
+        self.cores = cores
+        self.process = None
+        self.started_at = 0.0
+        self.restart_at = 0.0
+        self.backoff = RESTART_BACKOFF_SEC
+        self.restarts = 0
+
+
+class Supervisor:
+    """
+    Starts one worker process per camera group and keeps it running.
+
+    Workers are spawned (not forked), so each starts from a clean interpreter
+    and loads its own model instance. A worker that exits while the
+    supervisor is running is restarted after a delay that doubles while it
+    keeps failing quickly.
+    """
+
+    def __init__(self, groups, affinity=True, live_view_base_port=LIVE_VIEW_BASE_PORT):
+        self._context = multiprocessing.get_context("spawn")
+        self._stop_event = self._context.Event()
+        cores = assign_cores(len(groups)) if affinity else [None] * len(groups)
+        self.workers = [_Worker(index, group, cores[index]) for index, group in enumerate(groups)]
+        self.live_view_base_port = live_view_base_port
+        self._running = False
+
+        # Frame rate tracking from the camera heartbeats the workers report
+        self._last_frames = None
+        self._last_frames_at = 0.0
+
+    def _spawn(self, worker):
+        worker.process = self._context.Process(
+            target=_worker_main,
+            args=(worker.camera_ids, worker.cores, self.live_view_base_port + worker.index, self._stop_event),
+            name=f"fire-detection-worker-{worker.index}",
+            daemon=False
+        )
+        worker.process.start()
+        worker.started_at = time.time()
+        cores = ",".join(str(core) for core in worker.cores) if worker.cores else "any"
+        print(f"[SUPERVISOR] Worker {worker.index} (pid {worker.process.pid}, cores {cores}, "
+              f"live view :{self.live_view_base_port + worker.index}): {', '.join(worker.names)}")
+
+    def start(self):
+        """Spawn every worker"""
+        self._running = True
+        for worker in self.workers:
+            self._spawn(worker)
+        add_activity(f"Supervisor started {len(self.workers)} camera workers")
+        return self
+
+    def stop(self):
+        """Ask every worker to stop, then terminate any that do not exit in time"""
+        self._running = False
+        self._stop_event.set()
+        deadline = time.time() + WORKER_STOP_TIMEOUT_SEC
+        for worker in self.workers:
+            if worker.process is None:
+                continue
+            worker.process.join(max(0.0, deadline - time.time()))
+            if worker.process.is_alive():
+                print(f"[SUPERVISOR] Worker {worker.index} did not stop, terminating")
+                worker.process.terminate()
+                worker.process.join()
+        add_activity("Supervisor stopped")
+
+    def check(self, now=None):
+        """Restart workers that have exited once their backoff has passed"""
+        now = now if now is not None else time.time()
+        for worker in self.workers:
+            process = worker.process
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                # Just exited: schedule the restart
+                ran_for = now - worker.started_at
+                worker.backoff = (RESTART_BACKOFF_SEC if ran_for >= HEALTHY_RUN_SEC
+                                  else min(worker.backoff * 2, MAX_RESTART_BACKOFF_SEC))
+                worker.restart_at = now + worker.backoff
+                worker.process = None
+                print(f"[SUPERVISOR] Worker {worker.index} exited with code {process.exitcode} "
+                      f"after {ran_for:.0f}s, restarting in {worker.backoff:.0f}s")
+                add_activity(f"Camera worker for {', '.join(worker.names)} exited, restarting")
+            elif now >= worker.restart_at:
+                worker.restarts += 1
+                self._spawn(worker)
+
+    def get_stats(self):
+        """Worker state and aggregate frame rate from the camera heartbeats"""
+        now = time.time()
+        heartbeats = get_camera_heartbeats()
+        frames = {camera_id: row['frames'] for camera_id, row in heartbeats.items()}
+        fps = {}
+        if self._last_frames is not None and now > self._last_frames_at:
+            elapsed = now - self._last_frames_at
+            fps = {camera_id: (count - self._last_frames.get(camera_id, count)) / elapsed
+                   for camera_id, count in frames.items()}
+        self._last_frames, self._last_frames_at = frames, now
+        return {
+            'workers': [{
+                'index': worker.index,
+                'pid': worker.process.pid if worker.process is not None else None,
+                'alive': worker.process is not None and worker.process.is_alive(),
+                'cameras': worker.camera_ids,
+                'cores': worker.cores,
+                'restarts': worker.restarts
+            } for worker in self.workers],
+            'fps': fps,
+            'total_fps': sum(fps.values())
+        }
+
+    def print_stats(self):
+        stats = self.get_stats()
+        alive = sum(1 for worker in stats['workers'] if worker['alive'])
+        restarts = sum(worker['restarts'] for worker in stats['workers'])
+        per_camera = " ".join(f"{camera_id}={rate:.1f}" for camera_id, rate in sorted(stats['fps'].items()))
+        print(f"[SUPERVISOR] Workers alive={alive}/{len(stats['workers'])} restarts={restarts} "
+              f"fps={stats['total_fps']:.1f} ({per_camera})")
+
+    def run(self):
+        """Start the workers and supervise them until SIGINT/SIGTERM"""
+        def handle_signal(signum, frame):
+            self._running = False
+
+        signal.signal(signal.SIGINT, handle_signal)
+        signal.signal(signal.SIGTERM, handle_signal)
+
+        self.start()
+        self.get_stats()
+        last_stats = time.time()
+        try:
+            while self._running:
+                time.sleep(POLL_INTERVAL_SEC)
+                self.check()
+                if time.time() - last_stats >= STATS_INTERVAL_SEC:
+                    self.print_stats()
+                    last_stats = time.time()
+        finally:
+            self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fire Detection System - Supervisor")
+    parser.add_argument("--cameras-per-worker", type=int, default=CAMERAS_PER_WORKER,
+                        help="Captured cameras per worker process")
+    parser.add_argument("--cameras", type=int, nargs="+", help="Only run these camera IDs")
+    parser.add_argument("--no-affinity", action="store_true", help="Do not pin workers to CPU cores")
+    parser.add_argument("--live-view-port", type=int, default=LIVE_VIEW_BASE_PORT,
+                        help="Live view port of the first worker (worker N uses this + N)")
+    args = parser.parse_args()
+
+    init_database()
+    cameras = get_cameras()
+    if args.cameras:
+        cameras = [camera for camera in cameras if camera['id'] in args.cameras]
+    groups = group_cameras(cameras, max(1, args.cameras_per_worker))
+    if not groups:
+        print("No cameras with a source configured (cameras.source: USB index, URL or thermal:<id>)")
+        return
+
+    Supervisor(groups, affinity=not args.no_affinity, live_view_base_port=args.live_view_port).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Fire Detection System - Region of Interest and Tiled Inference
+Per-camera ROI masks and SAHI-style overlapping tiles, so small distant
+smoke is not lost when a wide frame is downsized, and masked regions (sky,
+static signage) cost no inference at all
+"""
+
+import numpy as np
+import cv2
+
+from backends import Detections
+
+# Defaults (overridable per camera)
+TILE_SIZES = (1280, 960, 640)  # Tile sizes tried by 'auto' mode, coarse to fine
+TILE_OVERLAP = 0.2             # Fraction of a tile shared with its neighbour
+MIN_TILE_COVERAGE = 0.05       # Skip tiles with less than this fraction inside the ROI
+MERGE_IOS = 0.5                # Intersection-over-smaller above which cross-tile boxes are merged
+LATENCY_BUDGET_SEC = 0.5       # 'auto' mode: max estimated inference time per frame
+DEFAULT_IMAGE_LATENCY = 0.1    # Cost model seed before any latency has been measured
+
+
+def build_roi_mask(shape, include=None, exclude=None):
+    """
+    Build a uint8 mask (255 = analysed) for a frame shape. include/exclude are
+    lists of polygons in normalized (x, y) coordinates, 0..1 of the frame size;
+    no include polygons means the whole frame.
+    """
+    h, w = shape[:2]
+    scale = np.array([w, h], dtype=np.float32)
+
+    def to_pixels(polygon):
+        return np.round(np.asarray(polygon, dtype=np.float32) * scale).astype(np.int32)
+
+    if include:
+        mask = np.zeros((h, w), dtype=np.uint8)
+        cv2.fillPoly(mask, [to_pixels(p) for p in include], 255)
+    else:
+        mask = np.full((h, w), 255, dtype=np.uint8)
+    if exclude:
+        cv2.fillPoly(mask, [to_pixels(p) for p in exclude], 0)
+    return mask
+
+
+def _axis_starts(length, tile, step):
+    if length <= tile:
+        return [0]
+    starts = list(range(0, length - tile, step))
+    starts.append(length - tile)
+    return starts
+
+
+def plan_tiles(shape, tile_size, overlap=TILE_OVERLAP, mask=None, min_coverage=MIN_TILE_COVERAGE):
+    """
+    Overlapping (x0, y0, x1, y1) tiles covering the frame, without tiles that
+    fall (almost) entirely outside the ROI mask.
+    """
+    h, w = shape[:2]
+    step = max(1, int(tile_size * (1 - overlap)))
+    integral = cv2.integral(mask) if mask is not None else None
+
+    tiles = []
+    for y0 in _axis_starts(h, tile_size, step):
+        for x0 in _axis_starts(w, tile_size, step):
+            x1, y1 = min(x0 + tile_size, w), min(y0 + tile_size, h)
+            if integral is not None:
+                inside = (integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]) / 255
+                if inside < min_coverage * (x1 - x0) * (y1 - y0):
+                    continue
+            tiles.append((x0, y0, x1, y1))
+    return tiles
+
+
+def roi_bounds(mask):
+    """Bounding (x0, y0, x1, y1) of the ROI, or None if the mask is empty"""
+    points = cv2.findNonZero(mask)
+    if points is None:
+        return None
+    x, y, w, h = cv2.boundingRect(points)
+    return x, y, x + w, y + h
+
+
+def merge_detections(parts, names, ios_threshold=MERGE_IOS):
+    """
+    Combine (Detections, (offset_x, offset_y)) pieces into one frame-level
+    Detections. Same-class boxes whose intersection covers more than
+    ios_threshold of the smaller box are merged into their union (greedy
+    NMM), so an object cut by a tile border comes back as one box.
+    """
+    boxes, scores, classes, categories = [], [], [], []
+    for detections, (ox, oy) in parts:
+        if len(detections) == 0:
+            continue
+        boxes.append(detections.boxes + np.array([ox, oy, ox, oy], dtype=np.float32))
+        scores.append(detections.scores)
+        classes.append(detections.classes)
+        categories.append(detections.categories)
+    if not boxes:
+        return Detections(np.empty((0, 4), np.float32), np.empty(0, np.float32),
+                          np.empty(0, np.int64), np.empty(0, np.int64), names)
+
+    boxes = np.concatenate(boxes)
+    scores = np.concatenate(scores)
+    classes = np.concatenate(classes)
+    categories = np.concatenate(categories)
+
+    order = np.argsort(-scores)
+    boxes, scores, classes, categories = boxes[order], scores[order], classes[order], categories[order]
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+
+    alive = np.ones(len(scores), dtype=bool)
+    keep = []
+    for i in range(len(scores)):
+        if not alive[i]:
+            continue
+        alive[i] = False
+        candidates = np.nonzero(alive & (classes == classes[i]))[0]
+        if len(candidates):
+            ix1 = np.maximum(boxes[i, 0], boxes[candidates, 0])
+            iy1 = np.maximum(boxes[i, 1], boxes[candidates, 1])
+            ix2 = np.minimum(boxes[i, 2], boxes[candidates, 2])
+            iy2 = np.minimum(boxes[i, 3], boxes[candidates, 3])
+            inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+            smaller = np.maximum(np.minimum(areas[i], areas[candidates]), 1e-9)
+            merged = candidates[inter / smaller > ios_threshold]
+            if len(merged):
+                group = np.concatenate([[i], merged])
+                boxes[i, :2] = boxes[group, :2].min(axis=0)
+                boxes[i, 2:] = boxes[group, 2:].max(axis=0)
+                alive[merged] = False
+        keep.append(i)
+
+    keep = np.array(keep, dtype=np.int64)
+    return Detections(boxes[keep], scores[keep], classes[keep], categories[keep], names)
+
+
+def filter_by_mask(detections, mask):
+    """Drop boxes whose centre lies outside the ROI mask"""
+    if mask is None or len(detections) == 0:
+        return detections
+    h, w = mask.shape
+    cx = ((detections.boxes[:, 0] + detections.boxes[:, 2]) / 2).astype(np.int64).clip(0, w - 1)
+    cy = ((detections.boxes[:, 1] + detections.boxes[:, 3]) / 2).astype(np.int64).clip(0, h - 1)
+    keep = mask[cy, cx] > 0
+    return Detections(detections.boxes[keep], detections.scores[keep], detections.classes[keep],
+                      detections.categories[keep], detections.names)
+
+
+class RegionInference:
+    """
+    Per-camera ROI / tiling plan.
+
+    mode 'full' runs one image: the ROI's bounding box (the whole frame if
+    there is no ROI). mode 'tiles' runs overlapping tile_size tiles. mode
+    'auto' uses the cost model (measured per-image latency x image count) to
+    pick the finest tile size in TILE_SIZES that fits latency_budget,
+    falling back to 'full'. include_full_frame adds the full/ROI image to the
+    tiles so large objects are still seen whole.
+
+    Usage: requests = plan(frame) gives the images to infer; merge(requests,
+    detections_list, names) turns their Detections into one frame-level
+    Detections in frame coordinates.
+    """
+
+    def __init__(self, mode='full', include=None, exclude=None, tile_size=640,
+                 tile_sizes=TILE_SIZES, overlap=TILE_OVERLAP, min_coverage=MIN_TILE_COVERAGE,
+                 include_full_frame=True, latency_budget=LATENCY_BUDGET_SEC):
+        if mode not in ('full', 'tiles', 'auto'):
+            raise ValueError(f"Unknown tiling mode: {mode}")
+        self.mode = mode
+        self.include = include
+        self.exclude = exclude
+        self.tile_size = tile_size
+        self.tile_sizes = tile_sizes
+        self.overlap = overlap
+        self.min_coverage = min_coverage
+        self.include_full_frame = include_full_frame
+        self.latency_budget = latency_budget
+
+        self.image_latency = DEFAULT_IMAGE_LATENCY
+        self._shape = None
+        self._mask = None
+        self._bounds = None
+        self._tile_plans = {}
+        self._last_plan = (None, None)
+        self.last_plan_size = 0
+
+    @property
+    def has_roi(self):
+        return bool(self.include or self.exclude)
+
+    def _prepare(self, shape):
+        if shape[:2] == self._shape:
+            return
+        self._shape = shape[:2]
+        self._tile_plans = {}
+        if self.has_roi:
+            self._mask = build_roi_mask(shape, self.include, self.exclude)
+            self._bounds = roi_bounds(self._mask)
+        else:
+            self._mask = None
+            self._bounds = (0, 0, shape[1], shape[0])
+
+    def _tiles(self, tile_size):
+        if tile_size not in self._tile_plans:
+            self._tile_plans[tile_size] = plan_tiles(
+                self._shape, tile_size, self.overlap, self._mask, self.min_coverage)
+        return self._tile_plans[tile_size]
+
+    def estimate_cost(self, image_count):
+        """Estimated inference time in seconds for a number of images"""
+        return image_count * self.image_latency
+
+    def record_latency(self, image_latency):
+        """Update the cost model with a measured per-image inference latency"""
+        self.image_latency = self.image_latency * 0.8 + image_latency * 0.2
+
+    def tile_options(self):
+        """(tile_size, image_count, estimated_cost) for each candidate tile size"""
+        extra = 1 if self.include_full_frame else 0
+        options = []
+        for tile_size in self.tile_sizes:
+            count = len(self._tiles(tile_size)) + extra
+            options.append((tile_size, count, self.estimate_cost(count)))
+        return options
+
+    def _choose_regions(self):
+        full = [self._bounds] if self._bounds is not None else []
+        if self.mode == 'full' or self._bounds is None:
+            return full
+
+        if self.mode == 'tiles':
+            tiles = self._tiles(self.tile_size)
+        else:
+            tiles = None
+            for tile_size, count, cost in sorted(self.tile_options(), key=lambda o: o[0]):
+                if cost <= self.latency_budget:
+                    tiles = self._tiles(tile_size)
+                    break
+            if tiles is None:
+                return full
+
+        if self.include_full_frame and full and full[0] not in tiles:
+            return full + list(tiles)
+        return list(tiles)
+
+    def plan(self, frame):
+        """
+        List of (image, (x0, y0)) to infer for this frame. Images are views into
+        frame; planning the same frame twice returns the same view objects, so
+        cameras sharing a planner and a frame are de-duplicated by the scheduler.
+        """
+        if self._last_plan[0] is frame:
+            return self._last_plan[1]
+        self._prepare(frame.shape)
+        regions = self._choose_regions()
+        self.last_plan_size = len(regions)
+        requests = [(frame[y0:y1, x0:x1], (x0, y0)) for x0, y0, x1, y1 in regions]
+        self._last_plan = (frame, requests)
+        return requests
+
+    def merge(self, requests, detections_list, names):
+        """Merge per-image Detections from plan() into frame coordinates, dropping masked boxes"""
+        parts = [(detections, origin) for (_, origin), detections in zip(requests, detections_list)]
+        if len(parts) == 1 and parts[0][1] == (0, 0):
+            merged = parts[0][0]
+        else:
+            merged = merge_detections(parts, names)
+        return filter_by_mask(merged, self._mask)
@@ -0,0 +1,209 @@
+"""
+Fire Detection System - Incident Tracking
+Follows fire/smoke boxes across inference frames so one fire becomes one
+incident: confirmed after K of the last N frames, logged and alerted once,
+then updated while it lasts
+"""
+
+import itertools
+
+import numpy as np
+
+from backends import CATEGORY_FIRE, CATEGORY_SMOKE
+from clips import box_iou
+
+# Configuration
+TRACK_MIN_CONFIDENCE = 0.35     # Boxes below this neither start nor extend an incident
+CONFIRM_HITS = 3                # An incident is confirmed once it was seen in CONFIRM_HITS ...
+CONFIRM_WINDOW = 5              # ... of the last CONFIRM_WINDOW inference frames
+MATCH_IOU = 0.2                 # Min IoU for a box to continue an incident
+CENTROID_MATCH = 0.5            # Or: centroid distance below this fraction of the larger box's diagonal (drifting smoke)
+BOX_SMOOTHING = 0.5             # Weight of the newest box in the incident's box
+INCIDENT_TIMEOUT_SEC = 30.0     # An incident with no matching box for this long is closed
+UPDATE_CONFIDENCE_STEP = 0.10   # A confirmed incident is re-reported when its confidence rises by this much
+
+TRACKED_CATEGORIES = (CATEGORY_FIRE, CATEGORY_SMOKE)
+
+_incident_ids = itertools.count(1)
+
+
+class Incident:
+    """One fire or smoke seen across frames"""
+
+    def __init__(self, category, box, confidence, timestamp):
+        self.id = next(_incident_ids)
+        self.category = category
+        self.box = box.astype(np.float32)
+        self.confidence = confidence
+        self.peak_confidence = confidence
+        self.reported_confidence = 0.0
+        self.hits = 1                  # Bit i set = seen i inference frames ago
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.confirmed = False
+        self.detection_id = None       # Set by the caller once the incident is logged
+        self.alert_id = None           # Set by the caller once an alert is raised for it
+
+    @property
+    def recent_hits(self):
+        return bin(self.hits).count('1')
+
+
+class IncidentTracker:
+    """
+    Per-camera IoU/centroid tracker for fire and smoke boxes.
+
+    update() is called with every inference frame's Detections. Boxes are
+    matched to the camera's open incidents of the same category in one
+    vectorized IoU/centroid-distance pass; leftover boxes overlapping an
+    incident that already matched are merged into it instead of starting a
+    duplicate. An incident is confirmed once it was seen in confirm_hits of
+    the last confirm_window frames and peaked at its category threshold, so
+    one noisy frame raises nothing while smoke that builds up slowly is kept
+    alive by the weaker boxes until it gets there.
+    """
+
+    def __init__(self, thresholds, confirm_hits=CONFIRM_HITS, confirm_window=CONFIRM_WINDOW,
+                 min_confidence=TRACK_MIN_CONFIDENCE, match_iou=MATCH_IOU, centroid_match=CENTROID_MATCH,
+                 timeout=INCIDENT_TIMEOUT_SEC, update_step=UPDATE_CONFIDENCE_STEP):
+        self.thresholds = thresholds   # {category: confidence needed to confirm}
+        self.confirm_hits = confirm_hits
+        self.window_mask = (1 << confirm_window) - 1
+        self.min_confidence = min_confidence
+        self.match_iou = match_iou
+        self.centroid_match = centroid_match
+        self.timeout = timeout
+        self.update_step = update_step
+
+        self.incidents = []
+
+        # Counters
+        self.confirmed = 0
+        self.updates = 0
+        self.closed = 0
+        self.merged = 0                # Boxes absorbed into an incident instead of a new one
+        self.suppressed = 0            # Frames of already-reported incidents that needed no new record
+
+    def _match(self, tracks, boxes):
+        """Greedy one-to-one matching. Returns (pairs, unmatched box indices)."""
+        if not tracks or len(boxes) == 0:
+            return [], list(range(len(boxes)))
+
+        track_boxes = np.stack([incident.box for incident in tracks])
+        iou = box_iou(track_boxes, boxes)
+
+        track_centers = (track_boxes[:, :2] + track_boxes[:, 2:4]) / 2
+        centers = (boxes[:, :2] + boxes[:, 2:4]) / 2
+        distance = np.linalg.norm(track_centers[:, None, :] - centers[None, :, :], axis=2)
+        track_diag = np.linalg.norm(track_boxes[:, 2:4] - track_boxes[:, :2], axis=1)
+        diag = np.linalg.norm(boxes[:, 2:4] - boxes[:, :2], axis=1)
+        closeness = 1.0 - distance / np.maximum(np.maximum(track_diag[:, None], diag[None, :]), 1e-6)
+
+        # IoU matches rank above centroid-only matches
+        score = np.where(iou >= self.match_iou, 1.0 + iou,
+                         np.where(closeness >= 1.0 - self.centroid_match, closeness, 0.0))
+
+        pairs = []
+        used_tracks, used_boxes = set(), set()
+        for flat in np.argsort(score, axis=None)[::-1]:
+            t, b = np.unravel_index(flat, score.shape)
+            if score[t, b] <= 0:
+                break
+            if t in used_tracks or b in used_boxes:
+                continue
+            pairs.append((int(t), int(b)))
+            used_tracks.add(t)
+            used_boxes.add(b)
+
+        unmatched = [b for b in range(len(boxes)) if b not in used_boxes]
+        # Extra boxes on an incident that already matched (a fire split into
+        # several boxes) belong to that incident
+        for b in list(unmatched):
+            t = int(np.argmax(score[:, b]))
+            if score[t, b] > 0 and t in used_tracks:
+                pairs.append((t, b))
+                unmatched.remove(b)
+                self.merged += 1
+        return pairs, unmatched
+
+    def update(self, detections, timestamp):
+        """
+        Feed one inference frame's Detections. Returns a list of (event,
+        incident) with event 'confirmed' (log and alert it), 'updated'
+        (confidence rose by update_step since last reported) or 'closed'.
+        """
+        for incident in self.incidents:
+            incident.hits = (incident.hits << 1) & self.window_mask
+
+        keep = (detections.scores >= self.min_confidence) & np.isin(detections.categories, TRACKED_CATEGORIES)
+        boxes = detections.boxes[keep]
+        scores = detections.scores[keep]
+        categories = detections.categories[keep]
+
+        events = []
+        for category in TRACKED_CATEGORIES:
+            in_category = categories == category
+            cat_boxes, cat_scores = boxes[in_category], scores[in_category]
+            tracks = [incident for incident in self.incidents if incident.category == category]
+            pairs, unmatched = self._match(tracks, cat_boxes)
+
+            seen = {}
+            for t, b in pairs:
+                seen.setdefault(t, []).append(b)
+            for t, matched in seen.items():
+                incident = tracks[t]
+                best = max(matched, key=lambda b: cat_scores[b])
+                if len(matched) > 1:
+                    # Cover every box that was merged into it
+                    merged = cat_boxes[matched]
+                    box = np.concatenate([merged[:, :2].min(axis=0), merged[:, 2:4].max(axis=0)])
+                else:
+                    box = cat_boxes[best]
+                incident.box = (1 - BOX_SMOOTHING) * incident.box + BOX_SMOOTHING * box
+                incident.confidence = float(cat_scores[best])
+                incident.peak_confidence = max(incident.peak_confidence, incident.confidence)
+                incident.hits |= 1
+                incident.last_seen = timestamp
+
+            for b in unmatched:
+                self.incidents.append(Incident(category, cat_boxes[b], float(cat_scores[b]), timestamp))
+
+        open_incidents = []
+        for incident in self.incidents:
+            if incident.confirmed:
+                if timestamp - incident.last_seen > self.timeout:
+                    self.closed += 1
+                    events.append(('closed', incident))
+                    continue
+                if incident.hits & 1:
+                    if incident.confidence >= incident.reported_confidence + self.update_step:
+                        incident.reported_confidence = incident.confidence
+                        self.updates += 1
+                        events.append(('updated', incident))
+                    else:
+                        self.suppressed += 1
+            elif (incident.recent_hits >= self.confirm_hits
+                  and incident.peak_confidence >= self.thresholds.get(incident.category, 1.0)):
+                incident.confirmed = True
+                # It is reported at the peak that confirmed it
+                incident.reported_confidence = incident.peak_confidence
+                self.confirmed += 1
+                events.append(('confirmed', incident))
+            elif incident.hits == 0 or timestamp - incident.last_seen > self.timeout:
+                # Never confirmed and gone from the whole window
+                continue
+            open_incidents.append(incident)
+        self.incidents = open_incidents
+        return events
+
+    def get_stats(self):
+        """Tracker counters for monitoring"""
+        return {
+            'active': len(self.incidents),
+            'confirmed_active': sum(1 for incident in self.incidents if incident.confirmed),
+            'confirmed': self.confirmed,
+            'updates': self.updates,
+            'closed': self.closed,
+            'merged': self.merged,
+            'suppressed': self.suppressed
+        }